@@ -3,18 +3,35 @@ API routes for the Jester application.
 This module defines all the API endpoints for the application.
 """
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from typing import Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+import asyncio
+import openai
 import os
 import json
+import time
 from datetime import datetime
 from pathlib import Path
 
-from app.core.vision import process_size_guide_image
-from app.core.jester_chat import JesterChat
-from app.core.vector_search import JesterVectorSearch
+from app.core.vision import process_size_guide_bytes
+from app.core.rate_limiter import OverloadedError, Priority, priority
+from app.db.database import AsyncSessionLocal
+from app.schemas.recommendation import (
+    SizeEquivalenceResponse,
+    SizeRecommendationRequest,
+    SizeRecommendationResponse,
+)
+from app.schemas.search import SearchRequest, SearchResponse
+from app.services.job_queue import QueueFullError, RetryLater
+from app.services.size_service import SizeService
+from app.utils.image_hash import content_hash, dhash
+from app.utils.log import get_logger
+from app.utils.metrics import observe, timed
 from app.config import config
 
+log = get_logger("api")
+
 # Create router
 router = APIRouter(
     prefix="/api",
@@ -22,38 +39,212 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Initialize services
-vector_search = JesterVectorSearch()
-chat = JesterChat()
+def _services(request: Request):
+    """
+    The shared services built by the app's lifespan hook.
+
+    Raises:
+        HTTPException: 503 until startup and warm-up have finished
+    """
+    state = request.app.state
+    if not getattr(state, "ready", False):
+        raise HTTPException(status_code=503, detail="Service is starting, try again shortly")
+    return state
+
+GUIDE_FIELDS = ("brand", "gender", "size_guide_header", "unit_of_measurement", "size_guide_scope")
+
+def _guide_key(guide_metadata: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(guide_metadata.get(field) or "").strip().lower() for field in GUIDE_FIELDS)
+
+async def _find_duplicate(
+    services,
+    content: bytes,
+    guide_metadata: Dict[str, Any],
+    reuse_similar: bool = False
+):
+    """
+    Hash an upload and look it up in the near-duplicate index.
+
+    Only earlier uploads with the same brand and metadata are candidates.
+    Identical bytes are always a duplicate. Charts with the same layout
+    hash alike, so any other match is returned as similar, to be reported
+    while the upload is extracted anyway, unless reuse_similar is set: then
+    the caller has confirmed it is the same chart, e.g. at another zoom
+    level or crop, and it is a duplicate too.
+
+    Returns:
+        (fingerprint, duplicate, similar) where fingerprint is None for
+        unreadable images, and duplicate and similar are (distance, entry)
+        pairs or None
+    """
+    try:
+        image_hash = await asyncio.to_thread(dhash, content)
+    except (OSError, ValueError):
+        return None, None, None
+    fingerprint = {"hash": image_hash, "sha256": content_hash(content)}
+    key = _guide_key(guide_metadata)
+    match = services.near_duplicates.find(
+        image_hash, where=lambda entry: _guide_key(entry["result"].get("metadata", {})) == key
+    )
+    if match and (reuse_similar or match[1].get("sha256") == fingerprint["sha256"]):
+        return fingerprint, match, None
+    return fingerprint, None, match
+
+def _match_info(match) -> Dict[str, Any]:
+    distance, entry = match
+    return {"source_image": entry["source_image"], "timestamp": entry["timestamp"], "distance": distance}
+
+def _duplicate_response(duplicate) -> Dict[str, Any]:
+    distance, entry = duplicate
+    log.info("Duplicate upload", extra={"source_image": entry["source_image"], "distance": distance})
+    return {
+        "status": "duplicate",
+        "duplicate_of": _match_info(duplicate),
+        "data": entry["result"]
+    }
+
+def _upload_path(filename: str) -> Path:
+    """Timestamped location in the upload directory for a new upload."""
+    upload_dir = Path(config.UPLOADS_DIR)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return upload_dir / f"{timestamp}_{filename}"
+
+def _attach_metadata(
+    result: Dict[str, Any],
+    file_path: Path,
+    guide_metadata: Dict[str, Any]
+) -> Dict[str, Any]:
+    # Keep what extraction recorded (preprocessing, tiles, vision cache)
+    result["metadata"] = {
+        **result.get("metadata", {}),
+        **guide_metadata,
+        "source_image": str(file_path),
+        "timestamp": datetime.now().isoformat()
+    }
+    return result
+
+def _chunk_description(guide_metadata: Dict[str, Any]) -> str:
+    return (
+        f"Size guide for {guide_metadata['brand']} {guide_metadata['gender']} clothing "
+        f"using {guide_metadata['unit_of_measurement']} measurements"
+    )
+
+def _remember_image(services, fingerprint: Optional[Dict[str, Any]], result: Dict[str, Any]):
+    """Remember an image so later uploads of it can reuse its extraction."""
+    if fingerprint is not None and "error" not in result:
+        services.near_duplicates.add(fingerprint["hash"], {
+            "sha256": fingerprint["sha256"],
+            "source_image": result["metadata"]["source_image"],
+            "timestamp": result["metadata"]["timestamp"],
+            "result": result
+        })
+
+async def _store_size_guide(services, result: Dict[str, Any], guide_metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Write an extraction's sizes and measurements to the database.
+
+    Returns:
+        The outcome ({"success", "size_guide_ids", ...} or the error), or
+        None when storing is disabled or the brand or unit is missing
+    """
+    if not config.STORE_SIZE_GUIDES or "error" in result:
+        return None
+    if not guide_metadata.get("brand") or not guide_metadata.get("unit_of_measurement"):
+        return None
+    metadata = {
+        "brand": guide_metadata["brand"],
+        "gender": guide_metadata.get("gender"),
+        "size_guide_header": guide_metadata.get("size_guide_header"),
+        "source_url": guide_metadata.get("source_url"),
+        "unit": guide_metadata["unit_of_measurement"],
+        "scope": guide_metadata.get("size_guide_scope")
+    }
+    try:
+        async with AsyncSessionLocal() as session:
+            stored = await SizeService(session, services.validation_engine).store_size_guide(result, metadata)
+    except Exception as e:
+        stored = {"success": False, "error": str(e)}
+    if not stored["success"]:
+        log.warning("Size guide not stored: %s", stored["error"], extra={"brand": metadata["brand"]})
+    return {key: value for key, value in stored.items() if key != "measurements"}
+
+async def _ingest_size_guide(
+    services,
+    result: Dict[str, Any],
+    file_path: Path,
+    guide_metadata: Dict[str, Any],
+    fingerprint: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Attach metadata to an extraction, add it to the knowledge base and
+    store its measurements. The returned result carries the database
+    outcome under "database" when the guide was stored.
+    """
+    _attach_metadata(result, file_path, guide_metadata)
+
+    with timed("api", "json_dump"):
+        text = json.dumps(result)
+
+    # Add to knowledge base (encoding runs in a worker thread) while the
+    # measurements are written to the database
+    _, stored = await asyncio.gather(
+        asyncio.to_thread(
+            services.vector_search.add_chunk,
+            text,
+            _chunk_description(guide_metadata)
+        ),
+        _store_size_guide(services, result, guide_metadata)
+    )
+
+    _remember_image(services, fingerprint, result)
+    return {**result, "database": stored} if stored is not None else result
+
+async def run_size_guide_job(services, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Job queue handler: process an upload saved by submit_size_guide_job."""
+    file_path = Path(payload["file_path"])
+    content = await asyncio.to_thread(file_path.read_bytes)
+    # Background jobs yield OpenAI capacity to interactive requests
+    try:
+        with priority(Priority.BULK):
+            result = await process_size_guide_bytes(content, payload["filename"])
+    except OverloadedError as e:
+        # Shed by the rate limiter: try again later rather than fail the job
+        raise RetryLater(str(e), delay=e.retry_after)
+    return await _ingest_size_guide(
+        services, result, file_path, payload["metadata"], payload.get("fingerprint")
+    )
 
 @router.get("/health")
 async def health_check():
-    """Health check endpoint."""
+    """Liveness check: the process is up, though it may still be warming up."""
     return {"status": "healthy"}
 
+@router.get("/ready")
+async def readiness_check(request: Request):
+    """Readiness check: 200 once services are loaded and warmed up, 503 until then."""
+    state = request.app.state
+    if getattr(state, "ready", False):
+        return {"status": "ready"}
+    error = getattr(state, "startup_error", None)
+    return JSONResponse(
+        status_code=503,
+        content={"status": "failed" if error else "starting", "error": error}
+    )
+
 @router.post("/process-size-guide")
 async def process_size_guide(
+    request: Request,
     file: UploadFile = File(...),
     brand: Optional[str] = Form(None),
     gender: Optional[str] = Form(None),
     size_guide_header: Optional[str] = Form(None),
     source_url: Optional[str] = Form(None),
     unit_of_measurement: Optional[str] = Form(None),
-    size_guide_scope: Optional[str] = Form(None)
+    size_guide_scope: Optional[str] = Form(None),
+    force_reprocess: bool = Form(False),
+    reuse_duplicate: bool = Form(False)
 ):
-    print("==== DEBUG: Request Received ====")
-    print(f"Filename: {file.filename}")
-    print(f"Content-Type: {file.content_type}")
-    print(f"Brand: {brand}")
-    print(f"Unit: {unit_of_measurement}")
-    try:
-        content = await file.read()
-        print(f"File Size: {len(content)} bytes")
-        file.file.seek(0)
-    except Exception as e:
-        print(f"Failed to read file: {e}")
-
-
     """
     Process a size guide image and extract size information.
     
@@ -65,56 +256,76 @@ async def process_size_guide(
         source_url: URL where the size guide was found
         unit_of_measurement: Unit of measurement used (cm/inches)
         size_guide_scope: Scope of the size guide (e.g., "US", "EU", "UK")
+        force_reprocess: Extract again even if this image was ingested before
+        reuse_duplicate: Also reuse the extraction of a similar earlier
+            chart with the same metadata, such as a screenshot of it at
+            another zoom level or crop, instead of calling vision again
         
     Returns:
-        dict: Extracted size information
+        dict: Extracted size information, or the earlier extraction with
+        status "duplicate" when this image (or, with reuse_duplicate, a
+        similar one) was already ingested with the same metadata. Otherwise
+        a similar earlier chart is reported in "possible_duplicate_of" but
+        not substituted.
     """
+    services = _services(request)
     try:
-        # Ensure upload directory exists
-        upload_dir = Path(config.UPLOADS_DIR)
-        upload_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Save the uploaded file
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{file.filename}"
-        file_path = upload_dir / filename
-        
-        # Read the file content and write it
-        content = await file.read()
-        print(f"Received file: {file.filename}, size: {len(content)} bytes")  # Diagnostic: print file size
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        # Process the image
-        result = await process_size_guide_image(file_path)
-        
-        # Add metadata
-        result["metadata"] = {
-            "brand": brand,
-            "gender": gender,
-            "size_guide_header": size_guide_header,
-            "source_url": source_url,
-            "unit_of_measurement": unit_of_measurement,
-            "size_guide_scope": size_guide_scope,
-            "source_image": file_path,
-            "timestamp": datetime.now().isoformat()
-        }
+        # The only read of the upload; everything below shares these bytes
+        with timed("api", "upload_read"):
+            content = await file.read()
+    except Exception as e:
+        log.warning("Failed to read upload: %s", e, extra={"upload": file.filename})
+        raise HTTPException(status_code=400, detail=f"Failed to read file: {e}")
+
+    log.debug("Size guide upload received", extra={
+        "upload": file.filename,
+        "content_type": file.content_type,
+        "size_bytes": len(content),
+        "brand": brand,
+        "unit": unit_of_measurement
+    })
+
+    guide_metadata = {
+        "brand": brand,
+        "gender": gender,
+        "size_guide_header": size_guide_header,
+        "source_url": source_url,
+        "unit_of_measurement": unit_of_measurement,
+        "size_guide_scope": size_guide_scope
+    }
+    try:
+        # Offer the earlier extraction if this image was ingested before
+        fingerprint, duplicate, similar = await _find_duplicate(
+            services, content, guide_metadata, reuse_similar=reuse_duplicate
+        )
+        if duplicate and not force_reprocess:
+            return _duplicate_response(duplicate)
+
+        file_path = _upload_path(file.filename)
         
-        # Add to knowledge base
-        vector_search.add_chunk(
-            json.dumps(result),
-            f"Size guide for {brand} {gender} clothing using {unit_of_measurement} measurements"
+        # Keep a copy on disk, written while the vision request runs
+        result, _ = await asyncio.gather(
+            process_size_guide_bytes(content, file.filename),
+            asyncio.to_thread(file_path.write_bytes, content)
         )
         
-        return {"status": "success", "data": result}
+        result = await _ingest_size_guide(services, result, file_path, guide_metadata, fingerprint)
+        
+        response = {"status": "success", "data": result}
+        if similar:
+            response["possible_duplicate_of"] = _match_info(similar)
+        return response
+    except (OverloadedError, openai.RateLimitError):
+        raise  # Answered with a 503/429 by the app's exception handlers
     except Exception as e:
         # Get detailed error information
         import traceback
         error_details = traceback.format_exc()
-        print(f"Exception in process_size_guide: {e}")
-        print(f"Detailed error: {error_details}")
-        print(f"File content type: {file.content_type}")
-        print(f"File size: {len(content)} bytes")
+        log.exception("Size guide processing failed", extra={
+            "upload": file.filename,
+            "content_type": file.content_type,
+            "size_bytes": len(content)
+        })
         raise HTTPException(
             status_code=500,
             detail={
@@ -127,8 +338,236 @@ async def process_size_guide(
             }
         )
 
+async def _extract_batch_file(
+    services,
+    semaphore: asyncio.Semaphore,
+    index: int,
+    file: UploadFile,
+    guide_metadata: Dict[str, Any],
+    force_reprocess: bool,
+    reuse_duplicate: bool
+):
+    """
+    Extract one file of a batch.
+
+    Returns:
+        (entry, file_path, fingerprint) where entry is the per-file response;
+        file_path is None unless the file was extracted
+    """
+    entry: Dict[str, Any] = {"filename": file.filename}
+    try:
+        content = await file.read()
+    except Exception as e:
+        return {**entry, "status": "error", "error": f"Failed to read file: {e}"}, None, None
+
+    async with semaphore:
+        try:
+            fingerprint, duplicate, similar = await _find_duplicate(
+                services, content, guide_metadata, reuse_similar=reuse_duplicate
+            )
+            if duplicate and not force_reprocess:
+                return {**entry, **_duplicate_response(duplicate)}, None, None
+            if similar:
+                entry["possible_duplicate_of"] = _match_info(similar)
+
+            # Index prefix: batches often hold several files with the same name
+            file_path = _upload_path(f"{index}_{file.filename}")
+            result, _ = await asyncio.gather(
+                process_size_guide_bytes(content, file.filename),
+                asyncio.to_thread(file_path.write_bytes, content)
+            )
+        except Exception as e:
+            log.exception("Size guide processing failed in batch", extra={"upload": file.filename})
+            return {**entry, "status": "error", "error": str(e)}, None, None
+
+    status = "error" if "error" in result else "success"
+    return {**entry, "status": status, "data": result}, file_path, fingerprint
+
+@router.post("/process-size-guides")
+async def process_size_guides(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    brand: Optional[str] = Form(None),
+    gender: Optional[str] = Form(None),
+    size_guide_header: Optional[str] = Form(None),
+    source_url: Optional[str] = Form(None),
+    unit_of_measurement: Optional[str] = Form(None),
+    size_guide_scope: Optional[str] = Form(None),
+    force_reprocess: bool = Form(False),
+    reuse_duplicate: bool = Form(False)
+):
+    """
+    Process several size guide images that share the same metadata.
+    
+    Files are extracted concurrently, at most BATCH_MAX_CONCURRENCY at a
+    time, and all successful extractions are added to the knowledge base
+    in one batched write. A failure in one file doesn't fail the batch,
+    and if the knowledge base write fails the extractions are still
+    returned, each with a "knowledge_base_error".
+    
+    Args:
+        files: The uploaded size guide images, e.g. a brand's tops,
+            bottoms and dress shirt charts
+        Other fields: As for /process-size-guide, applied to every file
+        
+    Returns:
+        dict: One result per file, in upload order, with status "success",
+        "duplicate" or "error"
+    """
+    services = _services(request)
+    if len(files) > config.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files: {len(files)} (limit {config.BATCH_MAX_FILES})"
+        )
+
+    guide_metadata = {
+        "brand": brand,
+        "gender": gender,
+        "size_guide_header": size_guide_header,
+        "source_url": source_url,
+        "unit_of_measurement": unit_of_measurement,
+        "size_guide_scope": size_guide_scope
+    }
+    semaphore = asyncio.Semaphore(config.BATCH_MAX_CONCURRENCY)
+    extracted = await asyncio.gather(*[
+        _extract_batch_file(services, semaphore, index, file, guide_metadata, force_reprocess, reuse_duplicate)
+        for index, file in enumerate(files)
+    ])
+
+    succeeded = []
+    for entry, file_path, fingerprint in extracted:
+        if entry["status"] == "success":
+            _attach_metadata(entry["data"], file_path, guide_metadata)
+            succeeded.append((entry, fingerprint))
+
+    if succeeded:
+        # One encode and one index write for the whole batch, while each
+        # guide's measurements are written to the database
+        written, *stored = await asyncio.gather(
+            asyncio.to_thread(
+                services.vector_search.batch_add_chunks,
+                [json.dumps(entry["data"]) for entry, _ in succeeded],
+                [_chunk_description(guide_metadata)] * len(succeeded)
+            ),
+            *[_store_size_guide(services, entry["data"], guide_metadata) for entry, _ in succeeded],
+            return_exceptions=True
+        )
+        if isinstance(written, Exception):
+            # Keep the extractions: the caller can resubmit them
+            log.error(
+                "Knowledge base write failed for batch",
+                exc_info=written,
+                extra={"guides": len(succeeded)}
+            )
+            for entry, _ in succeeded:
+                entry["knowledge_base_error"] = f"Failed to add to the knowledge base: {written}"
+        else:
+            for entry, fingerprint in succeeded:
+                _remember_image(services, fingerprint, entry["data"])
+        for (entry, _), outcome in zip(succeeded, stored):
+            if outcome is not None:
+                entry["data"] = {**entry["data"], "database": outcome}
+
+    results = [entry for entry, _, _ in extracted]
+    summary = {
+        status: sum(1 for entry in results if entry["status"] == status)
+        for status in ("success", "duplicate", "error")
+    }
+    summary["knowledge_base_error"] = sum(1 for entry in results if "knowledge_base_error" in entry)
+    return {
+        "status": "success",
+        "summary": summary,
+        "results": results
+    }
+
+@router.post("/jobs/process-size-guide", status_code=202)
+async def submit_size_guide_job(
+    request: Request,
+    file: UploadFile = File(...),
+    brand: Optional[str] = Form(None),
+    gender: Optional[str] = Form(None),
+    size_guide_header: Optional[str] = Form(None),
+    source_url: Optional[str] = Form(None),
+    unit_of_measurement: Optional[str] = Form(None),
+    size_guide_scope: Optional[str] = Form(None),
+    force_reprocess: bool = Form(False),
+    reuse_duplicate: bool = Form(False)
+):
+    """
+    Queue a size guide image for background processing.
+    
+    Takes the same fields as /process-size-guide but returns as soon as the
+    upload is saved. Poll /jobs/{job_id} for the result.
+    
+    Returns:
+        dict: The job id and status URL, or the earlier extraction with
+        status "duplicate" when this image (or, with reuse_duplicate, a
+        similar one) was already ingested with the same metadata
+    """
+    services = _services(request)
+    job_queue = services.job_queue
+    try:
+        content = await file.read()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to read file: {e}")
+
+    if job_queue.depth >= job_queue.max_queue_size:
+        raise HTTPException(status_code=503, detail="Job queue is full, try again later")
+
+    guide_metadata = {
+        "brand": brand,
+        "gender": gender,
+        "size_guide_header": size_guide_header,
+        "source_url": source_url,
+        "unit_of_measurement": unit_of_measurement,
+        "size_guide_scope": size_guide_scope
+    }
+    fingerprint, duplicate, similar = await _find_duplicate(
+        services, content, guide_metadata, reuse_similar=reuse_duplicate
+    )
+    if duplicate and not force_reprocess:
+        return _duplicate_response(duplicate)
+
+    # The job reads the upload back from disk, so it survives a restart
+    file_path = _upload_path(file.filename)
+    await asyncio.to_thread(file_path.write_bytes, content)
+
+    try:
+        job = await job_queue.submit({
+            "file_path": str(file_path),
+            "filename": file.filename,
+            "fingerprint": fingerprint,
+            "metadata": guide_metadata
+        })
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    response = {
+        "status": job["status"],
+        "job_id": job["id"],
+        "status_url": f"{router.prefix}/jobs/{job['id']}"
+    }
+    if similar:
+        response["possible_duplicate_of"] = _match_info(similar)
+    return response
+
+@router.get("/jobs/{job_id}")
+async def get_job(request: Request, job_id: str):
+    """
+    Get the status of a background job.
+    
+    Returns:
+        dict: Job status and timings, plus the extraction once the job has
+        succeeded or the error once it has failed
+    """
+    job = _services(request).job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {key: value for key, value in job.items() if key != "payload"}
+
 @router.post("/chat")
-async def chat_endpoint(query: str):
+async def chat_endpoint(request: Request, query: str):
     """
     Chat with Jester about size guides.
     
@@ -138,8 +577,157 @@ async def chat_endpoint(query: str):
     Returns:
         dict: Jester's response
     """
+    chat = _services(request).chat
     try:
-        response = chat.get_response(query)
+        response = await chat.aget_response(query)
         return {"status": "success", "response": response}
+    except (OverloadedError, openai.RateLimitError):
+        raise  # Answered with a 503/429 by the app's exception handlers
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/chat/cache")
+async def chat_cache_stats(request: Request):
+    """
+    Semantic chat cache statistics.
+    
+    Returns:
+        dict: Hits, misses, hit rate, evictions, invalidations and size, or
+        {"enabled": False} when the cache is turned off
+    """
+    cache = _services(request).chat_cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+def _sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Format one server-sent event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def _chat_events(chat, query: str) -> AsyncIterator[str]:
+    """Stream a chat response as SSE token events, then a timing event."""
+    start = time.perf_counter()
+    ttft = None
+    try:
+        async for token in chat.astream_response(query):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+                observe("chat", "time_to_first_token", ttft)
+                log.debug("Chat time to first token", extra={"ttft_seconds": round(ttft, 3)})
+            yield _sse({"token": token})
+    except Exception as e:
+        yield _sse({"error": str(e)}, event="error")
+        return
+    yield _sse({
+        "ttft_seconds": round(ttft, 3) if ttft is not None else None,
+        "total_seconds": round(time.perf_counter() - start, 3)
+    }, event="done")
+
+@router.api_route("/chat/stream", methods=["GET", "POST"])
+async def chat_stream_endpoint(request: Request, query: str):
+    """
+    Chat with Jester, streaming the response as server-sent events.
+    
+    Each piece of the answer is sent as a `data: {"token": ...}` event as
+    soon as the model produces it, followed by an `event: done` carrying
+    time-to-first-token and total time, or an `event: error`. Clients that
+    can't consume SSE should use /chat.
+    
+    Args:
+        query: The user's query
+    """
+    return StreamingResponse(
+        _chat_events(_services(request).chat, query),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/search", response_model=SearchResponse)
+async def search_knowledge_base(request: Request, body: SearchRequest):
+    """
+    Search the knowledge base directly.
+    
+    Results are compact (metadata and a snippet) unless include_text is
+    set. When more results exist, next_cursor is returned; pass it back
+    with the same query and filters for the next page.
+    
+    Returns:
+        SearchResponse: Matching chunks, best first
+    """
+    try:
+        return await _services(request).search.search(
+            body.query,
+            k=body.k,
+            min_score=body.min_score,
+            filters=body.filters,
+            cursor=body.cursor,
+            include_text=body.include_text,
+            mode=body.mode
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/recommend-size", response_model=SizeRecommendationResponse)
+async def recommend_size(request: Request, body: SizeRecommendationRequest):
+    """
+    Recommend a brand's best-fitting sizes for a user's measurements.
+    
+    Served from the in-memory index of stored size guides; no database
+    queries are made per request.
+    
+    Returns:
+        SizeRecommendationResponse: Sizes ranked best first
+    """
+    recommender = _services(request).recommender
+    if recommender is None or not recommender.loaded:
+        raise HTTPException(status_code=503, detail="Size guides are not loaded yet")
+    try:
+        recommendations = recommender.recommend(
+            body.brand,
+            body.measurements,
+            unit=body.unit,
+            category_id=body.category_id,
+            gender_id=body.gender_id,
+            top_n=body.top_n
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No size guides for brand '{body.brand}'")
+    return {"brand": body.brand, "recommendations": recommendations}
+
+@router.get("/size-equivalence", response_model=SizeEquivalenceResponse)
+async def size_equivalence(
+    request: Request,
+    brand: str,
+    size: str,
+    target_brand: str,
+    category_id: Optional[int] = None,
+    gender_id: Optional[int] = None
+):
+    """
+    Find the sizes of target_brand equivalent to a size of brand.
+    
+    Answered from the precomputed equivalence table, per category and
+    gender (optionally only the given ones).
+    
+    Args:
+        brand: Brand the user knows their size in
+        size: That size's label, e.g. "M"
+        target_brand: Brand to translate the size to
+    
+    Returns:
+        SizeEquivalenceResponse: Matches best first within each category/gender
+    """
+    table = _services(request).size_equivalence
+    if table is None or not table.loaded:
+        raise HTTPException(status_code=503, detail="Size equivalences have not been computed yet")
+    try:
+        equivalents = table.lookup(brand, size, target_brand, category_id, gender_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"No size guides for brand '{e.args[0]}'")
+    return {
+        "brand": table.brand_name(brand),
+        "size_label": size,
+        "target_brand": table.brand_name(target_brand),
+        "equivalents": equivalents
+    }
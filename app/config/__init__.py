@@ -23,6 +23,40 @@ class Config:
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4-turbo-preview")
     OPENAI_VISION_MODEL = os.getenv("OPENAI_VISION_MODEL", "gpt-4-vision-preview")
     
+    # Shared OpenAI HTTP connection pool
+    OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 50))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 20))
+    OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", 30))  # seconds
+    OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", 120))
+    OPENAI_CONNECT_TIMEOUT_SECONDS = float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", 10))
+    OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 2))
+    
+    # Client-side rate limiting of OpenAI calls, per model. OPENAI_RATE_LIMITS
+    # is a JSON object of per-model overrides, e.g. {"gpt-4o": {"rpm": 500, "tpm": 30000}}
+    OPENAI_RATE_LIMIT_ENABLED = os.getenv("OPENAI_RATE_LIMIT_ENABLED", "true").lower() == "true"
+    OPENAI_DEFAULT_RPM = float(os.getenv("OPENAI_DEFAULT_RPM", 500))
+    OPENAI_DEFAULT_TPM = float(os.getenv("OPENAI_DEFAULT_TPM", 30000))
+    OPENAI_RATE_LIMITS = os.getenv(
+        "OPENAI_RATE_LIMITS", '{"text-embedding-3-small": {"rpm": 3000, "tpm": 1000000}}'
+    )
+    OPENAI_LIMITER_MAX_QUEUE = int(os.getenv("OPENAI_LIMITER_MAX_QUEUE", 100))  # waiting calls per model
+    OPENAI_LIMITER_MAX_WAIT_SECONDS = float(os.getenv("OPENAI_LIMITER_MAX_WAIT_SECONDS", 30))
+    
+    # Ask the vision model for schema-constrained compact JSON, falling back
+    # to the free-text prompt if that fails
+    VISION_STRUCTURED_OUTPUT = os.getenv("VISION_STRUCTURED_OUTPUT", "true").lower() == "true"
+    
+    # Vision image preprocessing
+    VISION_PREPROCESS_ENABLED = os.getenv("VISION_PREPROCESS_ENABLED", "true").lower() == "true"
+    VISION_MAX_LONG_EDGE = int(os.getenv("VISION_MAX_LONG_EDGE", 2048))
+    VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "PNG")  # PNG, JPEG or WEBP
+    VISION_IMAGE_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", 85))  # JPEG/WEBP only
+    
+    # Split screenshots holding several tables and extract each one separately
+    VISION_TILING_ENABLED = os.getenv("VISION_TILING_ENABLED", "true").lower() == "true"
+    VISION_TILE_MIN_GAP = int(os.getenv("VISION_TILE_MIN_GAP", 40))  # px of blank rows between tables
+    VISION_TILE_MIN_HEIGHT = int(os.getenv("VISION_TILE_MIN_HEIGHT", 120))  # px
+    
     # Database settings
     SUPABASE_URL = os.getenv("SUPABASE_URL")
     SUPABASE_KEY = os.getenv("SUPABASE_KEY")
@@ -37,6 +71,83 @@ class Config:
     VECTOR_INDEX_PATH = os.path.join(DATA_DIR, "vector_index.faiss")
     VECTOR_METADATA_PATH = os.path.join(DATA_DIR, "vector_metadata.json")
     
+    # Vision result cache
+    VISION_CACHE_ENABLED = os.getenv("VISION_CACHE_ENABLED", "true").lower() == "true"
+    VISION_CACHE_DIR = os.getenv("VISION_CACHE_DIR", os.path.join(DATA_DIR, "vision_cache"))
+    VISION_CACHE_MAX_ENTRIES = int(os.getenv("VISION_CACHE_MAX_ENTRIES", 1000))
+    VISION_CACHE_TTL_SECONDS = int(os.getenv("VISION_CACHE_TTL_SECONDS", 0))  # 0 = no expiry
+    
+    # Near-duplicate detection for uploaded size guides
+    NEAR_DUPLICATE_INDEX_PATH = os.getenv(
+        "NEAR_DUPLICATE_INDEX_PATH", os.path.join(DATA_DIR, "vector", "phash_index.jsonl")
+    )
+    NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", 6))  # bits of 64; matches are only reported
+
+    # Logging. Records are queued and written by a background thread. With
+    # LOG_LEVEL=DEBUG, debug records are kept for LOG_DEBUG_SAMPLE_RATE of requests.
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json or text
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", 0.01))  # fraction of requests
+    LOG_FILE = os.getenv("LOG_FILE")  # also write to this file
+    LOG_QUEUE_MAX_SIZE = int(os.getenv("LOG_QUEUE_MAX_SIZE", 10000))  # records buffered before dropping
+
+    # Prometheus-format latency metrics at /metrics
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    # Sampling profiler for API requests. Requests are profiled at
+    # PROFILER_SAMPLE_RATE when enabled, or on demand when they carry an
+    # X-Jester-Profile header equal to PROFILER_TOKEN.
+    PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+    PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", 0.01))  # fraction of requests
+    PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+    PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", 5))
+    PROFILER_DIR = os.getenv("PROFILER_DIR", os.path.join(DATA_DIR, "profiles"))
+    PROFILER_MAX_FILES = int(os.getenv("PROFILER_MAX_FILES", 200))
+
+    # Semantic cache of chat answers, keyed by query embedding
+    CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "true").lower() == "true"
+    CHAT_CACHE_THRESHOLD = float(os.getenv("CHAT_CACHE_THRESHOLD", 0.92))  # cosine similarity
+    CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", 1000))
+    CHAT_CACHE_TTL_SECONDS = int(os.getenv("CHAT_CACHE_TTL_SECONDS", 24 * 3600))  # 0 = no expiry
+
+    # Multi-file /process-size-guides uploads
+    BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 20))
+    BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 4))  # files extracted at once
+
+    # Write each extracted guide's sizes and measurements to the database,
+    # where recommendations are read from
+    STORE_SIZE_GUIDES = os.getenv("STORE_SIZE_GUIDES", "true").lower() == "true"
+
+    # Background size guide jobs
+    JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(DATA_DIR, "jobs"))
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))  # jobs processed concurrently
+    JOB_QUEUE_MAX_SIZE = int(os.getenv("JOB_QUEUE_MAX_SIZE", 100))  # waiting jobs before 503
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+    JOB_MAX_BACKOFF_SECONDS = float(os.getenv("JOB_MAX_BACKOFF_SECONDS", 60))  # jobs shed by the rate limiter
+    JOB_MAX_RETRY_SECONDS = float(os.getenv("JOB_MAX_RETRY_SECONDS", 900))  # since submission, then failed
+    JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", 7 * 24 * 3600))
+
+    # In-memory size recommendations over the size_guides tables
+    RECOMMEND_ENABLED = os.getenv("RECOMMEND_ENABLED", "true").lower() == "true"
+    RECOMMEND_REFRESH_SECONDS = int(os.getenv("RECOMMEND_REFRESH_SECONDS", 600))  # 0 = load once
+    RECOMMEND_TOLERANCES = os.getenv("RECOMMEND_TOLERANCES")  # JSON, e.g. {"chest": 1.5}, inches
+
+    # Knowledge base /search endpoint
+    SEARCH_MAX_K = int(os.getenv("SEARCH_MAX_K", 50))  # results per page
+    SEARCH_BATCH_MAX_SIZE = int(os.getenv("SEARCH_BATCH_MAX_SIZE", 32))  # queries encoded together
+    SEARCH_BATCH_MAX_WAIT_MS = float(os.getenv("SEARCH_BATCH_MAX_WAIT_MS", 5))
+    SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", 200))
+
+    # Validation rules held in memory and checked a whole chart at a time,
+    # reloaded every RECOMMEND_REFRESH_SECONDS when they have changed
+    VALIDATION_ENGINE_ENABLED = os.getenv("VALIDATION_ENGINE_ENABLED", "true").lower() == "true"
+
+    # Cross-brand size equivalences, recomputed when size guides change
+    EQUIVALENCE_PATH = os.getenv("EQUIVALENCE_PATH", os.path.join(DATA_DIR, "size_equivalence.json"))
+    EQUIVALENCE_PAD_INCHES = float(os.getenv("EQUIVALENCE_PAD_INCHES", 0.5))  # added to each side of a range
+    EQUIVALENCE_MIN_SCORE = float(os.getenv("EQUIVALENCE_MIN_SCORE", 0.1))  # overlap, 0-1
+    EQUIVALENCE_MAX_MATCHES = int(os.getenv("EQUIVALENCE_MAX_MATCHES", 3))
+
     @classmethod
     def get_all(cls) -> Dict[str, Any]:
         """Get all configuration values."""
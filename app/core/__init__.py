@@ -1,11 +1,21 @@
-from .vision import process_size_guide_image, run_vision_prompt, image_to_base64
+from .vision import (
+    process_size_guide_image,
+    process_size_guide_bytes,
+    run_vision_prompt,
+    stream_size_chart_rows,
+    image_to_base64,
+    prepare_vision_image
+)
 from .jester_chat import JesterChat
 from .vector_search import JesterVectorSearch
 
 __all__ = [
     'process_size_guide_image',
+    'process_size_guide_bytes',
     'run_vision_prompt',
+    'stream_size_chart_rows',
     'image_to_base64',
+    'prepare_vision_image',
     'JesterChat',
     'JesterVectorSearch'
 ]
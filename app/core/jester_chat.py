@@ -5,12 +5,58 @@ This module provides the chat functionality for the application.
 
 import streamlit as st
 import openai
-from typing import List, Dict, Any, Optional
+import asyncio
+import re
+import threading
+from typing import List, Dict, Any, AsyncIterator, Callable, FrozenSet, Iterator, Optional, Set, Tuple
 from .vector_search import JesterVectorSearch
+from .openai_client import get_openai_client
+from .rate_limiter import estimate_tokens, rate_limited, rate_limited_sync
+from ..utils.lexical_index import tokenize
+from ..utils.semantic_cache import SemanticCache
+from ..utils.metrics import count_cache_lookup, timed
 import json
 import os
 from app.config import config
 
+# Analysis calls set no max_tokens; budget for a long answer
+ANALYSIS_MAX_TOKENS = 1500
+
+# Letter sizes (XS, 2XL, ...) and numeric sizes or measurements (32, 10.5)
+_SIZE_TOKEN = re.compile(r"(?:x{0,3}s|m|x{0,3}l|[2-5]xl?|\d+(?:\.\d+)?)")
+# "what's", "I'm": not sizes S and M
+_CONTRACTION = re.compile(r"['’](?:s|m|ll|re|ve|d|t)\b")
+
+
+def chunk_brand(chunk: Dict[str, Any]) -> Optional[str]:
+    """Brand of a stored size guide, from its metadata or its JSON text."""
+    metadata = chunk.get("metadata")
+    if isinstance(metadata, dict) and metadata.get("brand"):
+        return str(metadata["brand"])
+    text = chunk.get("text", "")
+    if text.startswith("{"):
+        try:
+            brand = (json.loads(text).get("metadata") or {}).get("brand")
+        except (ValueError, AttributeError):
+            return None
+        return str(brand) if brand else None
+    return None
+
+
+def query_entities(query: str, brands: Set[str]) -> FrozenSet[str]:
+    """
+    The brands (from brands) and size tokens a query names. Cached answers
+    are only shared between queries naming the same ones.
+    """
+    tokens = tokenize(_CONTRACTION.sub(" ", query.lower()))
+    entities = {token for token in tokens if _SIZE_TOKEN.fullmatch(token)}
+    words = f" {' '.join(tokens)} "
+    for brand in brands:
+        brand_tokens = tokenize(brand)
+        if brand_tokens and f" {' '.join(brand_tokens)} " in words:
+            entities.add("brand:" + " ".join(brand_tokens))
+    return frozenset(entities)
+
 class JesterChat:
     """
     JesterChat class for handling chat interactions with the Jester AI.
@@ -19,15 +65,36 @@ class JesterChat:
     adding information to the knowledge base, and managing chat history.
     """
     
-    def __init__(self):
-        """Initialize Jester with vector search capabilities and expert knowledge."""
+    def __init__(
+        self,
+        vector_search: Optional[JesterVectorSearch] = None,
+        response_cache: Optional[SemanticCache] = None
+    ):
+        """
+        Initialize Jester with vector search capabilities and expert knowledge.
+        
+        Args:
+            vector_search: Knowledge base to use. Pass the app's shared
+                instance so the model and index are only loaded once; a new
+                one is loaded if omitted.
+            response_cache: Optional cache of answers to earlier, similar
+                questions, used by the async response methods for queries
+                without chat history
+        """
+        self.response_cache = response_cache
+        self._brands: Set[str] = set()
+        self._brands_scanned = 0
+        self._brands_lock = threading.Lock()
         # Create data directories if they don't exist
         os.makedirs("data/vector", exist_ok=True)
         
-        self.vector_search = JesterVectorSearch(
+        self.vector_search = vector_search or JesterVectorSearch(
             index_path="data/vector/faiss_index",
             chunks_path="data/vector/chunks.json"
         )
+        if response_cache is not None:
+            # New chunks only invalidate answers whose context they would join
+            self.vector_search.add_listener(response_cache.invalidate_near)
         
         self.system_prompt = """You are Jester, an expert AI assistant specializing in apparel size guide analysis and standardization. Your core capabilities include:
 
@@ -67,23 +134,16 @@ When processing a size guide:
 
 Your goal is to ensure accurate, consistent size guide processing while being flexible enough to handle any format or edge case."""
 
-    def analyze_size_guide(self, image_analysis: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Analyze a size guide using GPT-4's understanding and available context.
-        
-        Args:
-            image_analysis: The raw analysis from GPT-4 Vision
-            metadata: Basic metadata about the size guide
-            
-        Returns:
-            Dict containing structured analysis and recommendations
-        """
-        # Get relevant context from our knowledge base
-        context_results = self.vector_search.search(
-            f"size guide processing for {metadata.get('brand', '')} {metadata.get('category', '')}",
-            k=3
-        )
-        
+    def _analysis_query(self, metadata: Dict[str, Any]) -> str:
+        return f"size guide processing for {metadata.get('brand', '')} {metadata.get('category', '')}"
+
+    def _analysis_messages(
+        self,
+        image_analysis: Dict[str, Any],
+        metadata: Dict[str, Any],
+        context_results: List[Dict[str, Any]]
+    ) -> List[Dict[str, str]]:
+        """Build the completion messages for analyze_size_guide."""
         # Build context from search results
         context = "\n\n".join([
             f"Context {i+1}:\n{result['text']}"
@@ -107,15 +167,34 @@ Please provide:
 
 Explain your reasoning for any non-obvious decisions."""
 
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": analysis_prompt}
+        ]
+
+    def analyze_size_guide(self, image_analysis: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Analyze a size guide using GPT-4's understanding and available context.
+        
+        Args:
+            image_analysis: The raw analysis from GPT-4 Vision
+            metadata: Basic metadata about the size guide
+            
+        Returns:
+            Dict containing structured analysis and recommendations
+        """
+        # Get relevant context from our knowledge base
+        context_results = self.vector_search.search(self._analysis_query(metadata), k=3)
+
         # Get GPT-4's analysis
-        response = openai.chat.completions.create(
-            model=config.OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": analysis_prompt}
-            ],
-            temperature=0.7
-        )
+        messages = self._analysis_messages(image_analysis, metadata, context_results)
+        with rate_limited_sync(config.OPENAI_MODEL, estimate_tokens(messages, ANALYSIS_MAX_TOKENS)) as reservation:
+            response = openai.chat.completions.create(
+                model=config.OPENAI_MODEL,
+                messages=messages,
+                temperature=0.7
+            )
+            reservation.record(response.usage)
         
         # Extract and structure the response
         analysis = response.choices[0].message.content
@@ -132,20 +211,55 @@ Explain your reasoning for any non-obvious decisions."""
             "metadata": metadata
         }
 
-    def get_response(self, user_input: str, chat_history: List[Dict[str, str]] = None) -> str:
+    async def aanalyze_size_guide(self, image_analysis: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Generate a response using the chat history and vector search context.
+        Async version of analyze_size_guide.
+        
+        Uses the shared pooled client and keeps the encoder off the event loop.
+        """
+        context_results = await asyncio.to_thread(
+            self.vector_search.search, self._analysis_query(metadata), 3
+        )
+
+        messages = self._analysis_messages(image_analysis, metadata, context_results)
+        async with rate_limited(config.OPENAI_MODEL, estimate_tokens(messages, ANALYSIS_MAX_TOKENS)) as reservation:
+            response = await get_openai_client().chat.completions.create(
+                model=config.OPENAI_MODEL,
+                messages=messages,
+                temperature=0.7
+            )
+            reservation.record(response.usage)
+        analysis = response.choices[0].message.content
+
+        await asyncio.to_thread(
+            self.add_to_knowledge_base,
+            f"Size Guide Analysis - {metadata.get('brand')}:\n{analysis}",
+            metadata
+        )
+        
+        return {
+            "analysis": analysis,
+            "context_used": context_results,
+            "metadata": metadata
+        }
+
+    def _build_messages(
+        self,
+        user_input: str,
+        search_results: List[Dict[str, Any]],
+        chat_history: List[Dict[str, str]] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Build the completion messages for a query.
         
         Args:
             user_input: The user's input query
+            search_results: Vector search results for the query
             chat_history: Optional list of previous chat messages
             
         Returns:
-            str: The AI's response
+            List[Dict[str, str]]: Messages for the chat completions API
         """
-        # Get relevant context from vector search
-        search_results = self.vector_search.search(user_input, k=3)
-        
         # Construct the context from search results
         context = "\n\n".join([
             f"Context {i+1}:\n{result['text']}"
@@ -164,17 +278,185 @@ Explain your reasoning for any non-obvious decisions."""
         
         # Add the current user input
         messages.append({"role": "user", "content": user_input})
+        return messages
+
+    async def _aprepare(
+        self,
+        user_input: str,
+        chat_history: List[Dict[str, str]] = None
+    ) -> Tuple[Optional[str], List[Dict[str, str]], Optional[Callable[[str], None]]]:
+        """
+        Encode the query in a worker thread, check the response cache and
+        build the completion messages.
         
-        # Call OpenAI API
-        response = openai.chat.completions.create(
-            model=config.OPENAI_MODEL,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1000
+        Returns:
+            (cached response or None, messages, callback that caches the
+            final response or None when the query isn't cacheable)
+        """
+        embedding = await asyncio.to_thread(self.vector_search.encode_query, user_input)
+
+        cacheable = self.response_cache is not None and not chat_history
+        if cacheable:
+            # Similar wording isn't enough: the brands and sizes must match too
+            scope = await asyncio.to_thread(self._query_entities, user_input)
+            cached = self.response_cache.lookup(embedding, scope)
+            count_cache_lookup("chat", cached is not None)
+            if cached is not None:
+                return cached, [], None
+            version = self.vector_search.version
+
+        k = 3
+        search_results = await asyncio.to_thread(self.vector_search.search_by_embedding, embedding, k)
+        messages = self._build_messages(user_input, search_results, chat_history)
+        if not cacheable:
+            return None, messages, None
+
+        # Chunks closer than the farthest one used would change the context
+        # (similarity is 1 / (1 + squared distance)); with fewer than k
+        # results any new chunk would
+        reach = (
+            max(1.0 / result["similarity"] - 1.0 for result in search_results)
+            if len(search_results) == k else float("inf")
+        )
+
+        def remember(response: str):
+            # Chunks added since the search could belong in this answer's context
+            if self.vector_search.version == version:
+                self.response_cache.store(embedding, scope, response, reach=reach)
+
+        return None, messages, remember
+
+    def _query_entities(self, query: str) -> FrozenSet[str]:
+        """Entities of query, with brands read from chunks added since the last call."""
+        chunks = self.vector_search.chunks
+        with self._brands_lock:
+            added = chunks[self._brands_scanned:]
+            for chunk in added:
+                brand = chunk_brand(chunk)
+                if brand:
+                    self._brands.add(brand)
+            self._brands_scanned += len(added)
+            return query_entities(query, self._brands)
+
+    def get_response(self, user_input: str, chat_history: List[Dict[str, str]] = None) -> str:
+        """
+        Generate a response using the chat history and vector search context.
+        
+        Args:
+            user_input: The user's input query
+            chat_history: Optional list of previous chat messages
+            
+        Returns:
+            str: The AI's response
+        """
+        messages = self._build_messages(
+            user_input, self.vector_search.search(user_input, k=3), chat_history
         )
         
+        # Call OpenAI API
+        with rate_limited_sync(config.OPENAI_MODEL, estimate_tokens(messages, 1000)) as reservation:
+            response = openai.chat.completions.create(
+                model=config.OPENAI_MODEL,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000
+            )
+            reservation.record(response.usage)
+        
         return response.choices[0].message.content
 
+    def stream_response(self, user_input: str, chat_history: List[Dict[str, str]] = None) -> Iterator[str]:
+        """
+        Generate a response like get_response, yielding text as it is produced.
+        
+        Args:
+            user_input: The user's input query
+            chat_history: Optional list of previous chat messages
+            
+        Yields:
+            str: Pieces of the AI's response, in order
+        """
+        messages = self._build_messages(
+            user_input, self.vector_search.search(user_input, k=3), chat_history
+        )
+        with rate_limited_sync(config.OPENAI_MODEL, estimate_tokens(messages, 1000)):
+            stream = openai.chat.completions.create(
+                model=config.OPENAI_MODEL,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000,
+                stream=True
+            )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def aget_response(self, user_input: str, chat_history: List[Dict[str, str]] = None) -> str:
+        """
+        Async version of get_response, using the shared pooled client.
+        
+        Args:
+            user_input: The user's input query
+            chat_history: Optional list of previous chat messages
+            
+        Returns:
+            str: The AI's response
+        """
+        cached, messages, remember = await self._aprepare(user_input, chat_history)
+        if cached is not None:
+            return cached
+
+        async with rate_limited(config.OPENAI_MODEL, estimate_tokens(messages, 1000)) as reservation:
+            with timed("chat", "completion"):
+                response = await get_openai_client().chat.completions.create(
+                    model=config.OPENAI_MODEL,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=1000
+                )
+            reservation.record(response.usage)
+        
+        answer = response.choices[0].message.content
+        if remember and answer:
+            remember(answer)
+        return answer
+
+    async def astream_response(self, user_input: str, chat_history: List[Dict[str, str]] = None) -> AsyncIterator[str]:
+        """
+        Async version of stream_response, using the shared pooled client.
+        
+        Args:
+            user_input: The user's input query
+            chat_history: Optional list of previous chat messages
+            
+        Yields:
+            str: Pieces of the AI's response, in order. A cached response
+            is yielded whole.
+        """
+        cached, messages, remember = await self._aprepare(user_input, chat_history)
+        if cached is not None:
+            yield cached
+            return
+
+        async with rate_limited(config.OPENAI_MODEL, estimate_tokens(messages, 1000)):
+            with timed("chat", "stream_open"):
+                stream = await get_openai_client().chat.completions.create(
+                    model=config.OPENAI_MODEL,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=1000,
+                    stream=True
+                )
+        pieces = []
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                pieces.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+
+        # Only complete answers are cached
+        if remember and pieces:
+            remember("".join(pieces))
+
     def add_to_knowledge_base(self, text: str, metadata: Dict[str, Any] = None):
         """
         Add new information to the vector search knowledge base.
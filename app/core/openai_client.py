@@ -0,0 +1,48 @@
+"""
+Shared OpenAI client for the Jester application.
+
+Every async OpenAI call in the app goes through one AsyncOpenAI instance
+backed by one pooled httpx client, so connections (and their TLS
+handshakes) are kept alive and reused, and the number of open connections
+is bounded by Config.
+"""
+
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.config import config
+
+_client: Optional[AsyncOpenAI] = None
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Return the shared AsyncOpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=config.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=config.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=config.OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                config.OPENAI_TIMEOUT_SECONDS,
+                connect=config.OPENAI_CONNECT_TIMEOUT_SECONDS,
+            ),
+        )
+        _client = AsyncOpenAI(
+            api_key=config.OPENAI_API_KEY,
+            http_client=http_client,
+            max_retries=config.OPENAI_MAX_RETRIES,
+        )
+    return _client
+
+
+async def close_openai_client():
+    """Close the shared client's connections, e.g. on application shutdown."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,291 @@
+"""
+Admission control for OpenAI calls.
+
+Every vision, chat and embedding call reserves capacity from a per-model
+limiter before it is sent. Each limiter has two token buckets, one for
+requests per minute and one for tokens per minute, sized from Config to
+stay under the account's rate limits instead of discovering them through
+429s and retry storms.
+
+Calls that can't be admitted immediately wait in a priority queue:
+interactive requests (chat, single uploads) go ahead of bulk work (the job
+queue), which callers mark with `priority(Priority.BULK)`. Limiters are
+per process; a separate process such as scripts/bulk_ingest.py has its
+own budget and doesn't yield to the API server.
+When the queue is full, or a call would wait longer than the configured
+limit, OverloadedError is raised straight away so the API can shed load
+with a 503 rather than pile up requests.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Dict, List, Optional
+
+from app.config import config
+from app.utils.metrics import timed
+
+
+class Priority(IntEnum):
+    """Queue priority; lower values are admitted first."""
+    INTERACTIVE = 0
+    BULK = 1
+
+
+_current_priority: ContextVar[Priority] = ContextVar("openai_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def priority(level: Priority):
+    """Run OpenAI calls made inside the block (and tasks it starts) at this priority."""
+    token = _current_priority.set(level)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class OverloadedError(Exception):
+    """Raised when a call is shed instead of queued."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Bucket refilled continuously at per_minute / 60 per second, holding
+    at most one minute's worth.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available (0 if it is now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def credit(self, amount: float):
+        """Return (or, if negative, charge) tokens after the fact."""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ModelLimiter:
+    """
+    Request and token budgets for one model.
+
+    Args:
+        model: Model name, used in error messages
+        rpm: Requests per minute
+        tpm: Tokens per minute (prompt plus completion)
+        max_queue: Calls allowed to wait before new ones are shed
+        max_wait: Seconds a call may wait before it is shed
+    """
+
+    def __init__(self, model: str, rpm: float, tpm: float, max_queue: int = 100, max_wait: float = 30.0):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._waiters: List[Any] = []  # heap of (priority, seq, tokens, future)
+        self._seq = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _try_take(self, tokens: float) -> float:
+        """Take capacity for one call if available; else return the wait."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait <= 0:
+                self.requests.take(1)
+                self.tokens.take(tokens)
+            return wait
+
+    def settle(self, estimated: float, actual: float):
+        """Correct the token bucket once a call's real usage is known."""
+        with self._lock:
+            self.tokens.credit(estimated - actual)
+
+    async def acquire(self, tokens: float, level: Optional[Priority] = None):
+        """
+        Wait until the call may be sent.
+
+        Raises:
+            OverloadedError: If the queue is full or the wait exceeds max_wait
+        """
+        level = _current_priority.get() if level is None else level
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # First use, or the limiter outlived an earlier event loop
+            self._loop, self._dispatcher, self._waiters = loop, None, []
+
+        if not self._waiters and self._try_take(tokens) <= 0:
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise OverloadedError(
+                f"{self.model}: {len(self._waiters)} requests already waiting",
+                retry_after=self._estimated_drain()
+            )
+
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (int(level), next(self._seq), tokens, future))
+        self._wake()
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            raise OverloadedError(
+                f"{self.model}: waited over {self.max_wait:.0f}s for rate limit capacity",
+                retry_after=self._estimated_drain()
+            )
+
+    def acquire_blocking(self, tokens: float):
+        """
+        Synchronous acquire for callers outside the event loop. They don't
+        join the priority queue, but draw from the same budgets.
+        """
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = self._try_take(tokens)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise OverloadedError(
+                    f"{self.model}: rate limit capacity not available within {self.max_wait:.0f}s",
+                    retry_after=wait
+                )
+            time.sleep(wait)
+
+    def _estimated_drain(self) -> float:
+        """Rough seconds until the current queue is admitted."""
+        return max(1.0, len(self._waiters) / max(self.requests.rate, 1e-9))
+
+    def _wake(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        else:
+            self._wakeup.set()
+
+    async def _dispatch(self):
+        """Admit queued calls in priority order as capacity refills."""
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():  # Timed out or cancelled
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._try_take(tokens)
+            if wait <= 0:
+                heapq.heappop(self._waiters)
+                future.set_result(None)
+                continue
+            # Sleep until capacity refills, or a new (maybe higher priority) call arrives
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+
+_limiters: Dict[str, ModelLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _model_limits(model: str) -> Dict[str, float]:
+    overrides = json.loads(config.OPENAI_RATE_LIMITS or "{}")
+    limits = {"rpm": config.OPENAI_DEFAULT_RPM, "tpm": config.OPENAI_DEFAULT_TPM}
+    limits.update(overrides.get(model, {}))
+    return limits
+
+
+def get_limiter(model: str) -> Optional[ModelLimiter]:
+    """The shared limiter for a model, or None when rate limiting is off."""
+    if not config.OPENAI_RATE_LIMIT_ENABLED:
+        return None
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limits = _model_limits(model)
+            limiter = _limiters[model] = ModelLimiter(
+                model,
+                rpm=limits["rpm"],
+                tpm=limits["tpm"],
+                max_queue=config.OPENAI_LIMITER_MAX_QUEUE,
+                max_wait=config.OPENAI_LIMITER_MAX_WAIT_SECONDS,
+            )
+        return limiter
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_tokens: int, extra: int = 0) -> int:
+    """
+    Rough token cost of a chat call: about four characters per prompt
+    token, plus the completion budget and any extra (e.g. image) tokens.
+    """
+    chars = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            chars += sum(len(part.get("text", "")) for part in content if isinstance(part, dict))
+    return chars // 4 + max_tokens + extra
+
+
+class Reservation:
+    """Capacity reserved for one call; record() settles it against real usage."""
+
+    def __init__(self, limiter: Optional[ModelLimiter], estimated: float):
+        self.limiter = limiter
+        self.estimated = estimated
+
+    def record(self, usage: Any):
+        """Pass the response's usage object to correct the token estimate."""
+        total = getattr(usage, "total_tokens", None)
+        if self.limiter is not None and total is not None:
+            self.limiter.settle(self.estimated, total)
+
+
+@asynccontextmanager
+async def rate_limited(model: str, estimated_tokens: float):
+    """Reserve capacity for an async OpenAI call made inside the block."""
+    limiter = get_limiter(model)
+    if limiter is not None:
+        with timed("rate_limiter", "wait"):
+            await limiter.acquire(estimated_tokens)
+    yield Reservation(limiter, estimated_tokens)
+
+
+@contextmanager
+def rate_limited_sync(model: str, estimated_tokens: float):
+    """Reserve capacity for a synchronous OpenAI call made inside the block."""
+    limiter = get_limiter(model)
+    if limiter is not None:
+        with timed("rate_limiter", "wait"):
+            limiter.acquire_blocking(estimated_tokens)
+    yield Reservation(limiter, estimated_tokens)
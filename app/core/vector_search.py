@@ -5,12 +5,15 @@ Vector search implementation for Jester's knowledge base.
 import json
 import numpy as np
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from sentence_transformers import SentenceTransformer
 import faiss
 import os
+import threading
 from dotenv import load_dotenv
 
+from app.utils.metrics import timed
+
 load_dotenv()
 
 class JesterVectorSearch:
@@ -30,6 +33,17 @@ class JesterVectorSearch:
         self.model = SentenceTransformer(model_name)
         self.index_path = Path(index_path)
         self.chunks_path = Path(chunks_path)
+        # Requests search and add chunks from worker threads; FAISS indexes
+        # aren't safe to search while being added to, and the index and
+        # chunks list must change together
+        self._lock = threading.RLock()
+        # Saves run outside _lock from a snapshot; this orders them and
+        # lets an older snapshot be skipped once a newer one is on disk
+        self._save_lock = threading.Lock()
+        self._generation = 0
+        self._saved_generation = 0
+        # Called with the embeddings of newly added chunks
+        self._listeners: List[Callable[[np.ndarray], Any]] = []
         
         # Initialize or load index and chunks
         self._load_or_create_index()
@@ -46,46 +60,105 @@ class JesterVectorSearch:
             self.chunks = []
             self._save_state()
 
+    @property
+    def version(self) -> int:
+        """
+        Changes whenever the knowledge base changes.
+        
+        Chunks are only ever appended, so the chunk count serves as a
+        version; search cursors are tied to it.
+        """
+        return len(self.chunks)
+
+    def add_listener(self, callback: Callable[[np.ndarray], Any]):
+        """Call callback with the embeddings of chunks whenever chunks are added."""
+        self._listeners.append(callback)
+
+    def _notify(self, embeddings: np.ndarray):
+        for callback in self._listeners:
+            callback(embeddings)
+
+    @timed("vector_search", "encode_query")
+    def encode_query(self, query: str) -> np.ndarray:
+        """Embed a query for search_by_embedding."""
+        return self.model.encode([query])[0]
+
+    @timed("vector_search", "encode_queries")
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed several queries in one model call."""
+        return self.model.encode(queries)
+
     def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
         """Search for similar content using the query."""
         if len(self.chunks) == 0:
             return []
         
-        # Encode query
-        query_embedding = self.model.encode([query])[0]
-        
-        # Search the index
-        distances, indices = self.index.search(
-            query_embedding.reshape(1, -1).astype('float32'), 
-            k
-        )
-        
-        # Get results
+        return self.search_by_embedding(self.encode_query(query), k)
+
+    def search_by_embedding(self, query_embedding: np.ndarray, k: int = 3) -> List[Dict[str, Any]]:
+        """Search with an already encoded query (see encode_query)."""
         results = []
-        for idx, distance in zip(indices[0], distances[0]):
-            if idx < len(self.chunks):  # Ensure index is valid
+        with self._lock:
+            for idx, similarity in zip(*self.rank(query_embedding, k)):
                 chunk = self.chunks[idx].copy()
-                chunk['similarity'] = float(1.0 / (1.0 + distance))  # Convert distance to similarity
+                chunk['similarity'] = similarity
                 results.append(chunk)
-        
         return results
 
+    def rank(self, query_embedding: np.ndarray, k: int) -> Tuple[List[int], List[float]]:
+        """
+        Chunk ids of the k nearest chunks and their similarities, best first.
+        """
+        with self._lock:
+            if len(self.chunks) == 0 or self.index.ntotal == 0 or k <= 0:
+                return [], []
+            
+            # Search the index
+            with timed("vector_search", "index_search"):
+                distances, indices = self.index.search(
+                    query_embedding.reshape(1, -1).astype('float32'), 
+                    min(k, self.index.ntotal)
+                )
+            chunk_count = len(self.chunks)
+        
+        # FAISS pads missing neighbours with -1
+        ids, similarities = [], []
+        for idx, distance in zip(indices[0], distances[0]):
+            if 0 <= idx < chunk_count:
+                ids.append(int(idx))
+                similarities.append(float(1.0 / (1.0 + distance)))  # Convert distance to similarity
+        return ids, similarities
+
+    def warm_up(self):
+        """
+        Run one encode and one search so the first real query doesn't pay
+        for lazy model and index initialization.
+        """
+        embedding = self.model.encode(["warm-up query"])[0]
+        with self._lock:
+            if self.index.ntotal > 0:
+                self.index.search(embedding.reshape(1, -1).astype('float32'), 1)
+
     def add_chunk(self, text: str, metadata: Optional[Dict[str, Any]] = None):
         """Add a single text chunk to the vector store."""
         # Encode text
-        embedding = self.model.encode([text])[0]
-        
-        # Add to FAISS index
-        self.index.add(np.array([embedding]).astype('float32'))
+        with timed("vector_search", "encode"):
+            embedding = self.model.encode([text])[0]
         
-        # Store text and metadata
-        self.chunks.append({
-            "text": text,
-            "metadata": metadata or {}
-        })
+        with self._lock:
+            # Add to FAISS index
+            self.index.add(np.array([embedding]).astype('float32'))
+            
+            # Store text and metadata
+            self.chunks.append({
+                "text": text,
+                "metadata": metadata or {}
+            })
+            snapshot = self._snapshot()
         
-        # Save updates
-        self._save_state()
+        # Save updates without holding up searches
+        self._save_state(snapshot)
+        self._notify(np.array([embedding]).astype('float32'))
         
     def batch_add_chunks(self, texts: List[str], metadata_list: Optional[List[Dict[str, Any]]] = None):
         """Add multiple chunks efficiently."""
@@ -93,29 +166,61 @@ class JesterVectorSearch:
             metadata_list = [{} for _ in texts]
             
         # Encode all texts
-        embeddings = self.model.encode(texts)
-        
-        # Add to FAISS index
-        self.index.add(embeddings.astype('float32'))
+        with timed("vector_search", "encode_batch"):
+            embeddings = self.model.encode(texts)
         
-        # Store texts and metadata
-        for text, metadata in zip(texts, metadata_list):
-            self.chunks.append({
-                "text": text,
-                "metadata": metadata
-            })
+        with self._lock:
+            # Add to FAISS index
+            self.index.add(embeddings.astype('float32'))
             
-        # Save updates
-        self._save_state()
+            # Store texts and metadata
+            for text, metadata in zip(texts, metadata_list):
+                self.chunks.append({
+                    "text": text,
+                    "metadata": metadata
+                })
+            snapshot = self._snapshot()
+            
+        # Save updates without holding up searches
+        self._save_state(snapshot)
+        self._notify(embeddings.astype('float32'))
+        
+    def _snapshot(self) -> Tuple[int, Any, List[Dict[str, Any]]]:
+        """Copy the index and chunks list for _save_state. Call with _lock held."""
+        self._generation += 1
+        with timed("vector_search", "snapshot"):
+            return self._generation, faiss.clone_index(self.index), list(self.chunks)
+
+    def _save_state(self, snapshot: Optional[Tuple[int, Any, List[Dict[str, Any]]]] = None):
+        """
+        Save index and chunks to disk, from a snapshot taken by _snapshot.
         
-    def _save_state(self):
-        """Save index and chunks to disk."""
-        # Save FAISS index
-        faiss.write_index(self.index, str(self.index_path))
+        Each file is written to a temporary file and renamed into place, so
+        a crash never leaves a half-written one. A snapshot older than the
+        last one saved is skipped.
+        """
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot()
+        generation, index, chunks = snapshot
         
-        # Save chunks
-        with open(self.chunks_path, 'w') as f:
-            json.dump(self.chunks, f)
+        with self._save_lock:
+            if generation <= self._saved_generation:
+                return
+            
+            # Save FAISS index
+            with timed("vector_search", "write_index"):
+                temporary = f"{self.index_path}.tmp"
+                faiss.write_index(index, temporary)
+                os.replace(temporary, self.index_path)
+            
+            # Save chunks
+            with timed("vector_search", "json_dump"):
+                temporary = f"{self.chunks_path}.tmp"
+                with open(temporary, 'w') as f:
+                    json.dump(chunks, f)
+                os.replace(temporary, self.chunks_path)
+            self._saved_generation = generation
 
     def initialize_with_research(self, research_file: str):
         """Initialize the knowledge base with research documents."""
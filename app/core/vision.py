@@ -1,23 +1,70 @@
 import openai
-from openai import AsyncOpenAI
+import asyncio
 import base64
+import numpy as np
 import os
 import json
 import datetime
-from typing import Optional, Dict, Any
+import threading
+from typing import Optional, Dict, Any, List, Tuple, Union, BinaryIO, AsyncIterator
 from dotenv import load_dotenv
 from ..utils.vector_mapper import match_to_standard
+from ..utils.image_preprocessing import MAX_IMAGE_TOKENS, PreprocessedImage, preprocess_image
+from ..utils.vision_cache import VisionCache, prompt_version
+from ..utils.image_tiling import split_tables, merge_partial_results
+from ..utils.vision_schema import SIZE_CHART_SCHEMA, STRUCTURED_PROMPT_SUFFIX, compact_to_chart
+from ..utils.json_stream import IncrementalJSONParser
+from ..utils.log import get_logger
+from ..utils.metrics import count_cache_lookup, timed
+from ..utils.size_normalizer import normalize_chart, normalize_unit
+from app.config import config
+from .openai_client import get_openai_client
+from .rate_limiter import estimate_tokens, rate_limited
 
 # Load the .env file
-env_loaded = load_dotenv()
-print(f"✅ .env loaded? {'Yes' if env_loaded else 'No'}")
+load_dotenv()
 
-# Retrieve the API key from the environment
-api_key = os.getenv("OPENAI_API_KEY")
-print(f"✅ API KEY FOUND? {'Yes' if api_key else 'No'}")
+log = get_logger("vision")
 
-# Initialize the async OpenAI client
-client = AsyncOpenAI(api_key=api_key)
+VISION_MODEL = "gpt-4o"
+VISION_PROMPT = (
+    "Here is a screenshot of a clothing size chart. "
+    "Extract the measurements in structured JSON format. "
+    "Do NOT double chest or waist values unless the label explicitly says something like '1/2 chest', 'pit to pit', or 'body width'. "
+    "If it only says 'Chest' or 'Waist', assume it's a full-body circumference. "
+    "Make sure the size chart is returned with clear measurement labels for each size."
+)
+VISION_STRUCTURED_PROMPT = VISION_PROMPT + STRUCTURED_PROMPT_SUFFIX
+# Cached results are keyed by this, so editing either prompt or the schema
+# invalidates them
+VISION_PROMPT_VERSION = prompt_version(
+    VISION_PROMPT + VISION_STRUCTURED_PROMPT + json.dumps(SIZE_CHART_SCHEMA, sort_keys=True)
+)
+
+_vision_cache: Optional[VisionCache] = None
+_vision_cache_lock = threading.Lock()
+
+
+def get_vision_cache() -> Optional[VisionCache]:
+    """
+    Return the shared vision result cache, or None if caching is disabled.
+    The first call scans the cache directory, so async code calls it in a
+    worker thread.
+    """
+    global _vision_cache
+    if not config.VISION_CACHE_ENABLED:
+        return None
+    with _vision_cache_lock:
+        if _vision_cache is None:
+            cache = VisionCache(
+                config.VISION_CACHE_DIR,
+                max_entries=config.VISION_CACHE_MAX_ENTRIES,
+                ttl_seconds=config.VISION_CACHE_TTL_SECONDS
+            )
+            # Drop results produced by earlier versions of the prompt
+            cache.invalidate(keep_prompt_version=VISION_PROMPT_VERSION)
+            _vision_cache = cache
+    return _vision_cache
 
 
 def image_to_base64(path: str) -> str:
@@ -40,38 +87,97 @@ def get_image_mime_type(path: str) -> str:
     return mime_types.get(ext, 'image/jpeg')  # Default to JPEG if unknown
 
 
-async def run_vision_prompt(image_path: str) -> str:
-    """Run GPT-4 Vision analysis on a size guide image."""
-    base64_image = image_to_base64(image_path)
-    mime_type = get_image_mime_type(image_path)
-
-    response = await client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": (
-                            "Here is a screenshot of a clothing size chart. "
-                            "Extract the measurements in structured JSON format. "
-                            "Do NOT double chest or waist values unless the label explicitly says something like '1/2 chest', 'pit to pit', or 'body width'. "
-                            "If it only says 'Chest' or 'Waist', assume it's a full-body circumference. "
-                            "Make sure the size chart is returned with clear measurement labels for each size."
-                        )
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:{mime_type};base64,{base64_image}"
-                        }
+@timed("vision", "preprocess")
+def prepare_vision_image(source: Union[str, bytes], filename: Optional[str] = None) -> PreprocessedImage:
+    """
+    Load a size guide image and shrink it for the vision request.
+
+    Falls back to the original bytes when preprocessing is disabled or the
+    image can't be decoded by Pillow.
+
+    Args:
+        source: Path to the image, or the image bytes themselves
+        filename: Original file name, used for the MIME type when source is bytes
+    """
+    if isinstance(source, bytes):
+        data = source
+        filename = filename or ""
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+        filename = filename or source
+
+    if not config.VISION_PREPROCESS_ENABLED:
+        return PreprocessedImage.passthrough(data, get_image_mime_type(filename))
+
+    try:
+        return preprocess_image(
+            data,
+            max_long_edge=config.VISION_MAX_LONG_EDGE,
+            image_format=config.VISION_IMAGE_FORMAT,
+            quality=config.VISION_IMAGE_QUALITY
+        )
+    except (OSError, ValueError) as e:
+        log.warning("Image preprocessing failed, sending original: %s", e)
+        return PreprocessedImage.passthrough(data, get_image_mime_type(filename))
+
+
+def _vision_messages(image: PreprocessedImage, structured: bool) -> List[Dict[str, Any]]:
+    """Build the chat messages for a vision extraction request."""
+    base64_image = base64.b64encode(image.data).decode("utf-8")
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": VISION_STRUCTURED_PROMPT if structured else VISION_PROMPT
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{image.mime_type};base64,{base64_image}"
                     }
-                ]
-            }
-        ],
-        max_tokens=2000
-    )
+                }
+            ]
+        }
+    ]
+
+
+def _image_tokens(image: PreprocessedImage) -> int:
+    """Estimated image tokens, assuming the worst case when Pillow couldn't read the size."""
+    return image.estimated_tokens or MAX_IMAGE_TOKENS
+
+
+async def run_vision_prompt(
+    image_path: Optional[str] = None,
+    image: Optional[PreprocessedImage] = None,
+    structured: bool = False
+) -> str:
+    """
+    Run GPT-4 Vision analysis on a size guide image, given its path or a prepared image.
+
+    With structured=True the model is held to SIZE_CHART_SCHEMA and returns
+    compact JSON (see compact_to_chart); otherwise it answers in free text.
+    """
+    if image is None:
+        image = prepare_vision_image(image_path)
+
+    extra_args = {}
+    if structured:
+        extra_args["response_format"] = {"type": "json_schema", "json_schema": SIZE_CHART_SCHEMA}
+
+    messages = _vision_messages(image, structured)
+    estimated = estimate_tokens(messages, max_tokens=2000, extra=_image_tokens(image))
+    async with rate_limited(VISION_MODEL, estimated) as reservation:
+        with timed("vision", "structured_request" if structured else "request"):
+            response = await get_openai_client().chat.completions.create(
+                model=VISION_MODEL,
+                messages=messages,
+                max_tokens=2000,
+                **extra_args
+            )
+        reservation.record(response.usage)
 
     if not response.choices or not response.choices[0].message or not response.choices[0].message.content:
         raise ValueError("No response from OpenAI API")
@@ -79,6 +185,192 @@ async def run_vision_prompt(image_path: str) -> str:
     return response.choices[0].message.content
 
 
+def _is_streamed_value(path: Tuple[Any, ...]) -> bool:
+    """Values of the compact schema that stream_size_chart_rows reacts to."""
+    if len(path) < 3 or path[0] != "tables":
+        return False
+    if len(path) == 3:
+        return path[2] in ("title", "unit", "headers")
+    return len(path) == 4 and path[2] == "rows"
+
+
+def _map_headers(headers: List[str]) -> Dict[str, Optional[str]]:
+    """Match each header of a table to its standard measurement name."""
+    return {header: match_to_standard(header) for header in headers}
+
+
+def _streamed_row(table_index: int, table: Dict[str, Any], row: List[Any]) -> Dict[str, Any]:
+    """Map and normalize one completed row of a streamed table."""
+    size = str(row[0])
+    values = {
+        header: value
+        for header, value in zip(table["headers"], row[1:])
+        if value is not None
+    }
+    chart = normalize_chart(
+        {size: values},
+        unit=table["unit"],
+        target_unit=normalize_unit(table["unit"]) or "in"
+    )
+
+    measurements = {}
+    for j, header in enumerate(chart.measurements):
+        standard_name = table["standard_names"].get(header)
+        if standard_name and standard_name not in measurements and not np.isnan(chart.min_values[0, j]):
+            measurements[standard_name] = {
+                "min": float(chart.min_values[0, j]),
+                "max": float(chart.max_values[0, j])
+            }
+
+    return {
+        "table": table_index,
+        "title": table["title"],
+        "unit": chart.unit,
+        "size": size,
+        "values": values,
+        "measurements": measurements
+    }
+
+
+async def stream_size_chart_rows(
+    image_path: Optional[str] = None,
+    image: Optional[PreprocessedImage] = None,
+    transcript: Optional[List[str]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream a structured extraction and yield each size row as soon as it is complete.
+
+    Each table's headers are mapped to standard measurement names as soon
+    as they arrive, so mapping and normalization of early rows overlap with
+    the model generating later ones. The rate limiter reservation is held
+    until the stream ends and settled with the usage sent in its last chunk.
+
+    Args:
+        transcript: If given, each piece of the response text is appended
+            to it, for callers that also need the whole output
+
+    Yields:
+        dict: The table index, title and unit, the size label, the raw
+        values by header, and normalized {"min", "max"} ranges by standard
+        measurement name
+    """
+    if image is None:
+        image = await asyncio.to_thread(prepare_vision_image, image_path)
+
+    messages = _vision_messages(image, structured=True)
+    estimated = estimate_tokens(messages, max_tokens=2000, extra=_image_tokens(image))
+    async with rate_limited(VISION_MODEL, estimated) as reservation:
+        with timed("vision", "stream_open"):
+            stream = await get_openai_client().chat.completions.create(
+                model=VISION_MODEL,
+                messages=messages,
+                max_tokens=2000,
+                response_format={"type": "json_schema", "json_schema": SIZE_CHART_SCHEMA},
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+
+        parser = IncrementalJSONParser(_is_streamed_value)
+        tables: Dict[int, Dict[str, Any]] = {}
+        async for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                reservation.record(chunk.usage)
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            text = chunk.choices[0].delta.content
+            if transcript is not None:
+                transcript.append(text)
+            for path, value in parser.feed(text):
+                table_index, field = path[1], path[2]
+                table = tables.setdefault(
+                    table_index,
+                    {"title": None, "unit": None, "headers": [], "standard_names": {}}
+                )
+                if field == "headers":
+                    table["headers"] = value
+                    table["standard_names"] = await asyncio.to_thread(_map_headers, value)
+                elif field == "rows":
+                    if value and value[0] is not None:
+                        yield _streamed_row(table_index, table, value)
+                else:
+                    table[field] = value
+
+
+@timed("vision", "parse")
+def parse_vision_output(vision_output: str) -> Dict[str, Any]:
+    """Extract the JSON object from a free-text vision response."""
+    json_start = vision_output.find('{')
+    json_end = vision_output.rfind('}') + 1
+    if json_start < 0 or json_end <= json_start:
+        raise ValueError("No JSON found in vision output")
+    return json.loads(vision_output[json_start:json_end])
+
+
+async def extract_size_chart(
+    image: PreprocessedImage
+) -> Tuple[str, Optional[Dict[str, Any]], Optional[str], List[Dict[str, Any]]]:
+    """
+    Extract one size chart image, preferring the structured output mode.
+
+    The structured response is streamed, so headers are mapped and each
+    row normalized while later rows are still being generated. Falls back
+    to the free-text prompt when structured output is disabled, rejected
+    by the API, refused, or unusable.
+
+    Returns:
+        (raw vision output, chart or None, parse error or None, streamed
+        rows from stream_size_chart_rows, empty for free text)
+    """
+    if config.VISION_STRUCTURED_OUTPUT:
+        try:
+            pieces: List[str] = []
+            with timed("vision", "structured_stream"):
+                rows = [row async for row in stream_size_chart_rows(image=image, transcript=pieces)]
+            vision_output = "".join(pieces)
+            with timed("vision", "parse_structured"):
+                chart = compact_to_chart(json.loads(vision_output))
+            return vision_output, chart, None, rows
+        except (openai.BadRequestError, ValueError, AttributeError, TypeError) as e:
+            log.warning("Structured extraction failed, falling back to free text: %s", e)
+
+    vision_output = await run_vision_prompt(image=image)
+    try:
+        return vision_output, parse_vision_output(vision_output), None, []
+    except ValueError as e:  # Includes json.JSONDecodeError
+        return vision_output, None, str(e), []
+
+
+def _standard_measurements(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Normalized measurements by standard name of every streamed row."""
+    return [
+        {"title": row["title"], "size": row["size"], "unit": row["unit"], "measurements": row["measurements"]}
+        for row in rows
+    ]
+
+
+@timed("vision", "split_tiles")
+def split_vision_image(image_data: bytes, image: PreprocessedImage) -> List[PreprocessedImage]:
+    """
+    Split a multi-table screenshot into one prepared image per table.
+
+    Returns [image] unchanged when tiling is disabled or the screenshot
+    holds a single table.
+    """
+    if not config.VISION_TILING_ENABLED:
+        return [image]
+    try:
+        tiles = split_tables(
+            image_data,
+            min_gap=config.VISION_TILE_MIN_GAP,
+            min_height=config.VISION_TILE_MIN_HEIGHT
+        )
+    except (OSError, ValueError):
+        return [image]
+    if len(tiles) < 2:
+        return [image]
+    return [prepare_vision_image(tile, "tile.png") for _, tile in tiles]
+
+
 async def process_size_guide_image(image_path: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Process a size guide image and return structured data.
@@ -90,42 +382,124 @@ async def process_size_guide_image(image_path: str, metadata: Optional[Dict[str,
     Returns:
         dict: Structured data containing the size guide information
     """
-    # Get the raw vision analysis
-    vision_output = await run_vision_prompt(image_path)
+    with open(image_path, "rb") as f:
+        data = f.read()
+    return await process_size_guide_bytes(data, os.path.basename(image_path), metadata)
+
+
+@timed("vision", "process_size_guide")
+async def process_size_guide_bytes(
+    image_data: Union[bytes, BinaryIO],
+    filename: str,
+    metadata: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Process a size guide image that is already in memory.
+
+    This is the entry point for uploads: the bytes (or the spooled upload
+    file) go straight to preprocessing without a round trip through disk.
     
-    try:
-        # Try to parse the JSON from the vision output
-        # First, find the JSON part of the response
-        json_start = vision_output.find('{')
-        json_end = vision_output.rfind('}') + 1
-        if json_start >= 0 and json_end > json_start:
-            json_str = vision_output[json_start:json_end]
-            size_data = json.loads(json_str)
-            
-            # Add metadata
-            size_data['metadata'] = {
-                'source_image': os.path.basename(image_path),
-                'processed_timestamp': str(datetime.datetime.now()),
-                'raw_vision_output': vision_output,
-                **(metadata or {})  # Include provided metadata if available
-            }
-            
-            return size_data
-        else:
-            raise ValueError("No JSON found in vision output")
-            
-    except (json.JSONDecodeError, ValueError) as e:
+    Args:
+        image_data: Image bytes, or a binary file object positioned at the start
+        filename: Original file name of the image
+        metadata: Optional metadata about the size guide
+        
+    Returns:
+        dict: Structured data containing the size guide information
+    """
+    if not isinstance(image_data, bytes):
+        image_data = image_data.read()
+
+    # Shrink the image before anything else so the cache key is stable.
+    # Pillow work runs in a thread to keep the event loop free.
+    image = await asyncio.to_thread(prepare_vision_image, image_data, filename)
+    preprocessing = image.stats()
+    log.debug("Vision image prepared", extra={
+        "size_bytes": preprocessing["bytes"],
+        "bytes_saved": preprocessing["bytes_saved"],
+        "image_tokens_saved": preprocessing["estimated_tokens_saved"]
+    })
+
+    # Reuse an earlier extraction of the same image if we have one. Cache
+    # reads, writes and eviction touch the disk, so they run in a thread.
+    cache = await asyncio.to_thread(get_vision_cache)
+    cache_key = VisionCache.make_key(image.data, VISION_MODEL, VISION_PROMPT_VERSION)
+    with timed("vision", "cache_lookup"):
+        cached = await asyncio.to_thread(cache.get, cache_key) if cache else None
+    if cache:
+        count_cache_lookup("vision", cached is not None)
+    if cached is not None:
+        log.debug("Vision cache hit", extra={"cache_key": cache_key[:12]})
+        size_data = cached["size_data"]
+        size_data['metadata'] = {
+            'source_image': os.path.basename(filename),
+            'processed_timestamp': str(datetime.datetime.now()),
+            'raw_vision_output': cached["raw_vision_output"],
+            'image_preprocessing': preprocessing,
+            'vision_cache': 'hit',
+            **(metadata or {})
+        }
+        if cached.get("standard_measurements"):
+            size_data['metadata']['standard_measurements'] = cached["standard_measurements"]
+        return size_data
+
+    # Extract each table of a multi-table screenshot concurrently, so no
+    # single response has to hold every chart
+    tiles = await asyncio.to_thread(split_vision_image, image_data, image)
+    extractions = await asyncio.gather(*(extract_size_chart(tile) for tile in tiles))
+    vision_output = "\n\n".join(output for output, _, _, _ in extractions)
+    partials = [chart for _, chart, _, _ in extractions if chart is not None]
+    tile_errors = [error for _, _, error, _ in extractions if error is not None]
+    standard_measurements = _standard_measurements([row for _, _, _, rows in extractions for row in rows])
+
+    if not partials:
         # If JSON parsing fails, return a structured error response
         return {
-            'error': str(e),
+            'error': tile_errors[0],
             'raw_vision_output': vision_output,
             'metadata': {
-                'source_image': os.path.basename(image_path),
+                'source_image': os.path.basename(filename),
                 'processed_timestamp': str(datetime.datetime.now()),
+                'image_preprocessing': preprocessing,
                 **(metadata or {})  # Include provided metadata if available
             }
         }
 
+    size_data = partials[0] if len(partials) == 1 else merge_partial_results(partials)
+
+    # Only complete extractions are worth caching
+    if cache and not tile_errors:
+        with timed("vision", "cache_write"):
+            await asyncio.to_thread(
+                cache.set,
+                cache_key,
+                {
+                    "size_data": size_data,
+                    "raw_vision_output": vision_output,
+                    "standard_measurements": standard_measurements
+                },
+                model=VISION_MODEL,
+                prompt_version=VISION_PROMPT_VERSION
+            )
+
+    # Add metadata
+    size_data['metadata'] = {
+        'source_image': os.path.basename(filename),
+        'processed_timestamp': str(datetime.datetime.now()),
+        'raw_vision_output': vision_output,
+        'image_preprocessing': preprocessing,
+        'vision_cache': 'miss' if cache else 'disabled',
+        **(metadata or {})  # Include provided metadata if available
+    }
+    if standard_measurements:
+        size_data['metadata']['standard_measurements'] = standard_measurements
+    if len(tiles) > 1:
+        size_data['metadata']['tiles'] = len(tiles)
+    if tile_errors:
+        size_data['metadata']['tile_errors'] = tile_errors
+
+    return size_data
+
 
 if __name__ == "__main__":
     path = "uploads/sample_size_guide.jpg"
@@ -6,21 +6,164 @@ This module initializes the FastAPI application and configures all necessary com
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+import openai
 import uvicorn
 from dotenv import load_dotenv
-import traceback
+from contextlib import asynccontextmanager
+from functools import partial
+import asyncio
+import json
+import time
 
 from app.api import router as api_router
+from app.api.routes import run_size_guide_job
+from app.config import config
+from app.core.jester_chat import JesterChat
+from app.core.openai_client import close_openai_client
+from app.core.rate_limiter import OverloadedError
+from app.core.vector_search import JesterVectorSearch
+from app.db.database import AsyncSessionLocal
+from app.services.job_queue import JobQueue
+from app.services.recommendation_service import RecommendationEngine
+from app.services.search_service import SearchService
+from app.services.size_equivalence import SizeEquivalenceTable
+from app.services.validation_engine import ValidationEngine
+from app.utils import metrics
+from app.utils.image_hash import NearDuplicateIndex
+from app.utils.log import get_logger, sample_request, setup_logging, shutdown_logging
+from app.utils.profiler import ProfileStore, RequestProfiler
+from app.utils.semantic_cache import SemanticCache
 
 # Load environment variables
 load_dotenv()
 
+log = get_logger("main")
+
+async def refresh_size_data(state):
+    """
+    Load the validation rules and size guides, bring the size equivalence
+    table up to date, then repeat every RECOMMEND_REFRESH_SECONDS. Rules
+    are only reloaded when the table has changed. A failed load keeps the
+    previous rules, index and table.
+    """
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                if state.validation_engine is not None and await state.validation_engine.refresh(session):
+                    log.info("Loaded validation rules", extra={"measurement_types": len(state.validation_engine)})
+                if state.recommender is not None:
+                    count = await state.recommender.refresh(session)
+                    log.info("Indexed sizes for recommendations", extra={"sizes": count})
+            if state.recommender is not None:
+                records = list(state.recommender.records())
+                if await asyncio.to_thread(state.size_equivalence.update, records):
+                    log.info("Recomputed size equivalence table")
+        except Exception as e:
+            log.warning("Could not load size data: %s: %s", type(e).__name__, e)
+        if config.RECOMMEND_REFRESH_SECONDS <= 0:
+            return
+        await asyncio.sleep(config.RECOMMEND_REFRESH_SECONDS)
+
+async def start_services(app: FastAPI):
+    """
+    Build the shared services, warm them up and start background jobs.
+    
+    Runs as a background task so the server accepts connections (and
+    answers /api/health) while models load; /api/ready reports 200 once
+    this has finished.
+    """
+    state = app.state
+    if not config.OPENAI_API_KEY:
+        log.warning("OPENAI_API_KEY is not set; vision, chat and embedding calls will fail")
+    try:
+        # One knowledge base for the whole app, shared with chat
+        vector_search = await asyncio.to_thread(JesterVectorSearch)
+        state.vector_search = vector_search
+        state.chat_cache = SemanticCache(
+            threshold=config.CHAT_CACHE_THRESHOLD,
+            max_entries=config.CHAT_CACHE_MAX_ENTRIES,
+            ttl_seconds=config.CHAT_CACHE_TTL_SECONDS
+        ) if config.CHAT_CACHE_ENABLED else None
+        state.chat = JesterChat(vector_search=vector_search, response_cache=state.chat_cache)
+        state.search = SearchService(
+            vector_search,
+            max_batch=config.SEARCH_BATCH_MAX_SIZE,
+            max_wait=config.SEARCH_BATCH_MAX_WAIT_MS / 1000,
+            snippet_chars=config.SEARCH_SNIPPET_CHARS
+        )
+        state.near_duplicates = await asyncio.to_thread(
+            NearDuplicateIndex,
+            config.NEAR_DUPLICATE_INDEX_PATH,
+            max_distance=config.NEAR_DUPLICATE_MAX_DISTANCE
+        )
+        state.job_queue = JobQueue(
+            partial(run_size_guide_job, state),
+            config.JOBS_DIR,
+            max_workers=config.JOB_WORKERS,
+            max_queue_size=config.JOB_QUEUE_MAX_SIZE,
+            max_attempts=config.JOB_MAX_ATTEMPTS,
+            retention_seconds=config.JOB_RETENTION_SECONDS,
+            max_backoff=config.JOB_MAX_BACKOFF_SECONDS,
+            max_retry_seconds=config.JOB_MAX_RETRY_SECONDS
+        )
+        state.recommender = None
+        state.size_equivalence = None
+        # Checks stored size guides in memory once the rules are loaded
+        state.validation_engine = ValidationEngine() if config.VALIDATION_ENGINE_ENABLED else None
+        if config.RECOMMEND_ENABLED:
+            state.recommender = RecommendationEngine(json.loads(config.RECOMMEND_TOLERANCES or "{}"))
+            state.size_equivalence = SizeEquivalenceTable(
+                config.EQUIVALENCE_PATH,
+                pad=config.EQUIVALENCE_PAD_INCHES,
+                min_score=config.EQUIVALENCE_MIN_SCORE,
+                max_matches=config.EQUIVALENCE_MAX_MATCHES
+            )
+            # Serve the last saved table until the database has been read
+            await asyncio.to_thread(state.size_equivalence.load)
+        if state.recommender is not None or state.validation_engine is not None:
+            # The database is optional for the rest of the API, so don't wait on it
+            state.size_data_refresh = asyncio.create_task(refresh_size_data(state))
+
+        await asyncio.to_thread(vector_search.warm_up)
+        # Unfinished jobs resume here
+        await state.job_queue.start()
+        state.ready = True
+        log.info("Services ready")
+    except Exception as e:
+        state.startup_error = f"{type(e).__name__}: {e}"
+        log.exception("Service startup failed: %s", state.startup_error)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging(
+        level=config.LOG_LEVEL,
+        fmt=config.LOG_FORMAT,
+        debug_sample_rate=config.LOG_DEBUG_SAMPLE_RATE,
+        log_file=config.LOG_FILE,
+        max_queue_size=config.LOG_QUEUE_MAX_SIZE
+    )
+    app.state.ready = False
+    app.state.startup_error = None
+    app.state.size_data_refresh = None
+    startup = asyncio.create_task(start_services(app))
+    yield
+    app.state.ready = False
+    background = [task for task in (startup, app.state.size_data_refresh) if task is not None]
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    if getattr(app.state, "job_queue", None) is not None:
+        await app.state.job_queue.stop()
+    await close_openai_client()
+    shutdown_logging()
+
 def create_app() -> FastAPI:
     app = FastAPI(
         title="Jester API",
         description="API for processing size guides and providing size recommendations",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=lifespan
     )
 
     # CORS configuration
@@ -35,14 +178,70 @@ def create_app() -> FastAPI:
     # Include application routes
     app.include_router(api_router)
 
-    # Enhanced error handler to debug silent 400 errors
+    # Keep or drop each request's DEBUG logs as a whole
+    @app.middleware("http")
+    async def sample_debug_logs(request: Request, call_next):
+        with sample_request(config.LOG_DEBUG_SAMPLE_RATE):
+            return await call_next(request)
+
+    # Latency metrics, labelled by route template rather than raw path
+    metrics.set_enabled(config.METRICS_ENABLED)
+
+    @app.middleware("http")
+    async def record_request_latency(request: Request, call_next):
+        if not config.METRICS_ENABLED:
+            return await call_next(request)
+        start = time.perf_counter()
+        response = await call_next(request)
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            request.method,
+            route.path if route else "unmatched",
+            str(response.status_code)
+        )
+        return response
+
+    # Sampling profiler, added last so it wraps the whole request
+    if config.PROFILER_ENABLED or config.PROFILER_TOKEN:
+        profiler = RequestProfiler(
+            ProfileStore(config.PROFILER_DIR, max_files=config.PROFILER_MAX_FILES),
+            sample_rate=config.PROFILER_SAMPLE_RATE if config.PROFILER_ENABLED else 0.0,
+            token=config.PROFILER_TOKEN,
+            interval=config.PROFILER_INTERVAL_MS / 1000
+        )
+        app.middleware("http")(profiler.middleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    # Shed load quickly when OpenAI capacity is exhausted
+    @app.exception_handler(OverloadedError)
+    async def overloaded_exception_handler(request: Request, exc: OverloadedError):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": str(exc)},
+            headers={"Retry-After": str(int(exc.retry_after) + 1)}
+        )
+
+    @app.exception_handler(openai.RateLimitError)
+    async def openai_rate_limit_handler(request: Request, exc: openai.RateLimitError):
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Upstream rate limit reached, try again shortly"},
+            headers={"Retry-After": exc.response.headers.get("retry-after", "5")}
+        )
+
+    # Log validation errors so silent 400s can be debugged
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request: Request, exc: RequestValidationError):
-        body = await request.body()
-        print("❌ FASTAPI VALIDATION ERROR")
-        print("Raw Request Body (first 500 bytes):", body[:500])
-        print("Validation Errors:", exc.errors())
-        print("Traceback:\n", traceback.format_exc())
+        log.warning("Request validation failed", extra={
+            "path": request.url.path,
+            "errors": exc.errors()
+        })
+        # The parsed body, when there is one; uploads aren't read again
+        log.debug("Rejected request body", extra={"path": request.url.path, "body": str(exc.body)[:500]})
         return JSONResponse(
             status_code=400,
             content={"detail": exc.errors()},
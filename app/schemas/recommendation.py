@@ -0,0 +1,55 @@
+"""
+API schemas for size recommendations.
+"""
+
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+class SizeRecommendationRequest(BaseModel):
+    """Request schema for recommending a size."""
+    brand: str = Field(..., description="Brand name")
+    measurements: Dict[str, float] = Field(..., description="Body measurements by name, e.g. {'chest': 40}")
+    unit: str = Field(default="in", description="Unit of the measurements ('in' or 'cm')")
+    category_id: Optional[int] = Field(None, description="Only consider sizes in this category")
+    gender_id: Optional[int] = Field(None, description="Only consider sizes for this gender")
+    top_n: int = Field(default=3, ge=1, le=20, description="Number of sizes to return")
+
+class MeasurementFit(BaseModel):
+    """How one measurement compares with a size's range, in inches."""
+    value: float
+    min: float
+    max: float
+    difference: float = Field(..., description="Distance outside the range; 0 when inside")
+
+class SizeRecommendation(BaseModel):
+    """One recommended size."""
+    size_guide_id: int
+    size_label: str
+    category_id: Optional[int] = None
+    gender_id: Optional[int] = None
+    score: float = Field(..., description="1 when every measurement fits, falling to 0")
+    fit: str = Field(..., description="'fits', 'close' or 'poor'")
+    measurements: Dict[str, MeasurementFit]
+
+class SizeRecommendationResponse(BaseModel):
+    """Response schema for size recommendations."""
+    brand: str
+    recommendations: List[SizeRecommendation]
+
+class EquivalentSize(BaseModel):
+    """A size of the target brand and how closely it overlaps."""
+    size_label: str
+    score: float = Field(..., description="Mean range overlap over shared measurements, 0-1")
+
+class SizeEquivalence(BaseModel):
+    """Equivalent sizes within one category and gender."""
+    category_id: Optional[int] = None
+    gender_id: Optional[int] = None
+    matches: List[EquivalentSize]
+
+class SizeEquivalenceResponse(BaseModel):
+    """Response schema for cross-brand size equivalence."""
+    brand: str
+    size_label: str
+    target_brand: str
+    equivalents: List[SizeEquivalence]
@@ -0,0 +1,34 @@
+"""
+API schemas for knowledge base search.
+"""
+
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional, Union
+from app.config import config
+
+class SearchRequest(BaseModel):
+    """Request schema for searching the knowledge base."""
+    query: str = Field(..., min_length=1, description="Search text")
+    k: int = Field(default=10, ge=1, le=config.SEARCH_MAX_K, description="Results per page")
+    min_score: float = Field(default=0.0, description="Drop results scoring below this")
+    filters: Dict[str, Union[str, int, float, bool, List[Union[str, int, float, bool]]]] = Field(
+        default_factory=dict,
+        description="Metadata filters, e.g. {'brand': 'Acme', 'gender': ['Men', 'Unisex']}"
+    )
+    cursor: Optional[str] = Field(None, description="next_cursor from the previous page")
+    include_text: bool = Field(default=False, description="Return full chunk text instead of a snippet")
+    mode: Literal["vector", "lexical"] = Field(default="vector", description="Embedding or BM25 keyword search")
+
+class SearchResult(BaseModel):
+    """One matching chunk."""
+    id: int = Field(..., description="Chunk id, stable for the life of the knowledge base")
+    score: float
+    metadata: Dict[str, Any]
+    snippet: Optional[str] = None
+    text: Optional[str] = None
+
+class SearchResponse(BaseModel):
+    """Response schema for knowledge base search."""
+    results: List[SearchResult]
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor to get the next page")
+    version: int = Field(..., description="Knowledge base version the results come from")
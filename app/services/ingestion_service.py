@@ -1,3 +1,7 @@
+from ..utils.log import get_logger
+
+log = get_logger("ingestion")
+
 class IngestService:
     def __init__(self):
         pass
@@ -18,5 +22,5 @@ class IngestService:
             # TODO: Implement actual processing logic
             return True
         except Exception as e:
-            print(f"Error processing size guide: {str(e)}")
+            log.exception("Error processing size guide: %s", e)
             return False
@@ -0,0 +1,228 @@
+"""
+Background job queue for long-running size guide processing.
+
+Jobs are persisted as one JSON file each, so queued work and work that was
+interrupted by a restart is picked up again when the queue starts. A fixed
+pool of asyncio workers runs jobs through a handler coroutine, and callers
+poll the job record for status and results.
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class RetryLater(Exception):
+    """
+    Raised by a handler when the job couldn't run yet (e.g. a dependency
+    is shedding load). The job is queued again after a backoff of at least
+    delay seconds, and the attempt is not counted against max_attempts;
+    a job still being put off max_retry_seconds after it was submitted is
+    marked failed.
+    """
+
+    def __init__(self, message: str, delay: float = 1.0):
+        super().__init__(message)
+        self.delay = delay
+
+
+class JobQueue:
+    """
+    Bounded, persistent queue of background jobs.
+
+    Args:
+        handler: Coroutine run for each job; it receives the job's payload
+            and returns the job result
+        jobs_dir: Directory holding one JSON file per job
+        max_workers: Jobs processed concurrently
+        max_queue_size: Jobs allowed to wait before submissions are refused
+        max_attempts: Times a job is started before it is marked failed;
+            guards against jobs that crash the process on every restart
+        retention_seconds: Finished jobs older than this are deleted when
+            the queue starts
+        max_backoff: Longest wait, in seconds, before a job whose handler
+            raised RetryLater is queued again
+        max_retry_seconds: Seconds after submission past which a job is no
+            longer retried on RetryLater but marked failed
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        jobs_dir: str,
+        max_workers: int = 2,
+        max_queue_size: int = 100,
+        max_attempts: int = 3,
+        retention_seconds: int = 7 * 24 * 3600,
+        max_backoff: float = 60.0,
+        max_retry_seconds: float = 900.0,
+    ):
+        self.handler = handler
+        self.jobs_dir = Path(jobs_dir)
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self.max_backoff = max_backoff
+        self.max_retry_seconds = max_retry_seconds
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._retries: Set[asyncio.Task] = set()
+
+    def _path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _write(self, job: Dict[str, Any]):
+        tmp_path = self.jobs_dir / f".{job['id']}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f, default=str)
+        os.replace(tmp_path, self._path(job["id"]))
+
+    async def _save(self, job: Dict[str, Any]):
+        await asyncio.to_thread(self._write, job)
+
+    def _load(self) -> List[Dict[str, Any]]:
+        """Read persisted jobs, dropping finished ones past retention."""
+        jobs = []
+        cutoff = time.time() - self.retention_seconds
+        for path in self.jobs_dir.glob("*.json"):
+            try:
+                with open(path, "r") as f:
+                    job = json.load(f)
+            except json.JSONDecodeError:
+                continue
+            if job["status"] in (SUCCEEDED, FAILED) and job.get("finished_at", 0) < cutoff:
+                path.unlink(missing_ok=True)
+                continue
+            jobs.append(job)
+        return sorted(jobs, key=lambda job: job["created_at"])
+
+    async def start(self):
+        """Restore persisted jobs and start the workers."""
+        if self._workers:
+            return
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._queue = asyncio.Queue()
+        for job in await asyncio.to_thread(self._load):
+            self._jobs[job["id"]] = job
+            if job["status"] in (QUEUED, RUNNING):
+                # Interrupted by a restart: run it again
+                job["status"] = QUEUED
+                self._queue.put_nowait(job["id"])
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.max_workers)
+        ]
+
+    async def stop(self):
+        """Stop the workers; unfinished jobs resume on the next start."""
+        tasks = self._workers + list(self._retries)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._retries = set()
+
+    @property
+    def depth(self) -> int:
+        """Jobs waiting to be picked up by a worker."""
+        return self._queue.qsize() if self._queue else 0
+
+    async def submit(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Queue a job.
+
+        Raises:
+            QueueFullError: If max_queue_size jobs are already waiting
+        """
+        if self._queue is None:
+            raise RuntimeError("Job queue is not started")
+        if self.depth >= self.max_queue_size:
+            raise QueueFullError(f"Job queue is full ({self.max_queue_size} jobs waiting)")
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": QUEUED,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "attempts": 0,
+            "retries": 0,
+            "payload": payload,
+            "result": None,
+            "error": None,
+        }
+        self._jobs[job["id"]] = job
+        await self._save(job)
+        self._queue.put_nowait(job["id"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job record, or None if the id is unknown."""
+        return self._jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(self._jobs[job_id])
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Dict[str, Any]):
+        if job["attempts"] >= self.max_attempts:
+            job.update(status=FAILED, finished_at=time.time(),
+                       error=f"Gave up after {job['attempts']} attempts")
+            await self._save(job)
+            return
+
+        job.update(status=RUNNING, started_at=time.time(), attempts=job["attempts"] + 1)
+        await self._save(job)
+        try:
+            result = await self.handler(job["payload"])
+        except asyncio.CancelledError:
+            # Shutting down: leave the job as running so it is resumed
+            raise
+        except RetryLater as e:
+            retries = job.get("retries", 0)
+            delay = max(e.delay, min(2.0 ** retries, self.max_backoff))
+            if time.time() + delay - job["created_at"] > self.max_retry_seconds:
+                job.update(status=FAILED, finished_at=time.time(),
+                           error=f"Gave up after {retries + 1} tries over {self.max_retry_seconds:.0f}s: {e}")
+                await self._save(job)
+                return
+            job.update(status=QUEUED, attempts=job["attempts"] - 1, retries=retries + 1,
+                       error=f"Retrying in {delay:.0f}s: {e}")
+            await self._save(job)
+            self._requeue_later(job["id"], delay)
+            return
+        except Exception as e:
+            job.update(status=FAILED, finished_at=time.time(), error=f"{type(e).__name__}: {e}")
+        else:
+            job.update(status=SUCCEEDED, finished_at=time.time(), result=result, error=None)
+        await self._save(job)
+
+    def _requeue_later(self, job_id: str, delay: float):
+        async def requeue():
+            await asyncio.sleep(delay)
+            self._queue.put_nowait(job_id)
+
+        # Held outside the queue so the worker is free meanwhile; a job
+        # still waiting at shutdown is persisted as queued and resumes
+        task = asyncio.create_task(requeue())
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
@@ -0,0 +1,290 @@
+"""
+Size recommendations from stored size guides.
+
+Every size guide row and its size_guide_measurements are loaded once into
+an in-memory index: per brand, a (size x measurement) pair of min/max
+arrays in inches. A recommendation is then a few vectorized NumPy
+operations over one brand's arrays, with no database access per request.
+
+Each of the user's measurements is compared with the size's range. Inside
+the range it scores 1; outside it falls off linearly to 0 at the fit
+tolerance for that measurement. A size's score is the mean over the
+measurements both the user and the guide provide, so sizes are ranked by
+how well they fit everything we know about the user.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from ..db.models import Brand, MeasurementType, SizeGuide, SizeGuideMeasurement, Unit
+from ..utils.metrics import timed
+from ..utils.size_normalizer import CM_PER_INCH, normalize_unit
+
+# Measurements stored as min/max columns on size_guides
+GUIDE_COLUMNS = ("neck", "chest", "waist", "sleeve", "belt")
+
+# How far (in inches) a measurement may fall outside a size's range
+# before that measurement scores 0
+DEFAULT_TOLERANCES: Dict[str, float] = {
+    "neck": 0.5,
+    "chest": 2.0,
+    "waist": 2.0,
+    "hip": 2.0,
+    "sleeve": 1.0,
+    "belt": 1.0,
+    "inseam": 1.0,
+}
+DEFAULT_TOLERANCE = 1.0
+
+
+def to_inches(value: float, unit: Optional[str]) -> float:
+    """Convert a value in unit (inches when unknown) to inches."""
+    return value / CM_PER_INCH if normalize_unit(unit) == "cm" else value
+
+
+@dataclass
+class SizeRecord:
+    """One size of one brand's guide, with its ranges in inches."""
+    size_guide_id: int
+    brand: str
+    size_label: str
+    category_id: Optional[int] = None
+    gender_id: Optional[int] = None
+    ranges: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+
+
+class BrandIndex:
+    """
+    Dense min/max arrays for one brand. Missing measurements are NaN, and
+    a range with only one bound uses it for both.
+    """
+
+    def __init__(self, records: List[SizeRecord]):
+        self.records = records
+        self.measurements = sorted({name for record in records for name in record.ranges})
+        self._columns = {name: j for j, name in enumerate(self.measurements)}
+        self.low = np.full((len(records), len(self.measurements)), np.nan)
+        self.high = np.full(self.low.shape, np.nan)
+        for i, record in enumerate(records):
+            for name, (low, high) in record.ranges.items():
+                j = self._columns[name]
+                self.low[i, j], self.high[i, j] = low, high
+        self.category_ids = np.array([r.category_id if r.category_id is not None else -1 for r in records])
+        self.gender_ids = np.array([r.gender_id if r.gender_id is not None else -1 for r in records])
+
+    def score(
+        self,
+        measurements: Dict[str, float],
+        tolerances: Dict[str, float],
+        category_id: Optional[int] = None,
+        gender_id: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+        """
+        Score every size against measurements (in inches).
+
+        Returns:
+            (scores, matched, distances, names): per-size scores (NaN where
+            the size shares no measurement with the user or is filtered
+            out), per-size counts of measurements compared, the (size x
+            name) distances outside the range, and the names compared
+        """
+        names = [name for name in measurements if name in self._columns]
+        columns = [self._columns[name] for name in names]
+        values = np.array([measurements[name] for name in names])
+        tolerance = np.array([tolerances.get(name, DEFAULT_TOLERANCE) for name in names])
+
+        low = self.low[:, columns]
+        high = self.high[:, columns]
+        distances = np.maximum(low - values, 0) + np.maximum(values - high, 0)
+        per_measurement = np.clip(1 - distances / tolerance, 0, 1)
+
+        known = ~np.isnan(distances)
+        matched = known.sum(axis=1)
+        with np.errstate(invalid="ignore"):
+            scores = np.where(known, per_measurement, 0).sum(axis=1) / matched
+        if category_id is not None:
+            scores[self.category_ids != category_id] = np.nan
+        if gender_id is not None:
+            scores[self.gender_ids != gender_id] = np.nan
+        return scores, matched, distances, names
+
+
+class RecommendationEngine:
+    """
+    In-memory size recommendations over every stored size guide.
+
+    Args:
+        tolerances: Fit tolerance in inches per measurement name; names not
+            listed use DEFAULT_TOLERANCE
+    """
+
+    def __init__(self, tolerances: Optional[Dict[str, float]] = None):
+        self.tolerances = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+        self._brands: Dict[str, BrandIndex] = {}
+        self.loaded_at: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    @property
+    def brands(self) -> List[str]:
+        return sorted(index.records[0].brand for index in self._brands.values())
+
+    def records(self) -> Iterable[SizeRecord]:
+        for index in self._brands.values():
+            yield from index.records
+
+    def build(self, records: Iterable[SizeRecord]):
+        """Replace the index with records; readers see the old or new one, never a mix."""
+        by_brand: Dict[str, List[SizeRecord]] = {}
+        for record in records:
+            if record.ranges:
+                by_brand.setdefault(record.brand.strip().lower(), []).append(record)
+        self._brands = {key: BrandIndex(group) for key, group in by_brand.items()}
+        self.loaded_at = time.time()
+
+    @timed("recommendation", "refresh")
+    async def refresh(self, session: AsyncSession) -> int:
+        """
+        Reload every size guide from the database.
+
+        Returns:
+            The number of sizes indexed
+        """
+        records = await load_size_records(session)
+        await asyncio.to_thread(self.build, records)
+        return len(records)
+
+    @timed("recommendation", "recommend")
+    def recommend(
+        self,
+        brand: str,
+        measurements: Dict[str, float],
+        unit: str = "in",
+        category_id: Optional[int] = None,
+        gender_id: Optional[int] = None,
+        top_n: int = 3,
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank a brand's sizes for a user's body measurements.
+
+        Args:
+            brand: Brand name (case-insensitive)
+            measurements: Measurement name to value, e.g. {"chest": 40}
+            unit: Unit of the values ("in" or "cm")
+            category_id: Only consider sizes in this category
+            gender_id: Only consider sizes for this gender
+            top_n: Number of sizes to return
+
+        Returns:
+            Best sizes first, each with its score, fit and per-measurement
+            comparison
+
+        Raises:
+            KeyError: If the brand has no size guides
+        """
+        index = self._brands.get(brand.strip().lower())
+        if index is None:
+            raise KeyError(brand)
+        body = {
+            name.strip().lower(): to_inches(float(value), unit)
+            for name, value in measurements.items()
+        }
+        scores, matched, distances, names = index.score(body, self.tolerances, category_id, gender_id)
+
+        candidates = np.flatnonzero(~np.isnan(scores))
+        # Best score first; ties go to the size that compared more measurements
+        order = candidates[np.lexsort((-matched[candidates], -scores[candidates]))][:top_n]
+        return [self._result(index, i, float(scores[i]), distances[i], names, body) for i in order]
+
+    def _result(
+        self,
+        index: BrandIndex,
+        row: int,
+        score: float,
+        distances: np.ndarray,
+        names: List[str],
+        body: Dict[str, float],
+    ) -> Dict[str, Any]:
+        record = index.records[row]
+        details = {}
+        for name, distance in zip(names, distances):
+            if np.isnan(distance):
+                continue
+            low, high = record.ranges[name]
+            value = body[name]
+            details[name] = {
+                "value": round(value, 2),
+                "min": low,
+                "max": high,
+                "difference": round(value - high if value > high else value - low if value < low else 0.0, 2),
+            }
+        all_fit = all(detail["difference"] == 0 for detail in details.values())
+        return {
+            "size_guide_id": record.size_guide_id,
+            "size_label": record.size_label,
+            "category_id": record.category_id,
+            "gender_id": record.gender_id,
+            "score": round(score, 4),
+            "fit": "fits" if all_fit else "close" if score >= 0.5 else "poor",
+            "measurements": details,
+        }
+
+
+def _range(low, high, unit: Optional[str]) -> Optional[Tuple[float, float]]:
+    if low is None and high is None:
+        return None
+    low = float(low if low is not None else high)
+    high = float(high if high is not None else low)
+    return to_inches(min(low, high), unit), to_inches(max(low, high), unit)
+
+
+async def load_size_records(session: AsyncSession) -> List[SizeRecord]:
+    """
+    Read every size guide and its measurements in two queries.
+
+    size_guides columns are in the brand's default unit;
+    size_guide_measurements carry their own unit and take precedence.
+    """
+    guide_columns = [getattr(SizeGuide, f"{name}_{bound}") for name in GUIDE_COLUMNS for bound in ("min", "max")]
+    guides = await session.execute(
+        select(
+            SizeGuide.id, Brand.name, Unit.name, SizeGuide.size_label,
+            SizeGuide.category_id, SizeGuide.gender_id, *guide_columns
+        )
+        .join(Brand, SizeGuide.brand_id == Brand.id)
+        .outerjoin(Unit, Brand.default_unit_id == Unit.id)
+    )
+
+    records: Dict[int, SizeRecord] = {}
+    for guide_id, brand, unit, size_label, category_id, gender_id, *bounds in guides.all():
+        record = records[guide_id] = SizeRecord(guide_id, brand, size_label, category_id, gender_id)
+        for k, name in enumerate(GUIDE_COLUMNS):
+            span = _range(bounds[2 * k], bounds[2 * k + 1], unit)
+            if span is not None:
+                record.ranges[name] = span
+
+    measurement_unit = aliased(Unit)
+    measurements = await session.execute(
+        select(
+            SizeGuideMeasurement.size_guide_id, MeasurementType.name, measurement_unit.name,
+            SizeGuideMeasurement.min_value, SizeGuideMeasurement.max_value
+        )
+        .join(MeasurementType, SizeGuideMeasurement.measurement_type_id == MeasurementType.id)
+        .join(measurement_unit, SizeGuideMeasurement.unit_id == measurement_unit.id)
+    )
+    for guide_id, name, unit, low, high in measurements.all():
+        record = records.get(guide_id)
+        span = _range(low, high, unit)
+        if record is not None and span is not None:
+            record.ranges[name.strip().lower()] = span
+
+    return list(records.values())
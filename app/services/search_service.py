@@ -0,0 +1,230 @@
+"""
+Knowledge base search for /api/search.
+
+Wraps JesterVectorSearch with what tools need and chat doesn't: metadata
+filters, a minimum score, cursor pagination, a lexical (BM25) mode and
+compact results. Queries from concurrent requests are encoded together in
+one batched model call.
+
+Filters match a chunk's metadata and, for stored size guide extractions
+whose text is JSON, the "metadata" object inside it (brand, gender, unit,
+source image, ...). Values are compared case-insensitively; a list of
+values matches any of them.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..utils.batcher import MicroBatcher
+from ..utils.lexical_index import LexicalIndex
+from ..utils.metrics import timed
+
+MODES = ("vector", "lexical")
+
+
+def _chunk_metadata(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    """Scalar metadata of a chunk, from its metadata and its JSON text."""
+    metadata: Dict[str, Any] = {}
+    stored = chunk.get("metadata")
+    if isinstance(stored, dict):
+        metadata.update(stored)
+    elif isinstance(stored, str) and stored:
+        metadata["description"] = stored
+    text = chunk.get("text", "")
+    if text.startswith("{"):
+        try:
+            embedded = json.loads(text).get("metadata")
+        except (ValueError, AttributeError):
+            embedded = None
+        if isinstance(embedded, dict):
+            for key, value in embedded.items():
+                metadata.setdefault(key, value)
+    return {key: value for key, value in metadata.items() if isinstance(value, (str, int, float, bool))}
+
+
+def _searchable_text(chunk: Dict[str, Any]) -> str:
+    """Chunk text plus its description, for the lexical index."""
+    description = chunk.get("metadata")
+    return f"{chunk.get('text', '')} {description}" if isinstance(description, str) else chunk.get("text", "")
+
+
+def _normalize(value: Any) -> str:
+    return str(value).strip().lower()
+
+
+def encode_cursor(offset: int, version: int, key: str) -> str:
+    payload = json.dumps({"offset": offset, "version": version, "key": key}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, version: int, key: str) -> int:
+    """
+    Offset stored in a cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed, belongs to another query,
+            or the knowledge base has changed since it was issued
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        offset = int(payload["offset"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if payload.get("key") != key:
+        raise ValueError("Cursor belongs to a different query")
+    if payload.get("version") != version:
+        raise ValueError("The knowledge base has changed since this cursor was issued; search again")
+    return offset
+
+
+class SearchService:
+    """
+    Filtered, paginated search over a JesterVectorSearch.
+
+    Args:
+        vector_search: The knowledge base
+        max_batch: Queries encoded together at most
+        max_wait: Seconds a query waits for others to batch with
+        snippet_chars: Length of the text snippet in compact results
+    """
+
+    def __init__(self, vector_search, max_batch: int = 32, max_wait: float = 0.005, snippet_chars: int = 200):
+        self.vector_search = vector_search
+        self.encoder = MicroBatcher(vector_search.encode_queries, max_batch=max_batch, max_wait=max_wait)
+        self.snippet_chars = snippet_chars
+        self._lock = threading.Lock()
+        self._metadata: List[Dict[str, Any]] = []
+        self._fields: List[Dict[str, str]] = []
+        self._lexical: Optional[LexicalIndex] = None
+
+    def _sync_metadata(self):
+        """Extract metadata for chunks added since the last call (chunks are append-only)."""
+        chunks = self.vector_search.chunks
+        with self._lock:
+            for chunk in chunks[len(self._metadata):]:
+                metadata = _chunk_metadata(chunk)
+                self._metadata.append(metadata)
+                self._fields.append({_normalize(k): _normalize(v) for k, v in metadata.items()})
+
+    def _lexical_index(self) -> LexicalIndex:
+        chunks = self.vector_search.chunks
+        with self._lock:
+            if self._lexical is None or self._lexical.size != len(chunks):
+                with timed("search", "build_lexical_index"):
+                    self._lexical = LexicalIndex([_searchable_text(chunk) for chunk in chunks])
+            return self._lexical
+
+    def _matches(self, chunk_id: int, filters: Dict[str, set]) -> bool:
+        if chunk_id >= len(self._fields):  # Added after this search started
+            return False
+        fields = self._fields[chunk_id]
+        return all(fields.get(key) in allowed for key, allowed in filters.items())
+
+    def _vector_matches(
+        self, embedding: np.ndarray, need: int, min_score: float, filters: Dict[str, set]
+    ) -> List[Tuple[int, float]]:
+        """Nearest chunks passing the filters, widening the search until need are found."""
+        total = self.vector_search.index.ntotal
+        fetch = need * 4 if filters else need
+        while True:
+            ids, similarities = self.vector_search.rank(embedding, fetch)
+            matches = [
+                (chunk_id, score) for chunk_id, score in zip(ids, similarities)
+                if score >= min_score and self._matches(chunk_id, filters)
+            ]
+            exhausted = fetch >= total or bool(similarities and similarities[-1] < min_score)
+            if len(matches) >= need or exhausted:
+                return matches[:need]
+            fetch *= 4
+
+    def _lexical_matches(
+        self, query: str, need: int, min_score: float, filters: Dict[str, set]
+    ) -> List[Tuple[int, float]]:
+        scores = self._lexical_index().scores(query)
+        candidates = np.flatnonzero((scores > 0) & (scores >= min_score))
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        matches = []
+        for chunk_id in candidates:
+            if self._matches(int(chunk_id), filters):
+                matches.append((int(chunk_id), float(scores[chunk_id])))
+                if len(matches) >= need:
+                    break
+        return matches
+
+    def _result(self, chunk_id: int, score: float, include_text: bool) -> Dict[str, Any]:
+        text = self.vector_search.chunks[chunk_id].get("text", "")
+        result = {
+            "id": chunk_id,
+            "score": round(score, 4),
+            "metadata": self._metadata[chunk_id],
+        }
+        if include_text:
+            result["text"] = text
+        else:
+            result["snippet"] = text[:self.snippet_chars]
+        return result
+
+    async def search(
+        self,
+        query: str,
+        k: int = 10,
+        min_score: float = 0.0,
+        filters: Optional[Dict[str, Any]] = None,
+        cursor: Optional[str] = None,
+        include_text: bool = False,
+        mode: str = "vector",
+    ) -> Dict[str, Any]:
+        """
+        Search the knowledge base.
+
+        Args:
+            query: Search text
+            k: Results per page
+            min_score: Drop results scoring below this. Vector scores are
+                similarities in (0, 1]; lexical scores are BM25 and unbounded
+            filters: Metadata key to a value or list of accepted values
+            cursor: next_cursor from the previous page
+            include_text: Return each chunk's full text instead of a snippet
+            mode: "vector" or "lexical"
+
+        Returns:
+            {"results": [...], "next_cursor": str or None, "version": int}
+
+        Raises:
+            ValueError: For an unknown mode or an invalid or stale cursor
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {', '.join(MODES)}")
+        accepted = {
+            _normalize(key): {_normalize(v) for v in (value if isinstance(value, list) else [value])}
+            for key, value in (filters or {}).items()
+        }
+        version = self.vector_search.version
+        key = hashlib.sha1(json.dumps(
+            [query, mode, min_score, sorted((k_, sorted(v)) for k_, v in accepted.items())]
+        ).encode()).hexdigest()[:16]
+        offset = decode_cursor(cursor, version, key) if cursor else 0
+        # One extra result tells us whether there is another page
+        need = offset + k + 1
+
+        with timed("search", mode):
+            await asyncio.to_thread(self._sync_metadata)
+            if mode == "vector":
+                embedding = await self.encoder.submit(query)
+                matches = await asyncio.to_thread(self._vector_matches, embedding, need, min_score, accepted)
+            else:
+                matches = await asyncio.to_thread(self._lexical_matches, query, need, min_score, accepted)
+
+        page = matches[offset:offset + k]
+        return {
+            "results": [self._result(chunk_id, score, include_text) for chunk_id, score in page],
+            "next_cursor": encode_cursor(offset + k, version, key) if len(matches) > offset + k else None,
+            "version": version,
+        }
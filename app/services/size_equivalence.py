@@ -0,0 +1,239 @@
+"""
+Cross-brand size equivalence tables.
+
+"What's an Acme Medium in Brand B?" is answered from a table computed
+ahead of time rather than by the chat model. For every category and
+gender, each size of each brand is compared with every size of every
+other brand: per shared measurement, the overlap of the two ranges over
+their union (each range widened by a small pad, so single-value sizes can
+still overlap), averaged over the shared measurements.
+
+The table is a nested dict, brand -> size -> other brand -> matches per
+category/gender, so a lookup is a few dict accesses. It is saved as
+compact JSON so it is available at startup before the database is read,
+and only recomputed when the size guides actually change.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .recommendation_service import SizeRecord
+from ..utils.metrics import timed
+
+GroupKey = Tuple[Optional[int], Optional[int]]  # (category_id, gender_id)
+
+
+def fingerprint(records: Iterable[SizeRecord], settings: Tuple[Any, ...] = ()) -> str:
+    """
+    Hash of the size data and the compute_table settings, to tell whether
+    the table is stale.
+    """
+    rows = sorted(
+        (r.size_guide_id, r.brand, r.size_label, r.category_id, r.gender_id, sorted(r.ranges.items()))
+        for r in records
+    )
+    return hashlib.sha256(repr((settings, rows)).encode()).hexdigest()
+
+
+def _range_arrays(records: List[SizeRecord], names: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    low = np.full((len(records), len(names)), np.nan)
+    high = np.full(low.shape, np.nan)
+    for i, record in enumerate(records):
+        for j, name in enumerate(names):
+            if name in record.ranges:
+                low[i, j], high[i, j] = record.ranges[name]
+    return low, high
+
+
+def overlap_scores(
+    low_a: np.ndarray, high_a: np.ndarray, low_b: np.ndarray, high_b: np.ndarray, pad: float
+) -> np.ndarray:
+    """
+    (sizes_a x sizes_b) similarity of two brands' sizes: mean over shared
+    measurements of padded range intersection over union. NaN where two
+    sizes share no measurement.
+    """
+    low_a, high_a = low_a[:, None, :] - pad, high_a[:, None, :] + pad
+    low_b, high_b = low_b[None, :, :] - pad, high_b[None, :, :] + pad
+    intersection = np.minimum(high_a, high_b) - np.maximum(low_a, low_b)
+    union = np.maximum(high_a, high_b) - np.minimum(low_a, low_b)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.clip(intersection, 0, None) / union
+        known = ~np.isnan(ratio)
+        return np.where(known, ratio, 0).sum(axis=2) / known.sum(axis=2)
+
+
+def compute_table(
+    records: Iterable[SizeRecord],
+    pad: float = 0.5,
+    min_score: float = 0.1,
+    max_matches: int = 3,
+) -> Dict[str, Any]:
+    """
+    Compute the equivalence table from normalized size records.
+
+    Args:
+        records: Sizes with ranges in inches
+        pad: Inches added to each side of every range before comparing
+        min_score: Matches scoring below this are dropped
+        max_matches: Matches kept per size and other brand, best first
+
+    Returns:
+        {"brands": {key: display name},
+         "table": {brand: {size: {other brand: [
+             {"category_id", "gender_id", "matches": [{"size_label", "score"}]}
+         ]}}}}
+        with brand and size keys lower-cased
+    """
+    groups: Dict[GroupKey, Dict[str, List[SizeRecord]]] = {}
+    brands: Dict[str, str] = {}
+    for record in records:
+        if not record.ranges:
+            continue
+        brand = record.brand.strip().lower()
+        brands.setdefault(brand, record.brand.strip())
+        group = groups.setdefault((record.category_id, record.gender_id), {})
+        group.setdefault(brand, []).append(record)
+
+    table: Dict[str, Dict[str, Dict[str, List[Dict[str, Any]]]]] = {}
+    for (category_id, gender_id), by_brand in groups.items():
+        if len(by_brand) < 2:
+            continue
+        names = sorted({name for group in by_brand.values() for record in group for name in record.ranges})
+        arrays = {brand: _range_arrays(group, names) for brand, group in by_brand.items()}
+        for brand_a, sizes_a in by_brand.items():
+            for brand_b, sizes_b in by_brand.items():
+                if brand_a == brand_b:
+                    continue
+                scores = overlap_scores(*arrays[brand_a], *arrays[brand_b], pad=pad)
+                for i, size in enumerate(sizes_a):
+                    row = np.nan_to_num(scores[i], nan=0.0)
+                    best = [j for j in np.argsort(-row, kind="stable")[:max_matches] if row[j] >= min_score]
+                    if not best:
+                        continue
+                    sizes = table.setdefault(brand_a, {}).setdefault(size.size_label.strip().lower(), {})
+                    entries = sizes.setdefault(brand_b, [])
+                    matches = [
+                        {"size_label": sizes_b[j].size_label, "score": round(float(row[j]), 3)}
+                        for j in best
+                    ]
+                    # A label repeated within a group (e.g. two guides) keeps its best matches
+                    existing = next(
+                        (e for e in entries if e["category_id"] == category_id and e["gender_id"] == gender_id),
+                        None
+                    )
+                    if existing is None:
+                        entries.append({"category_id": category_id, "gender_id": gender_id, "matches": matches})
+                    elif matches[0]["score"] > existing["matches"][0]["score"]:
+                        existing["matches"] = matches
+    return {"brands": brands, "table": table}
+
+
+class SizeEquivalenceTable:
+    """
+    Precomputed equivalences, persisted as JSON at path.
+
+    Args:
+        path: Where the table is saved and loaded from
+        pad, min_score, max_matches: Passed to compute_table
+    """
+
+    def __init__(self, path: str, pad: float = 0.5, min_score: float = 0.1, max_matches: int = 3):
+        self.path = Path(path)
+        self.pad = pad
+        self.min_score = min_score
+        self.max_matches = max_matches
+        self.fingerprint: Optional[str] = None
+        self.computed_at: Optional[float] = None
+        self._brands: Dict[str, str] = {}
+        self._table: Dict[str, Any] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self.computed_at is not None
+
+    @property
+    def settings(self) -> List[Any]:
+        return [self.pad, self.min_score, self.max_matches]
+
+    def load(self) -> bool:
+        """Load the saved table, if there is one computed with the current settings."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("settings") != self.settings:
+            return False
+        self.fingerprint = data.get("fingerprint")
+        self.computed_at = data.get("computed_at")
+        self._brands = data.get("brands", {})
+        self._table = data.get("table", {})
+        return True
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "fingerprint": self.fingerprint,
+                "computed_at": self.computed_at,
+                "settings": self.settings,
+                "brands": self._brands,
+                "table": self._table,
+            }, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    @timed("size_equivalence", "update")
+    def update(self, records: Iterable[SizeRecord]) -> bool:
+        """
+        Recompute and save the table if the size data has changed.
+
+        Returns:
+            True if the table was recomputed
+        """
+        records = list(records)
+        current = fingerprint(records, tuple(self.settings))
+        if current == self.fingerprint:
+            return False
+        computed = compute_table(records, self.pad, self.min_score, self.max_matches)
+        self._brands, self._table = computed["brands"], computed["table"]
+        self.fingerprint = current
+        self.computed_at = time.time()
+        self._save()
+        return True
+
+    def lookup(
+        self,
+        brand: str,
+        size_label: str,
+        target_brand: str,
+        category_id: Optional[int] = None,
+        gender_id: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Sizes of target_brand equivalent to brand's size_label, per
+        category and gender (optionally only the given ones).
+
+        Raises:
+            KeyError: If either brand is unknown
+        """
+        brand_key, target_key = brand.strip().lower(), target_brand.strip().lower()
+        for key, name in ((brand_key, brand), (target_key, target_brand)):
+            if key not in self._brands:
+                raise KeyError(name)
+        entries = self._table.get(brand_key, {}).get(size_label.strip().lower(), {}).get(target_key, [])
+        return [
+            entry for entry in entries
+            if (category_id is None or entry["category_id"] == category_id)
+            and (gender_id is None or entry["gender_id"] == gender_id)
+        ]
+
+    def brand_name(self, brand: str) -> str:
+        return self._brands.get(brand.strip().lower(), brand)
@@ -1,15 +1,40 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Iterable, List
 import json
-from datetime import datetime
-from ..db.models import SizeGuide, MeasurementType, SizeGuideMeasurement, ValidationRule
+import uuid
+import numpy as np
+from ..db.models import Brand, Gender, SizeGuide, MeasurementType, SizeGuideMeasurement, Unit, ValidationRule
 from ..core.vision import run_vision_prompt
 from ..utils.vector_mapper import match_to_standard
+from ..utils.size_normalizer import normalize_chart, normalize_unit
+from ..utils.metrics import timed
+from .validation_engine import ValidationEngine
+from sqlalchemy import func, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+class ReferenceCache:
+    """
+    Process-wide name -> id maps for reference tables that rarely change.
+    Entries are only added for committed rows.
+    """
+
+    def __init__(self):
+        self.units: Dict[str, int] = {}
+        self.brands: Dict[str, int] = {}
+        self.genders: Dict[str, int] = {}
+        self.measurement_types: Dict[str, int] = {}
+
+_references = ReferenceCache()
+
 class SizeService:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, validation_engine: Optional[ValidationEngine] = None):
         self.session = session
+        # When loaded, charts are validated in memory instead of by query
+        self.validation_engine = validation_engine
+        # Brands and measurement types created in this session, not yet committed
+        self._new_brands: Dict[str, int] = {}
+        self._new_measurement_types: Dict[str, int] = {}
 
+    @timed("size_service", "process_size_guide")
     async def process_size_guide(
         self,
         image_path: str,
@@ -32,137 +57,319 @@ class SizeService:
             Dictionary containing processing results and status
         """
         try:
-            # Create size guide record
-            size_guide = SizeGuide(
-                brand=metadata["brand"],
-                gender=metadata["gender"],
-                category=metadata["size_guide_header"],
-                source_url=metadata["source_url"],
-                status="processing"
-            )
-            self.session.add(size_guide)
-            await self.session.flush()  # Get the ID without committing
-
             # Extract measurements using GPT-4 Vision
-            gpt_output = run_vision_prompt(image_path)
-            
-            # Parse JSON from GPT output
-            try:
-                json_start = gpt_output.index("{")
-                json_end = gpt_output.rindex("}") + 1
-                measurements_data = json.loads(gpt_output[json_start:json_end])
-            except (ValueError, json.JSONDecodeError) as e:
-                size_guide.status = "error"
-                size_guide.error_message = f"Failed to parse GPT output: {str(e)}"
-                await self.session.commit()
-                return {"success": False, "error": str(e)}
-
-            # Get unit ID for the specified unit
+            gpt_output = await run_vision_prompt(image_path)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+        # Parse JSON from GPT output
+        try:
+            json_start = gpt_output.index("{")
+            json_end = gpt_output.rindex("}") + 1
+            measurements_data = json.loads(gpt_output[json_start:json_end])
+        except (ValueError, json.JSONDecodeError) as e:
+            return {"success": False, "error": f"Failed to parse GPT output: {str(e)}"}
+
+        return await self.store_size_guide(measurements_data, metadata)
+
+    @timed("size_service", "store_size_guide")
+    async def store_size_guide(
+        self,
+        measurements_data: Dict[str, Any],
+        metadata: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Store an extracted size chart: one size_guides row per size label,
+        sharing an ingestion_uuid, and the measurements of every size.
+
+        A chart that breaks the validation rules is rolled back rather than
+        stored, as is anything that fails part way.
+
+        Args:
+            measurements_data: Extracted chart, {size_label: {header: value}};
+                entries that aren't sizes (such as "metadata") are ignored
+            metadata: As for process_size_guide
+
+        Returns:
+            Dictionary with success, the stored size_guide_ids by size label
+            and the ingestion_uuid, or the error (and any validation_errors)
+        """
+        try:
             unit_id = await self._get_unit_id(metadata["unit"])
-            
-            # Process each measurement
-            for size_label, measurements in measurements_data.items():
-                for measure_name, value in measurements.items():
-                    # Match the measurement name to our standard types
-                    standard_name = match_to_standard(measure_name)
-                    if not standard_name:
-                        continue  # Skip unrecognized measurements
-                    
-                    # Get or create measurement type
-                    measurement_type = await self._get_measurement_type(standard_name)
-                    
-                    # Create measurement record
-                    measurement = SizeGuideMeasurement(
-                        size_guide_id=size_guide.id,
-                        measurement_type_id=measurement_type.id,
-                        unit_id=unit_id,
-                        min_value=value if isinstance(value, (int, float)) else None,
-                        max_value=value if isinstance(value, (int, float)) else None
-                    )
-                    self.session.add(measurement)
+
+            # Parse ranges, fractions and units into the guide's own unit
+            chart_data = {
+                size: cells for size, cells in measurements_data.items()
+                if size != "metadata" and isinstance(cells, dict)
+            }
+            chart = normalize_chart(
+                chart_data,
+                unit=metadata["unit"],
+                target_unit=normalize_unit(metadata["unit"]) or "in"
+            )
+            if not chart.sizes:
+                raise ValueError("No sizes found in the extracted chart")
+
+            # Create one size guide record per size
+            brand_id = await self._get_brand_id(metadata["brand"], unit_id)
+            gender_id = await self._get_gender_id(metadata.get("gender"))
+            ingestion_uuid = uuid.uuid4()
+            result = await self.session.execute(
+                insert(SizeGuide).returning(SizeGuide.size_label, SizeGuide.id),
+                [
+                    {
+                        "brand_id": brand_id,
+                        "size_label": size,
+                        "gender_id": gender_id,
+                        "size_guide_header": metadata.get("size_guide_header"),
+                        "source_url": metadata.get("source_url"),
+                        "scope": metadata.get("scope"),
+                        "ingestion_uuid": ingestion_uuid
+                    }
+                    for size in chart.sizes
+                ]
+            )
+            size_guide_ids = dict(result.all())
+
+            # Resolve each distinct header once, then write every cell with the plan
+            column_plan = await self._build_column_plan(chart_data)
+            rows = self._measurement_rows(
+                chart, column_plan, [size_guide_ids[size] for size in chart.sizes], unit_id
+            )
+            if rows:
+                # One executemany for the whole guide instead of an INSERT per cell
+                with timed("size_service", "insert_measurements"):
+                    await self.session.execute(insert(SizeGuideMeasurement), rows)
 
             # Validate measurements against rules
-            validation_errors = await self._validate_measurements(size_guide.id)
-            if validation_errors:
-                size_guide.status = "error"
-                size_guide.error_message = "Validation errors: " + ", ".join(validation_errors)
+            if self.validation_engine is not None and self.validation_engine.loaded:
+                validation_errors = self._validate_chart(
+                    chart, [column_plan.get(name) for name in chart.measurements]
+                )
             else:
-                size_guide.status = "active"
-            
-            size_guide.processed_at = datetime.utcnow()
-            await self.session.commit()
+                validation_errors = await self._validate_measurements(rows, unit_id)
+            if validation_errors:
+                await self._rollback()
+                return {
+                    "success": False,
+                    "error": "Validation errors: " + ", ".join(validation_errors),
+                    "validation_errors": validation_errors
+                }
+
+            await self._commit()
 
             return {
                 "success": True,
-                "size_guide_id": size_guide.id,
-                "status": size_guide.status,
+                "size_guide_ids": size_guide_ids,
+                "ingestion_uuid": str(ingestion_uuid),
                 "measurements": measurements_data
             }
 
         except Exception as e:
-            if size_guide:
-                size_guide.status = "error"
-                size_guide.error_message = str(e)
-                await self.session.commit()
+            await self._rollback()
             return {"success": False, "error": str(e)}
 
+    async def _commit(self):
+        """Commit, then share the brands and measurement types this session created."""
+        await self.session.commit()
+        _references.brands.update(self._new_brands)
+        _references.measurement_types.update(self._new_measurement_types)
+        self._new_brands.clear()
+        self._new_measurement_types.clear()
+
+    async def _rollback(self):
+        """Roll back, forgetting ids of rows that no longer exist."""
+        await self.session.rollback()
+        self._new_brands.clear()
+        self._new_measurement_types.clear()
+
+    def _measurement_rows(
+        self,
+        chart,
+        column_plan: Dict[str, Optional[int]],
+        size_guide_ids: List[int],
+        unit_id: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Insert parameters for every recognized, non-empty cell of a chart,
+        given the size guide id of each of its sizes. Unrecognized
+        measurements and empty or unparseable cells are skipped.
+        """
+        type_ids = np.array([column_plan.get(name) or 0 for name in chart.measurements])
+        keep = (type_ids > 0)[np.newaxis, :] & ~np.isnan(chart.min_values)
+        sizes, columns = np.nonzero(keep)
+        return [
+            {
+                "size_guide_id": size_guide_ids[i],
+                "measurement_type_id": int(type_ids[j]),
+                "unit_id": unit_id,
+                "min_value": float(chart.min_values[i, j]),
+                "max_value": float(chart.max_values[i, j])
+            }
+            for i, j in zip(sizes, columns)
+        ]
+
+    @timed("size_service", "get_unit_id")
     async def _get_unit_id(self, unit_name: str) -> int:
         """Get the ID for a unit of measurement."""
-        unit = await self.session.execute("SELECT id FROM units WHERE name = :name", 
-                                 {"name": unit_name}).first()
-        if not unit:
-            raise ValueError(f"Unknown unit: {unit_name}")
-        return unit[0]
-
-    async def _get_measurement_type(self, name: str) -> MeasurementType:
-        """Get or create a measurement type."""
-        measurement_type = await self.session.execute(MeasurementType).filter(
-            MeasurementType.name == name
-        ).first()
-        
-        if not measurement_type:
-            # Determine category based on name
-            category = "upper_body" if name in ["chest", "shoulder", "sleeve", "neck"] else "lower_body"
-            measurement_type = MeasurementType(
-                name=name,
-                description=f"Measurement for {name}",
-                category=category
+        unit_id = _references.units.get(unit_name)
+        if unit_id is None:
+            result = await self.session.execute(select(Unit.id).where(Unit.name == unit_name))
+            unit_id = result.scalar_one_or_none()
+            if unit_id is None:
+                raise ValueError(f"Unknown unit: {unit_name}")
+            _references.units[unit_name] = unit_id
+        return unit_id
+
+    @timed("size_service", "get_brand_id")
+    async def _get_brand_id(self, brand_name: str, default_unit_id: int) -> int:
+        """Get the ID for a brand, creating it with the guide's unit if it is new."""
+        brand_id = _references.brands.get(brand_name, self._new_brands.get(brand_name))
+        if brand_id is None:
+            result = await self.session.execute(
+                select(Brand.id).where(Brand.name == brand_name).order_by(Brand.id).limit(1)
             )
-            self.session.add(measurement_type)
-            await self.session.flush()
-        
-        return measurement_type[0]
+            brand_id = result.scalar_one_or_none()
+            if brand_id is not None:
+                _references.brands[brand_name] = brand_id
+            else:
+                result = await self.session.execute(
+                    insert(Brand).values(name=brand_name, default_unit_id=default_unit_id).returning(Brand.id)
+                )
+                brand_id = self._new_brands[brand_name] = result.scalar_one()
+        return brand_id
 
-    async def _validate_measurements(self, size_guide_id: int) -> list[str]:
+    @timed("size_service", "get_gender_id")
+    async def _get_gender_id(self, gender_name: Optional[str]) -> Optional[int]:
+        """Get the ID for a gender (case-insensitive), or None if it is unknown."""
+        if not gender_name:
+            return None
+        key = gender_name.strip().lower()
+        gender_id = _references.genders.get(key)
+        if gender_id is None:
+            result = await self.session.execute(
+                select(Gender.id).where(func.lower(Gender.name) == key).order_by(Gender.id).limit(1)
+            )
+            gender_id = result.scalar_one_or_none()
+            if gender_id is not None:
+                _references.genders[key] = gender_id
+        return gender_id
+
+    @timed("size_service", "build_column_plan")
+    async def _build_column_plan(self, measurements_data: Dict[str, Any]) -> Dict[str, Optional[int]]:
+        """
+        Map every distinct header in a chart to a measurement_type id.
+
+        Headers are matched to standard names once per chart rather than once
+        per cell, and all measurement types are resolved in a single lookup.
+        Headers that don't match a standard name map to None.
         """
-        Validate measurements against rules.
-        Returns a list of validation error messages.
+        headers = []
+        for measurements in measurements_data.values():
+            if isinstance(measurements, dict):
+                for measure_name in measurements:
+                    if measure_name not in headers:
+                        headers.append(measure_name)
+
+        standard_names = {header: match_to_standard(header) for header in headers}
+        measurement_types = await self._get_measurement_types(
+            name for name in standard_names.values() if name
+        )
+
+        return {
+            header: measurement_types[name] if name else None
+            for header, name in standard_names.items()
+        }
+
+    @timed("size_service", "get_measurement_types")
+    async def _get_measurement_types(self, names: Iterable[str]) -> Dict[str, int]:
+        """
+        Get or create measurement type ids for a batch of standard names.
+
+        Known names come from the process-wide cache; the rest are fetched
+        in one query, and any still missing are created in one INSERT.
         """
+        names = set(names)
+        type_ids = {
+            name: _references.measurement_types.get(name, self._new_measurement_types.get(name))
+            for name in names
+        }
+        missing = {name for name, type_id in type_ids.items() if type_id is None}
+        if not missing:
+            return type_ids
+
+        result = await self.session.execute(
+            select(MeasurementType.name, MeasurementType.id).where(MeasurementType.name.in_(missing))
+        )
+        found = dict(result.all())
+        _references.measurement_types.update(found)
+        type_ids.update(found)
+
+        missing -= found.keys()
+        if missing:
+            result = await self.session.execute(
+                insert(MeasurementType).returning(MeasurementType.name, MeasurementType.id),
+                [{"name": name, "description": f"Measurement for {name}"} for name in sorted(missing)]
+            )
+            created = dict(result.all())
+            self._new_measurement_types.update(created)
+            type_ids.update(created)
+
+        return type_ids
+
+    def _validate_chart(self, chart, measurement_types: List[Any]) -> List[str]:
+        """Validate a whole chart with the in-memory rules engine."""
+        violations = self.validation_engine.validate(chart, measurement_types)
+        return [
+            f"{v['measurement']} {'below minimum' if v['kind'] == 'below_min' else 'above maximum'} allowed value"
+            for v in violations
+        ]
+
+    @timed("size_service", "validate_measurements")
+    async def _validate_measurements(self, rows: List[Dict[str, Any]], unit_id: int) -> List[str]:
+        """
+        Validate a guide's measurements against rules.
+
+        The rules for every measurement type in the guide are fetched in
+        one query. Returns a list of validation error messages.
+        """
+        type_ids = {row["measurement_type_id"] for row in rows}
+        if not type_ids:
+            return []
+
+        result = await self.session.execute(
+            select(
+                ValidationRule.measurement_type_id,
+                MeasurementType.name,
+                ValidationRule.min_allowed,
+                ValidationRule.max_allowed
+            )
+            .join(MeasurementType, ValidationRule.measurement_type_id == MeasurementType.id)
+            .where(ValidationRule.unit_id == unit_id, ValidationRule.measurement_type_id.in_(type_ids))
+        )
+        rules = {}
+        for type_id, name, min_allowed, max_allowed in result.all():
+            # First rule per type, as before
+            rules.setdefault(type_id, (
+                name,
+                float(min_allowed) if min_allowed is not None else None,
+                float(max_allowed) if max_allowed is not None else None
+            ))
+
         errors = []
-        measurements = await self.session.execute(SizeGuideMeasurement).filter(
-            SizeGuideMeasurement.size_guide_id == size_guide_id
-        ).all()
-        
-        for measurement in measurements:
-            rules = await self.session.execute(ValidationRule).filter(
-                ValidationRule.measurement_type_id == measurement.measurement_type_id,
-                ValidationRule.unit_id == measurement.unit_id
-            ).first()
-            
-            if rules:
-                # Convert values to float for comparison
-                min_value = float(measurement.min_value) if measurement.min_value is not None else None
-                max_value = float(measurement.max_value) if measurement.max_value is not None else None
-                min_allowed = float(rules[0].min_allowed) if rules[0].min_allowed is not None else None
-                max_allowed = float(rules[0].max_allowed) if rules[0].max_allowed is not None else None
-                
-                if min_value is not None and min_allowed is not None and min_value < min_allowed:
-                    errors.append(f"{measurement.measurement_type.name} below minimum allowed value")
-                if max_value is not None and max_allowed is not None and max_value > max_allowed:
-                    errors.append(f"{measurement.measurement_type.name} above maximum allowed value")
+        for row in rows:
+            rule = rules.get(row["measurement_type_id"])
+            if rule is None:
+                continue
+            name, min_allowed, max_allowed = rule
+            if min_allowed is not None and row["min_value"] < min_allowed:
+                errors.append(f"{name} below minimum allowed value")
+            if max_allowed is not None and row["max_value"] > max_allowed:
+                errors.append(f"{name} above maximum allowed value")
         
         return errors
 
+    @timed("size_service", "prepare_ingestion_proposal")
     async def prepare_ingestion_proposal(self, analysis_result: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
         """
         Analyze the extracted data and metadata to prepare a detailed ingestion proposal.
@@ -216,6 +423,18 @@ class SizeService:
         # Add metadata
         proposal['metadata'] = metadata
         
+        # Check the extracted values against the validation rules
+        if self.validation_engine is not None and self.validation_engine.loaded:
+            chart_data = size_data or analysis_result
+            chart = normalize_chart(
+                {size: cells for size, cells in chart_data.items() if size != 'metadata'},
+                unit=metadata.get('unit'),
+                target_unit=normalize_unit(metadata.get('unit')) or "in"
+            )
+            proposal['potential_conflicts'].extend(self._validate_chart(
+                chart, [match_to_standard(name) for name in chart.measurements]
+            ))
+
         # Add validation checks
         proposal['validation_checks'].extend([
             "Verify measurement units consistency",
@@ -225,6 +444,7 @@ class SizeService:
         
         return proposal
 
+    @timed("size_service", "execute_ingestion")
     async def execute_ingestion(self, proposal: Dict[str, Any]) -> Dict[str, Any]:
         """
         Execute the approved ingestion proposal.
@@ -241,7 +461,7 @@ class SizeService:
                     pass
             
             # Commit the transaction
-            await self.session.commit()
+            await self._commit()
             
             return {
                 'success': True,
@@ -251,7 +471,7 @@ class SizeService:
             
         except Exception as e:
             # Rollback on error
-            await self.session.rollback()
+            await self._rollback()
             return {
                 'success': False,
                 'error': str(e)
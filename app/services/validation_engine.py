@@ -0,0 +1,208 @@
+"""
+In-memory validation of extracted size charts.
+
+All validation_rules rows are loaded once into NumPy arrays of allowed
+minimums and maximums, one pair per unit ("in" and "cm"), indexed by
+measurement type. A rule stored in one unit is converted for the other
+unless that unit has its own rule. Validating a chart, or a whole batch
+of charts, is then a gather and two comparisons over every cell at once,
+with no database access.
+
+The rules are reloaded only when a cheap signature query (count, newest
+id and row, sums of the bounds) shows the table has changed.
+"""
+
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db.models import MeasurementType, Unit, ValidationRule
+from ..utils.metrics import timed
+from ..utils.size_normalizer import CM_PER_INCH, NormalizedChart, normalize_unit
+
+UNITS = ("in", "cm")
+
+# (measurement_type_id, measurement type name, unit name, min_allowed, max_allowed)
+RuleRow = Tuple[int, str, str, Optional[float], Optional[float]]
+
+MeasurementKey = Union[int, str, None]
+
+
+def _convert(value: float, from_unit: str, to_unit: str) -> float:
+    if from_unit == to_unit:
+        return value
+    return value * CM_PER_INCH if to_unit == "cm" else value / CM_PER_INCH
+
+
+class ValidationEngine:
+    """
+    Vectorized checks of chart cells against validation rules.
+
+    Measurements are identified by measurement_type id or by name (case-
+    insensitive); cells of measurements without a rule are not checked.
+    """
+
+    def __init__(self):
+        self.signature: Optional[Tuple[Any, ...]] = None
+        self.loaded_at: Optional[float] = None
+        self._index: Dict[Union[int, str], int] = {}
+        self._names: List[str] = []
+        self._low: Dict[str, np.ndarray] = {unit: np.empty(0) for unit in UNITS}
+        self._high: Dict[str, np.ndarray] = {unit: np.empty(0) for unit in UNITS}
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def build(self, rules: Iterable[RuleRow]):
+        """Replace the rules; the first rule per (measurement type, unit) wins."""
+        index: Dict[Union[int, str], int] = {}
+        names: List[str] = []
+        native: Dict[Tuple[int, str], Tuple[Optional[float], Optional[float]]] = {}
+        for type_id, name, unit_name, min_allowed, max_allowed in rules:
+            unit = normalize_unit(unit_name)
+            if unit is None:
+                continue
+            if type_id not in index:
+                index[type_id] = index[name.strip().lower()] = len(names)
+                names.append(name)
+            native.setdefault((index[type_id], unit), (
+                float(min_allowed) if min_allowed is not None else None,
+                float(max_allowed) if max_allowed is not None else None,
+            ))
+
+        low = {unit: np.full(len(names), np.nan) for unit in UNITS}
+        high = {unit: np.full(len(names), np.nan) for unit in UNITS}
+        for (row, unit), bounds in native.items():
+            for target in UNITS:
+                if target != unit and (row, target) in native:
+                    continue  # That unit has its own rule
+                min_allowed, max_allowed = bounds
+                if min_allowed is not None:
+                    low[target][row] = _convert(min_allowed, unit, target)
+                if max_allowed is not None:
+                    high[target][row] = _convert(max_allowed, unit, target)
+
+        self._index, self._names, self._low, self._high = index, names, low, high
+        self.loaded_at = time.time()
+
+    async def refresh(self, session: AsyncSession) -> bool:
+        """
+        Reload the rules if the table has changed since the last load.
+
+        Returns:
+            True if the rules were reloaded
+        """
+        result = await session.execute(select(
+            func.count(ValidationRule.id),
+            func.max(ValidationRule.id),
+            func.max(ValidationRule.created_at),
+            func.sum(ValidationRule.min_allowed),
+            func.sum(ValidationRule.max_allowed),
+        ))
+        signature = tuple(result.one())
+        if signature == self.signature:
+            return False
+
+        with timed("validation_engine", "load_rules"):
+            rows = await session.execute(
+                select(
+                    ValidationRule.measurement_type_id,
+                    MeasurementType.name,
+                    Unit.name,
+                    ValidationRule.min_allowed,
+                    ValidationRule.max_allowed
+                )
+                .join(MeasurementType, ValidationRule.measurement_type_id == MeasurementType.id)
+                .join(Unit, ValidationRule.unit_id == Unit.id)
+                .order_by(ValidationRule.id)
+            )
+            self.build(rows.all())
+        self.signature = signature
+        return True
+
+    def _rule_indices(self, chart: NormalizedChart, measurement_types: Optional[Sequence[MeasurementKey]]) -> np.ndarray:
+        keys = measurement_types if measurement_types is not None else chart.measurements
+        return np.array([
+            self._index.get(key.strip().lower() if isinstance(key, str) else key, -1)
+            if key is not None else -1
+            for key in keys
+        ], dtype=np.int64)
+
+    @timed("validation_engine", "validate")
+    def validate_batch(
+        self,
+        charts: Sequence[NormalizedChart],
+        measurement_types: Optional[Sequence[Optional[Sequence[MeasurementKey]]]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Check every cell of every chart.
+
+        Args:
+            charts: Normalized charts, in inches or centimetres
+            measurement_types: Per chart, the measurement type id or name
+                of each column (None to skip a column); by default the
+                chart's own column names are used
+
+        Returns:
+            Per chart, its violations: {"size", "measurement", "value",
+            "limit", "kind"} with kind "below_min" or "above_max"
+        """
+        violations: List[List[Dict[str, Any]]] = [[] for _ in charts]
+        if not charts or not self._names:
+            return violations
+
+        mins, maxs, rules, chart_ids, cells = [], [], [], [], []
+        units = []
+        for c, chart in enumerate(charts):
+            columns = self._rule_indices(chart, measurement_types[c] if measurement_types else None)
+            size_count = len(chart.sizes)
+            mins.append(chart.min_values.ravel())
+            maxs.append(chart.max_values.ravel())
+            rules.append(np.tile(columns, size_count))
+            chart_ids.append(np.full(chart.min_values.size, c))
+            cells.append(np.arange(chart.min_values.size))
+            units.append(np.full(chart.min_values.size, UNITS.index(normalize_unit(chart.unit) or "in")))
+
+        mins, maxs = np.concatenate(mins), np.concatenate(maxs)
+        rules, chart_ids, cells = np.concatenate(rules), np.concatenate(chart_ids), np.concatenate(cells)
+        units = np.concatenate(units)
+
+        # Allowed bounds for every cell, NaN where there is no rule
+        checked = rules >= 0
+        low = np.full(rules.shape, np.nan)
+        high = np.full(rules.shape, np.nan)
+        for u, unit in enumerate(UNITS):
+            selected = checked & (units == u)
+            low[selected] = self._low[unit][rules[selected]]
+            high[selected] = self._high[unit][rules[selected]]
+
+        below = mins < low  # NaN on either side compares False
+        above = maxs > high
+        for k in np.flatnonzero(below | above):
+            chart = charts[chart_ids[k]]
+            row, column = divmod(int(cells[k]), len(chart.measurements))
+            name = self._names[rules[k]]
+            if below[k]:
+                violations[chart_ids[k]].append({
+                    "size": chart.sizes[row], "measurement": name,
+                    "value": float(mins[k]), "limit": float(low[k]), "kind": "below_min",
+                })
+            if above[k]:
+                violations[chart_ids[k]].append({
+                    "size": chart.sizes[row], "measurement": name,
+                    "value": float(maxs[k]), "limit": float(high[k]), "kind": "above_max",
+                })
+        return violations
+
+    def validate(
+        self, chart: NormalizedChart, measurement_types: Optional[Sequence[MeasurementKey]] = None
+    ) -> List[Dict[str, Any]]:
+        """Check every cell of one chart; see validate_batch."""
+        return self.validate_batch([chart], [measurement_types] if measurement_types is not None else None)[0]
@@ -20,6 +20,7 @@ from PIL import Image as PILImage, UnidentifiedImageError
 # Import core functionality
 from app.core.jester_chat import JesterChat
 from app.services.size_service import SizeService
+from app.services.validation_engine import ValidationEngine
 from app.db.database import AsyncSessionLocal, init_db
 from app.config import config
 
@@ -47,6 +48,9 @@ if "proposed_ingestion" not in st.session_state:
     st.session_state.proposed_ingestion = None
 if "metadata" not in st.session_state:
     st.session_state.metadata = {}
+if "validation_engine" not in st.session_state:
+    # Rules are held in memory and reloaded only when the table changes
+    st.session_state.validation_engine = ValidationEngine() if config.VALIDATION_ENGINE_ENABLED else None
 
 # Initialize DB
 if not st.session_state.db_initialized:
@@ -209,7 +213,10 @@ elif st.session_state.current_step == "analysis":
         # Prepare the ingestion proposal
         async def prepare_ingestion():
             async with AsyncSessionLocal() as session:
-                size_service = SizeService(session)
+                validation_engine = st.session_state.validation_engine
+                if validation_engine is not None:
+                    await validation_engine.refresh(session)
+                size_service = SizeService(session, validation_engine)
                 proposal = await size_service.prepare_ingestion_proposal(
                     st.session_state.analysis_result,
                     st.session_state.metadata
@@ -235,7 +242,7 @@ elif st.session_state.current_step == "approval":
         if st.button("👍 Approve and Ingest"):
             async def execute_ingestion():
                 async with AsyncSessionLocal() as session:
-                    size_service = SizeService(session)
+                    size_service = SizeService(session, st.session_state.validation_engine)
                     result = await size_service.execute_ingestion(
                         st.session_state.proposed_ingestion
                     )
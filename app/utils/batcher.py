@@ -0,0 +1,66 @@
+"""
+Micro-batching of concurrent calls.
+
+Encoding one query at a time wastes most of a sentence transformer's
+throughput; encoding a batch costs little more than encoding one item.
+MicroBatcher collects items submitted by concurrent requests for a few
+milliseconds (or until a batch is full) and runs them through a single
+batched call in a worker thread.
+"""
+
+import asyncio
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent submit() calls into batched calls of fn.
+
+    Args:
+        fn: Takes a list of items and returns a sequence of results in the
+            same order; run in a worker thread
+        max_batch: Flush as soon as this many items are waiting
+        max_wait: Seconds the first waiting item may wait for others
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], Sequence[Any]], max_batch: int = 32, max_wait: float = 0.005):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def submit(self, item: Any) -> Any:
+        """Add an item to the next batch and wait for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await asyncio.to_thread(self.fn, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,175 @@
+"""
+Perceptual hashing and near-duplicate lookup for size guide images.
+
+The same brand chart is often uploaded again at a different zoom level or
+with a different browser crop. Byte hashes miss those copies, so images are
+fingerprinted with a difference hash (dHash) of their content region and
+kept in a multi-index hash table, which finds every hash within a Hamming
+radius without scanning the whole index.
+
+A 64-bit dHash only captures a chart's layout: two brands' charts with the
+same grid hash alike. A match on the content hash (SHA-256 of the bytes)
+is the same image; a perceptual match is only the same chart if the rest
+of what is known about it agrees, so callers narrow candidates with
+find(where=...) before reusing one.
+"""
+
+import hashlib
+import io
+import json
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from .image_preprocessing import find_content_box
+
+
+def dhash(source: Union[str, Path, bytes, Image.Image], hash_size: int = 8) -> int:
+    """
+    Compute a difference hash of an image's content region.
+
+    The page background is cropped away first so screenshots of the same
+    chart with different margins hash alike, and the image is reduced to a
+    tiny grayscale thumbnail so zoom level doesn't matter.
+
+    Returns:
+        A hash_size * hash_size bit integer
+    """
+    if isinstance(source, Image.Image):
+        image = source
+    elif isinstance(source, (str, Path)):
+        image = Image.open(source)
+    else:
+        image = Image.open(io.BytesIO(source))
+
+    box = find_content_box(image, margin=0)
+    if box:
+        image = image.crop(box)
+
+    thumbnail = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 of an image's bytes, for exact duplicate checks."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
+
+
+class MultiIndexHash:
+    """
+    Multi-index hashing over integer hashes with Hamming distance.
+
+    Hashes are split into max_distance + 1 bit ranges, each with its own
+    lookup table. By the pigeonhole principle two hashes within
+    max_distance bits agree exactly on at least one range, so a search only
+    has to verify the entries that share a range with the query.
+    """
+
+    def __init__(self, bits: int = 64, max_distance: int = 6):
+        self.bits = bits
+        self.max_distance = max_distance
+        n_ranges = max_distance + 1
+        widths = [bits // n_ranges + (1 if i < bits % n_ranges else 0) for i in range(n_ranges)]
+        self._ranges = []
+        shift = 0
+        for width in widths:
+            self._ranges.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in self._ranges]
+        self._hashes: List[int] = []
+        self._payloads: List[Any] = []
+
+    def add(self, hash_value: int, payload: Any):
+        """Insert a hash with its payload."""
+        position = len(self._hashes)
+        self._hashes.append(hash_value)
+        self._payloads.append(payload)
+        for table, (shift, mask) in zip(self._tables, self._ranges):
+            table.setdefault((hash_value >> shift) & mask, []).append(position)
+
+    def search(self, hash_value: int, max_distance: Optional[int] = None) -> List[Tuple[int, Any]]:
+        """Return (distance, payload) for every hash within max_distance, nearest first."""
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            raise ValueError(f"max_distance can be at most {self.max_distance}")
+
+        candidates = set()
+        for table, (shift, mask) in zip(self._tables, self._ranges):
+            candidates.update(table.get((hash_value >> shift) & mask, ()))
+
+        results = []
+        for position in candidates:
+            distance = hamming_distance(hash_value, self._hashes[position])
+            if distance <= max_distance:
+                results.append((distance, self._payloads[position]))
+        results.sort(key=lambda result: result[0])
+        return results
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+
+class NearDuplicateIndex:
+    """
+    Persistent perceptual-hash index of ingested size guides.
+
+    Entries are appended to a JSONL file and loaded into memory on start.
+
+    Args:
+        path: JSONL file backing the index
+        max_distance: Largest Hamming distance treated as a duplicate
+    """
+
+    def __init__(self, path: str, max_distance: int = 6):
+        self.path = Path(path)
+        self.max_distance = max_distance
+        self._table = MultiIndexHash(max_distance=max_distance)
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._table.add(int(entry["hash"], 16), entry)
+
+    def find(
+        self, hash_value: int, where: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """
+        Return (distance, entry) of the closest near-duplicate, if any.
+
+        Args:
+            where: Only consider entries for which this returns True
+        """
+        for distance, entry in self._table.search(hash_value, self.max_distance):
+            if where is None or where(entry):
+                return distance, entry
+        return None
+
+    def add(self, hash_value: int, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Record an ingested image; entry is stored alongside its hash."""
+        entry = {"hash": f"{hash_value:016x}", **entry}
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+            self._table.add(hash_value, entry)
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._table)
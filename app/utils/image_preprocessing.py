@@ -0,0 +1,255 @@
+"""
+Image preprocessing for size guide screenshots.
+
+Size guides usually arrive as full-page retina screenshots: large, mostly
+white, often colourless, and saved as lossless PNG. This module crops them
+to the table region, downscales them to a target long edge, drops colour
+when it carries no information and recompresses them before they are sent
+to the vision model.
+"""
+
+import io
+import math
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageChops
+
+MIME_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+    "BMP": "image/bmp",
+}
+
+# Vision models tile images into 512px squares after fitting them into a
+# 2048px box and scaling the short side down to 768px
+TILE_SIZE = 512
+TILE_TOKENS = 170
+BASE_TOKENS = 85
+# The most any image can cost (eight tiles, e.g. 2048x768), for images
+# whose size is unknown
+MAX_IMAGE_TOKENS = BASE_TOKENS + TILE_TOKENS * 8
+
+
+@dataclass
+class PreprocessedImage:
+    """An image ready to be sent to the vision model, plus what was done to it."""
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    width: Optional[int] = None
+    height: Optional[int] = None
+    original_width: Optional[int] = None
+    original_height: Optional[int] = None
+    steps: List[str] = field(default_factory=list)
+
+    @classmethod
+    def passthrough(cls, data: bytes, mime_type: str) -> "PreprocessedImage":
+        """Wrap image bytes that are sent unchanged."""
+        width = height = None
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                width, height = image.size
+        except Exception:
+            pass
+        return cls(
+            data=data,
+            mime_type=mime_type,
+            original_bytes=len(data),
+            width=width,
+            height=height,
+            original_width=width,
+            original_height=height,
+        )
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+    @property
+    def estimated_tokens(self) -> Optional[int]:
+        if self.width is None or self.height is None:
+            return None
+        return estimate_image_tokens(self.width, self.height)
+
+    @property
+    def original_estimated_tokens(self) -> Optional[int]:
+        if self.original_width is None or self.original_height is None:
+            return None
+        return estimate_image_tokens(self.original_width, self.original_height)
+
+    def stats(self) -> Dict[str, Any]:
+        """Summarize the preprocessing for logging and response metadata."""
+        tokens = self.estimated_tokens
+        original_tokens = self.original_estimated_tokens
+        return {
+            "steps": self.steps,
+            "original_bytes": self.original_bytes,
+            "bytes": len(self.data),
+            "bytes_saved": self.bytes_saved,
+            "original_size": [self.original_width, self.original_height],
+            "size": [self.width, self.height],
+            "estimated_tokens": tokens,
+            "estimated_tokens_saved": (
+                original_tokens - tokens
+                if tokens is not None and original_tokens is not None else None
+            ),
+        }
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """Estimate the input tokens a high-detail vision request charges for an image."""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+    return BASE_TOKENS + TILE_TOKENS * tiles
+
+
+def find_content_box(
+    image: Image.Image,
+    threshold: int = 16,
+    margin: int = 8
+) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Find the bounding box of everything that differs from the page background.
+
+    The background colour is taken from the top-left pixel, which for
+    screenshots of size guides is nearly always page margin.
+
+    Returns:
+        (left, upper, right, lower) padded by margin, or None if the image
+        is blank
+    """
+    rgb = image.convert("RGB")
+    background = Image.new("RGB", rgb.size, rgb.getpixel((0, 0)))
+    diff = ImageChops.difference(rgb, background).convert("L")
+    mask = diff.point(lambda value: 255 if value > threshold else 0)
+    box = mask.getbbox()
+    if box is None:
+        return None
+    left, upper, right, lower = box
+    return (
+        max(0, left - margin),
+        max(0, upper - margin),
+        min(rgb.width, right + margin),
+        min(rgb.height, lower + margin),
+    )
+
+
+def is_grayscale_safe(image: Image.Image, tolerance: int = 24, sample_edge: int = 256) -> bool:
+    """
+    Whether dropping colour would lose information.
+
+    Checks a thumbnail: if nearly every pixel has channels within tolerance
+    of each other the image is effectively grey already.
+    """
+    if image.mode in ("1", "L", "LA"):
+        return True
+    sample = image.convert("RGB")
+    sample.thumbnail((sample_edge, sample_edge))
+    pixels = np.asarray(sample, dtype=np.int16)
+    chroma = pixels.max(axis=2) - pixels.min(axis=2)
+    return float(np.percentile(chroma, 99.5)) <= tolerance
+
+
+def _encode(image: Image.Image, image_format: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if image_format == "PNG":
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        image.save(buffer, format=image_format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def preprocess_image(
+    source: Union[str, Path, bytes],
+    max_long_edge: int = 2048,
+    image_format: str = "PNG",
+    quality: int = 85,
+    crop: bool = True,
+    grayscale: bool = True,
+) -> PreprocessedImage:
+    """
+    Prepare a size guide image for a vision request.
+
+    Args:
+        source: Path to the image or its raw bytes
+        max_long_edge: Longest edge in pixels after downscaling
+        image_format: Output format (PNG, JPEG or WEBP). PNG keeps table
+            text sharpest; JPEG and WEBP trade some sharpness for size.
+        quality: Encoder quality for JPEG and WEBP (1-95)
+        crop: Whether to crop away the uniform page background
+        grayscale: Whether to drop colour when it is safe to do so
+
+    Returns:
+        PreprocessedImage with the encoded bytes and what was done to them
+    """
+    image_format = image_format.upper()
+    if image_format not in ("PNG", "JPEG", "WEBP"):
+        raise ValueError(f"Unsupported output format: {image_format}")
+
+    if isinstance(source, (str, Path)):
+        data = Path(source).read_bytes()
+    else:
+        data = bytes(source)
+
+    with Image.open(io.BytesIO(data)) as opened:
+        image = opened.copy()
+        original_format = opened.format
+    original_width, original_height = image.size
+    steps = []
+
+    if image.mode in ("P", "RGBA", "LA"):
+        # Flatten transparency onto white so it doesn't turn black in JPEG
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", rgba.size, (255, 255, 255))
+        image.paste(rgba, mask=rgba.split()[-1])
+
+    if crop:
+        box = find_content_box(image)
+        if box and box != (0, 0, image.width, image.height):
+            image = image.crop(box)
+            steps.append("crop")
+
+    if max(image.size) > max_long_edge:
+        scale = max_long_edge / max(image.size)
+        image = image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            Image.LANCZOS
+        )
+        steps.append("downscale")
+
+    if grayscale and image.mode != "L" and is_grayscale_safe(image):
+        image = image.convert("L")
+        steps.append("grayscale")
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    encoded = _encode(image, image_format, quality)
+    if len(encoded) >= len(data) and original_format in ("JPEG", "WEBP") and original_format != image_format:
+        # Photos and scans compress far better in their own lossy format than as PNG
+        lossy = _encode(image, original_format, quality)
+        if len(lossy) < len(encoded):
+            encoded, image_format = lossy, original_format
+
+    if len(encoded) >= len(data) and original_format in MIME_TYPES:
+        # Nothing to gain: send the original untouched
+        return PreprocessedImage.passthrough(data, MIME_TYPES[original_format])
+
+    steps.append(f"encode:{image_format.lower()}")
+    return PreprocessedImage(
+        data=encoded,
+        mime_type=MIME_TYPES[image_format],
+        original_bytes=len(data),
+        width=image.width,
+        height=image.height,
+        original_width=original_width,
+        original_height=original_height,
+        steps=steps,
+    )
@@ -0,0 +1,134 @@
+"""
+Splitting of multi-table size guide screenshots.
+
+Brand pages often stack several charts (tops, bottoms, a conversion table)
+in one tall screenshot. Tables are separated by horizontal bands of page
+background, so the image is split on those bands and each table can be
+extracted on its own.
+"""
+
+import io
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from .image_preprocessing import find_content_box
+
+Region = Tuple[int, int, int, int]
+
+
+def find_table_regions(
+    image: Image.Image,
+    min_gap: int = 40,
+    min_height: int = 120,
+    threshold: int = 16,
+) -> List[Region]:
+    """
+    Find vertically stacked content regions separated by blank bands.
+
+    Args:
+        image: The screenshot
+        min_gap: Minimum height in pixels of a background band that
+            separates two tables. Smaller gaps, such as between a table
+            and its title, don't split.
+        min_height: Regions shorter than this are merged into the region
+            above them (or below, for the first one)
+        threshold: Grey-level difference from the background that counts
+            as content
+
+    Returns:
+        (left, upper, right, lower) boxes from top to bottom, each cropped
+        to its content. Empty if the image is blank.
+    """
+    gray = np.asarray(image.convert("L"), dtype=np.int16)
+    background = gray[0, 0]
+    has_content = (np.abs(gray - background) > threshold).any(axis=1)
+    content_rows = np.flatnonzero(has_content)
+    if content_rows.size == 0:
+        return []
+
+    # Split wherever consecutive content rows are at least min_gap apart
+    gaps = np.flatnonzero(np.diff(content_rows) > min_gap)
+    starts = np.concatenate(([content_rows[0]], content_rows[gaps + 1]))
+    ends = np.concatenate((content_rows[gaps], [content_rows[-1]])) + 1
+    bands = [[int(start), int(end)] for start, end in zip(starts, ends)]
+
+    # Fold slivers (stray rules, footnotes) into a neighbouring region
+    merged: List[List[int]] = []
+    for band in bands:
+        if merged and band[1] - band[0] < min_height:
+            merged[-1][1] = band[1]
+        elif merged and merged[-1][1] - merged[-1][0] < min_height:
+            merged[-1][1] = band[1]
+        else:
+            merged.append(band)
+
+    regions = []
+    for upper, lower in merged:
+        strip = image.crop((0, upper, image.width, lower))
+        box = find_content_box(strip, threshold=threshold, margin=0)
+        if box is None:
+            continue
+        left, top, right, bottom = box
+        regions.append((left, upper + top, right, upper + bottom))
+    return regions
+
+
+def split_tables(
+    source: Union[bytes, Image.Image],
+    padding: int = 8,
+    **kwargs: Any
+) -> List[Tuple[Region, bytes]]:
+    """
+    Crop every table region out of a screenshot.
+
+    Args:
+        source: Image bytes or an opened image
+        padding: Pixels of background kept around each crop
+        **kwargs: Passed to find_table_regions
+
+    Returns:
+        (region, PNG bytes) per table, from top to bottom
+    """
+    image = Image.open(io.BytesIO(source)) if isinstance(source, bytes) else source
+    tiles = []
+    for left, upper, right, lower in find_table_regions(image, **kwargs):
+        box = (
+            max(0, left - padding),
+            max(0, upper - padding),
+            min(image.width, right + padding),
+            min(image.height, lower + padding),
+        )
+        buffer = io.BytesIO()
+        image.crop(box).save(buffer, format="PNG")
+        tiles.append((box, buffer.getvalue()))
+    return tiles
+
+
+def merge_partial_results(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge the JSON extracted from each tile into one guide.
+
+    Nested objects are merged key by key, so two tables that both list
+    size "M" contribute their measurements to the same entry. When two
+    tiles give different non-object values for the same key, the later
+    one is kept under a numbered key ("Chest (2)") rather than dropped.
+    """
+    merged: Dict[str, Any] = {}
+    for partial in partials:
+        _merge_into(merged, partial)
+    return merged
+
+
+def _merge_into(target: Dict[str, Any], source: Dict[str, Any]):
+    for key, value in source.items():
+        if key not in target:
+            target[key] = value
+        elif isinstance(target[key], dict) and isinstance(value, dict):
+            _merge_into(target[key], value)
+        elif target[key] != value:
+            suffix = 2
+            while f"{key} ({suffix})" in target:
+                suffix += 1
+            target[f"{key} ({suffix})"] = value
@@ -0,0 +1,123 @@
+"""
+Incremental JSON parsing for streamed model output.
+
+Streamed completions arrive a few characters at a time. Rather than waiting
+for the closing brace, IncrementalJSONParser tracks where it is in the
+document and reports each value of interest as soon as its text is
+complete, e.g. every row of a size chart while later rows are still being
+generated.
+"""
+
+import json
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+PathItem = Union[str, int]
+Path = Tuple[PathItem, ...]
+
+_WHITESPACE = " \t\n\r"
+
+
+class _Frame:
+    """An open object or array."""
+    __slots__ = ("is_object", "path", "start", "key", "index", "expect_key")
+
+    def __init__(self, is_object: bool, path: Path, start: int):
+        self.is_object = is_object
+        self.path = path
+        self.start = start
+        self.key: Optional[str] = None
+        self.index = 0
+        self.expect_key = is_object
+
+    @property
+    def child(self) -> PathItem:
+        return self.key if self.is_object else self.index
+
+
+class IncrementalJSONParser:
+    """
+    Report completed JSON values while the document is still arriving.
+
+    Args:
+        wants: Called with the path of each completed value, e.g.
+            ("tables", 0, "rows", 3). Only values it returns True for are
+            decoded and reported, so large enclosing containers cost nothing.
+    """
+
+    def __init__(self, wants: Callable[[Path], bool]):
+        self.wants = wants
+        self._buffer = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._scalar_start: Optional[int] = None
+
+    def _path(self) -> Path:
+        return tuple(frame.child for frame in self._stack)
+
+    def _complete(self, path: Path, text: str, events: List[Tuple[Path, Any]]):
+        if self.wants(path):
+            events.append((path, json.loads(text)))
+
+    def feed(self, text: str) -> List[Tuple[Path, Any]]:
+        """
+        Consume the next piece of the document.
+
+        Returns:
+            (path, value) for every wanted value completed by this piece,
+            in document order
+        """
+        events: List[Tuple[Path, Any]] = []
+        self._buffer += text
+        buffer = self._buffer
+
+        for i in range(self._pos, len(buffer)):
+            c = buffer[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    literal = buffer[self._string_start:i + 1]
+                    if self._string_is_key:
+                        self._stack[-1].key = json.loads(literal)
+                    else:
+                        self._complete(self._path(), literal, events)
+                continue
+
+            if self._scalar_start is not None:
+                if c not in _WHITESPACE and c not in ",]}":
+                    continue
+                self._complete(self._path(), buffer[self._scalar_start:i], events)
+                self._scalar_start = None
+
+            if c in _WHITESPACE:
+                continue
+            top = self._stack[-1] if self._stack else None
+            if c == "{" or c == "[":
+                self._stack.append(_Frame(c == "{", self._path(), i))
+            elif c == "}" or c == "]":
+                frame = self._stack.pop()
+                self._complete(frame.path, buffer[frame.start:i + 1], events)
+            elif c == ",":
+                if top.is_object:
+                    top.expect_key = True
+                else:
+                    top.index += 1
+            elif c == ":":
+                top.expect_key = False
+            elif c == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = top is not None and top.is_object and top.expect_key
+            else:
+                self._scalar_start = i
+
+        self._pos = len(buffer)
+        return events
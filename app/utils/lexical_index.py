@@ -0,0 +1,60 @@
+"""
+BM25 keyword index over knowledge base chunks.
+
+Vector search is good at paraphrases but weak on exact tokens such as
+brand names, style codes and size labels. This index scores chunks by
+Okapi BM25 over their words, for the lexical mode of /api/search.
+"""
+
+import re
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class LexicalIndex:
+    """
+    Inverted index with BM25 scoring.
+
+    Args:
+        texts: Documents, indexed by position
+        k1, b: BM25 term frequency saturation and length normalization
+    """
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(texts)
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = np.zeros(self.size)
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[doc_id] = sum(counts.values())
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((doc_id, count))
+        average = lengths.mean() if self.size else 0.0
+        # Per-document length factor of the BM25 denominator
+        self._norms = k1 * (1 - b + b * lengths / average) if average else np.full(self.size, k1)
+        self._postings = {
+            term: (np.array([d for d, _ in docs]), np.array([c for _, c in docs], dtype=float))
+            for term, docs in postings.items()
+        }
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for query (0 where no term matches)."""
+        scores = np.zeros(self.size)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, counts = posting
+            idf = np.log(1 + (self.size - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            scores[doc_ids] += idf * counts * (self.k1 + 1) / (counts + self._norms[doc_ids])
+        return scores
@@ -0,0 +1,173 @@
+"""
+Structured, non-blocking logging.
+
+Code on the request path logs through a QueueHandler, which only puts the
+record on an in-memory queue; a QueueListener thread formats it (one JSON
+object per line by default) and writes it to stdout and, optionally, a
+file. If the queue is full the record is dropped and counted rather than
+making the caller wait.
+
+Per-request debug events are sampled: the middleware decides once per
+request whether its DEBUG records are kept, so a sampled request's debug
+lines arrive together and the rest cost a filter call each.
+
+    log = get_logger("api")
+    log.info("Size guide processed", extra={"brand": brand, "bytes": len(content)})
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+ROOT_LOGGER = "jester"
+
+# Attributes every LogRecord has; anything else came from `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_debug_sampled: ContextVar[Optional[bool]] = ContextVar("log_debug_sampled", default=None)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """A logger under the app's root logger, e.g. get_logger("api")."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with `extra` fields as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keep DEBUG records only for sampled requests. Outside a request, each
+    DEBUG record is sampled on its own.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        sampled = _debug_sampled.get()
+        return sampled if sampled is not None else random.random() < self.rate
+
+
+@contextmanager
+def sample_request(rate: float):
+    """Decide once whether DEBUG records logged inside the block are kept."""
+    token = _debug_sampled.set(random.random() < rate)
+    try:
+        yield
+    finally:
+        _debug_sampled.reset(token)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of waiting."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the message arguments here; formatting (including any
+        # traceback) happens on the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def setup_logging(
+    level: str = "INFO",
+    fmt: str = "json",
+    debug_sample_rate: float = 0.01,
+    log_file: Optional[str] = None,
+    max_queue_size: int = 10000,
+):
+    """
+    Route the app's loggers through the queue and start the writer thread.
+    Calling it again replaces the previous setup.
+
+    Args:
+        level: Minimum level, e.g. "DEBUG" or "INFO"
+        fmt: "json", or "text" for human-readable lines
+        debug_sample_rate: Fraction of requests whose DEBUG records are kept
+        log_file: Also append records to this file
+        max_queue_size: Records buffered before new ones are dropped
+    """
+    global _listener, _handler
+    with _lock:
+        _stop()
+        formatter = JsonFormatter() if fmt == "json" else logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s: %(message)s"
+        )
+        outputs = [logging.StreamHandler(sys.stdout)]
+        if log_file:
+            outputs.append(logging.FileHandler(log_file))
+        for output in outputs:
+            output.setFormatter(formatter)
+
+        log_queue: queue.Queue = queue.Queue(max_queue_size)
+        _handler = NonBlockingQueueHandler(log_queue)
+        _handler.addFilter(DebugSampler(debug_sample_rate))
+        _listener = logging.handlers.QueueListener(log_queue, *outputs, respect_handler_level=True)
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.handlers = [_handler]
+        root.setLevel(level.upper())
+        root.propagate = False
+        _listener.start()
+
+
+def _stop():
+    global _listener
+    if _listener is not None:
+        _listener.stop()  # Writes out everything still queued
+        for output in _listener.handlers:
+            output.close()
+        _listener = None
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    with _lock:
+        _stop()
+
+
+def dropped_records() -> int:
+    """Records dropped because the queue was full."""
+    return _handler.dropped if _handler is not None else 0
@@ -0,0 +1,233 @@
+"""
+In-process latency metrics in the Prometheus text format.
+
+A small, dependency-free registry of counters and histograms. Processing
+stages are wrapped with `timed`, which records their duration in the
+shared STAGE_SECONDS histogram and counts exceptions in STAGE_ERRORS:
+
+    with timed("vector_search", "write_index"):
+        faiss.write_index(...)
+
+    @timed("size_service", "process_size_guide")
+    async def process_size_guide(...): ...
+
+Recording is a perf_counter call, a bisect and a locked increment, and is
+skipped entirely when metrics are disabled.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labelvalues: str):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in items
+        ]
+
+
+class Histogram:
+    """Histogram of observed values with fixed upper bucket bounds."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[LabelValues, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labelvalues: str) -> int:
+        series = self._series.get(labelvalues)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        lines = []
+        bucket_labels = self.labelnames + ("le",)
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, labels + (le,))} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together by the /metrics endpoint."""
+
+    def __init__(self):
+        self.enabled = True
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "jester_stage_seconds",
+    "Time spent in each processing stage",
+    labelnames=("component", "stage"),
+))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "jester_stage_errors_total",
+    "Processing stages that raised an exception",
+    labelnames=("component", "stage"),
+))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "jester_http_request_seconds",
+    "HTTP request latency by route",
+    labelnames=("method", "route", "status"),
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "jester_cache_lookups_total",
+    "Cache lookups by cache and result",
+    labelnames=("cache", "result"),
+))
+
+
+def set_enabled(enabled: bool):
+    """Turn recording on or off for the whole process."""
+    REGISTRY.enabled = enabled
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return REGISTRY.render()
+
+
+class timed:
+    """
+    Record how long a stage takes, as a context manager or a decorator
+    for sync and async functions.
+
+    Args:
+        component: The part of the app, e.g. "vision" or "vector_search"
+        stage: The step within it, e.g. "request" or "write_index"
+    """
+
+    __slots__ = ("component", "stage", "_start")
+
+    def __init__(self, component: str, stage: str):
+        self.component = component
+        self.stage = stage
+        self._start = None
+
+    def __enter__(self):
+        if REGISTRY.enabled:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._start is None:
+            return False
+        STAGE_SECONDS.observe(time.perf_counter() - self._start, self.component, self.stage)
+        if exc_type is not None and exc_type is not GeneratorExit:
+            STAGE_ERRORS.inc(1, self.component, self.stage)
+        self._start = None
+        return False
+
+    def __call__(self, func: Callable) -> Callable:
+        component, stage = self.component, self.stage
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(component, stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(component, stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def observe(component: str, stage: str, seconds: float):
+    """Record a duration measured elsewhere, e.g. time to first token."""
+    if REGISTRY.enabled:
+        STAGE_SECONDS.observe(seconds, component, stage)
+
+
+def count_cache_lookup(cache: str, hit: bool):
+    """Count a cache hit or miss."""
+    if REGISTRY.enabled:
+        CACHE_LOOKUPS.inc(1, cache, "hit" if hit else "miss")
@@ -0,0 +1,197 @@
+"""
+On-demand sampling profiler for API requests.
+
+A background thread snapshots the event loop thread's stack (and the
+stacks of busy worker threads, where to_thread work and sync endpoints
+run) every
+few milliseconds while a request is handled. Samples are written as
+collapsed stacks, one "frame;frame;frame count" line per distinct stack,
+which flamegraph.pl, speedscope and most flame graph viewers read
+directly.
+
+Nothing is sampled unless a request is selected, so the cost for all
+other requests is one random() call and a header lookup.
+"""
+
+import asyncio
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+# Executor threads whose innermost Python frame is in one of these files
+# are idle, waiting for work
+_IDLE_FILES = ("thread.py", "threading.py", "queue.py")
+
+PROFILE_HEADER = "X-Jester-Profile"
+
+# asyncio.to_thread work and sync (def) endpoints run in these threads
+_WORKER_PREFIXES = ("asyncio", "AnyIO worker thread")
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """
+    Sample stacks from a background thread.
+
+    Args:
+        thread_id: The thread to profile, normally the event loop's
+        interval: Seconds between samples
+        include_workers: Also sample busy asyncio and AnyIO worker
+            threads, where to_thread work and sync endpoints run
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005, include_workers: bool = True):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.include_workers = include_workers
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """Stop sampling and return the collapsed stack counts."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            worker_names = {}
+            if self.include_workers:
+                worker_names = {
+                    thread.ident: thread.name for thread in threading.enumerate()
+                    if thread.name.startswith(_WORKER_PREFIXES)
+                }
+            for ident, frame in frames.items():
+                if ident == self.thread_id:
+                    prefix = "event_loop"
+                elif ident in worker_names:
+                    if os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                        continue
+                    prefix = worker_names[ident]
+                else:
+                    continue
+                self.samples[f"{prefix};{_collapse(frame)}"] += 1
+            self.sample_count += 1
+
+
+class ProfileStore:
+    """
+    Directory of collapsed-stack profiles holding at most max_files; the
+    oldest are deleted as new ones are saved.
+    """
+
+    def __init__(self, directory: str, max_files: int = 200):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def save(self, samples: Counter, method: str, route: str, status: int, duration: float) -> Path:
+        """
+        Write a profile, tagging its file name with the request's method,
+        route template, status and duration.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        slug = "".join(c if c.isalnum() else "_" for c in route.strip("/")) or "root"
+        path = self.directory / f"{timestamp}_{method}_{slug}_{status}_{int(duration * 1000)}ms.collapsed"
+        with open(path, "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        self.prune()
+        return path
+
+    def prune(self):
+        profiles = sorted(self.directory.glob("*.collapsed"), key=lambda p: p.stat().st_mtime)
+        for path in profiles[:max(0, len(profiles) - self.max_files)]:
+            path.unlink(missing_ok=True)
+
+
+class RequestProfiler:
+    """
+    Decide which requests to profile and profile them.
+
+    A request is profiled when it carries the PROFILE_HEADER set to the
+    configured token, or, if sampling is enabled, with probability
+    sample_rate. Only one request is profiled at a time, since the sampler
+    sees the whole event loop thread.
+
+    Sampling stops when the response headers are ready, so a streaming
+    response (e.g. /chat/stream) is only profiled up to that point, not
+    while its body is generated.
+
+    Args:
+        store: Where profiles are written
+        sample_rate: Fraction of requests profiled without the header
+        token: Header value that forces profiling; None disables the header
+        interval: Seconds between stack samples
+    """
+
+    def __init__(
+        self,
+        store: ProfileStore,
+        sample_rate: float = 0.0,
+        token: Optional[str] = None,
+        interval: float = 0.005,
+    ):
+        self.store = store
+        self.sample_rate = sample_rate
+        self.token = token
+        self.interval = interval
+        self._busy = threading.Lock()
+
+    def wants(self, headers: Dict[str, str]) -> bool:
+        supplied = headers.get(PROFILE_HEADER.lower())
+        if self.token and supplied and hmac.compare_digest(supplied.encode(), self.token.encode()):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def middleware(self, request, call_next):
+        """Starlette HTTP middleware: profile the request if selected."""
+        if not self.wants(request.headers) or not self._busy.acquire(blocking=False):
+            return await call_next(request)
+
+        try:
+            sampler = StackSampler(threading.get_ident(), self.interval)
+            start = time.perf_counter()
+            sampler.start()
+            try:
+                response = await call_next(request)
+            finally:
+                samples = sampler.stop()
+            duration = time.perf_counter() - start
+        finally:
+            self._busy.release()
+
+        route = request.scope.get("route")
+        path = await asyncio.to_thread(
+            self.store.save,
+            samples,
+            request.method,
+            route.path if route else request.url.path,
+            response.status_code,
+            duration,
+        )
+        response.headers[PROFILE_HEADER] = path.name
+        return response
@@ -0,0 +1,179 @@
+"""
+Semantic response cache for chat.
+
+Chat questions are often paraphrases of each other ("how do I measure
+chest?", "how should I measure my chest?"). The cache keys answers by the
+query's embedding and serves a stored answer when a new query is close
+enough, instead of running retrieval and a completion again.
+
+Entries belong to a scope and are only served for the same scope; chat
+uses the brands and sizes a query names, so "does Acme run small?" never
+gets the answer cached for "does Zara run small?". An entry can also record
+how far its retrieved context reached: when new documents are added,
+invalidate_near drops only the entries whose context those documents
+would have entered.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Cache of responses keyed by query embedding.
+
+    Args:
+        threshold: Minimum cosine similarity between a new query and a
+            cached one for the cached response to be served
+        max_entries: Capacity; the least recently used entry is evicted
+            when full
+        ttl_seconds: Lifetime of an entry; 0 disables expiry
+    """
+
+    def __init__(self, threshold: float = 0.92, max_entries: int = 1000, ttl_seconds: int = 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None  # (max_entries, dim), unit rows
+        self._points: Optional[np.ndarray] = None  # (max_entries, dim), as given
+        self._reach = np.full(max_entries, -np.inf)
+        self._dropped = np.zeros(max_entries, dtype=bool)
+        self._size = 0
+        self._scopes: List[Hashable] = []
+        self._expires = np.zeros(max_entries)
+        self._last_used = np.zeros(max_entries)
+        self._responses: List[Any] = []
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _valid(self, now: float) -> np.ndarray:
+        """Mask of entries that are neither expired nor invalidated."""
+        valid = ~self._dropped[:self._size]
+        if self.ttl_seconds:
+            valid &= self._expires[:self._size] > now
+        return valid
+
+    def _live(self, scope: Hashable, now: float) -> np.ndarray:
+        """Mask of entries that may be served for scope."""
+        live = np.fromiter(
+            (entry_scope == scope for entry_scope in self._scopes), dtype=bool, count=self._size
+        )
+        return live & self._valid(now)
+
+    def lookup(self, embedding: np.ndarray, scope: Hashable) -> Optional[Any]:
+        """
+        Return the cached response for the most similar query in scope, or
+        None if none is above the threshold.
+        """
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            if self._size:
+                similarities = self._vectors[:self._size] @ query
+                similarities[~self._live(scope, now)] = -1.0
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    self._last_used[best] = now
+                    return self._responses[best]
+            self.misses += 1
+            return None
+
+    def store(self, embedding: np.ndarray, scope: Hashable, response: Any, reach: Optional[float] = None):
+        """
+        Cache a response for a query embedding.
+
+        Args:
+            reach: Squared Euclidean distance from the query to the farthest
+                document its response was based on; later documents at
+                least this close invalidate the entry (see invalidate_near).
+                None if the response doesn't depend on documents.
+        """
+        point = np.asarray(embedding, dtype=np.float32).ravel()
+        vector = self._normalize(point)
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.size), dtype=np.float32)
+                self._points = np.zeros((self.max_entries, vector.size), dtype=np.float32)
+
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+                self._scopes.append(scope)
+                self._responses.append(response)
+            else:
+                # Reuse a dead slot (expired or invalidated), else the LRU one
+                dead = np.flatnonzero(~self._valid(now))
+                slot = int(dead[0]) if dead.size else int(np.argmin(self._last_used))
+                self.evictions += 1
+                self._scopes[slot] = scope
+                self._responses[slot] = response
+
+            self._vectors[slot] = vector
+            self._points[slot] = point
+            self._reach[slot] = reach if reach is not None else -np.inf
+            self._dropped[slot] = False
+            self._expires[slot] = now + self.ttl_seconds
+            self._last_used[slot] = now
+
+    def invalidate_near(self, embeddings: np.ndarray) -> int:
+        """
+        Drop entries whose responses would have been based on any of these
+        newly added documents, i.e. a document is within an entry's reach.
+
+        Returns:
+            The number of entries dropped
+        """
+        documents = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if not self._size or self._points is None or not documents.size:
+                return 0
+            documents = documents.reshape(-1, self._points.shape[1])
+            points = self._points[:self._size]
+            # Squared distances from every cached query to every document
+            distances = (
+                (points ** 2).sum(axis=1)[:, np.newaxis]
+                - 2 * points @ documents.T
+                + (documents ** 2).sum(axis=1)[np.newaxis, :]
+            )
+            reached = (distances.min(axis=1) <= self._reach[:self._size]) & ~self._dropped[:self._size]
+            self._dropped[:self._size] |= reached
+            dropped = int(reached.sum())
+            self.invalidations += dropped
+            return dropped
+
+    def clear(self):
+        """Remove every entry; counters are kept."""
+        with self._lock:
+            self._size = 0
+            self._scopes = []
+            self._responses = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": self._size,
+            "max_entries": self.max_entries,
+        }
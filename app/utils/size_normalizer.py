@@ -0,0 +1,231 @@
+"""
+Deterministic normalization of extracted size charts.
+
+Vision extraction returns cells in whatever format the brand used: plain
+numbers, ranges ("38-40"), fractions ("15 1/2", "15½"), decimal commas
+("38,5"), values with units ("97 cm", "81.28cm") and half measurements
+("Half Chest Width"). This module turns a whole chart into canonical
+min/max arrays in a single unit.
+
+Each cell's value is its first number or range and the unit written with
+it; what follows, such as the same size in another unit ("97 cm / 38 in")
+or in parentheses ("42-44 (107-112cm)"), is ignored.
+
+All cells of a chart are scanned with one regex pass over a joined buffer,
+and the arithmetic (fractions, ranges, unit conversion, doubling) is done
+on NumPy arrays rather than cell by cell.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+CM_PER_INCH = 2.54
+
+# Canonical unit names and the spellings we accept for them
+UNIT_ALIASES: Dict[str, str] = {
+    "in": "in",
+    "inch": "in",
+    "inches": "in",
+    '"': "in",
+    "cm": "cm",
+    "centimeter": "cm",
+    "centimeters": "cm",
+    "centimetre": "cm",
+    "centimetres": "cm",
+}
+
+VULGAR_FRACTIONS: Dict[str, float] = {
+    "½": 0.5, "¼": 0.25, "¾": 0.75,
+    "⅛": 0.125, "⅜": 0.375, "⅝": 0.625, "⅞": 0.875,
+}
+
+# Headers that describe a flat, one-sided measurement which must be doubled
+HALF_MEASUREMENT_PATTERN = re.compile(
+    r"\bhalf\b|1/2|½|\bpit[\s-]*to[\s-]*pit\b|\bp2p\b|\bbody width\b|\bflat\b",
+    re.IGNORECASE,
+)
+
+_VULGAR = "".join(VULGAR_FRACTIONS)
+# One number: "15", "15.5", "15,5", "15 1/2", "15½", "1/2" or "½"
+_NUMBER = rf"\d+/\d+|\d+(?:\.\d+|,\d{{1,2}}(?!\d))?(?:\s*[{_VULGAR}]|\s+\d+/\d+)?|[{_VULGAR}]"
+_UNIT = r"cm\b|centimet\w*|inch\w*|in\b|\""
+_NUMBER_PATTERN = re.compile(
+    rf"(?P<lone_num>\d+)/(?P<lone_den>\d+)"
+    rf"|(?P<whole>\d+(?:[.,]\d+)?)(?:\s*(?P<vulgar>[{_VULGAR}])|\s+(?P<num>\d+)/(?P<den>\d+))?"
+    rf"|(?P<lone_vulgar>[{_VULGAR}])"
+)
+# A number or range, with the unit written after either end
+_MEASURE_PATTERN = re.compile(
+    rf"(?P<low>{_NUMBER})(?:\s*(?P<low_unit>{_UNIT}))?"
+    rf"(?:\s*(?:-|–|—|\bto\b)\s*(?P<high>{_NUMBER}))?(?:\s*(?P<unit>{_UNIT}))?",
+    re.IGNORECASE,
+)
+_CM_PATTERN = re.compile(r"cm|centimet", re.IGNORECASE)
+# Parenthesized asides, dropped when the cell has a value outside them
+_PARENTHETICAL_PATTERN = re.compile(r"\([^()]*\)")
+_DIGIT_PATTERN = re.compile(r"\d")
+_CELL_SEPARATOR = "\x00"
+
+
+@dataclass
+class NormalizedChart:
+    """A size chart as dense (size x measurement) min/max arrays.
+
+    Missing or unparseable cells are NaN in both arrays.
+    """
+    sizes: List[str]
+    measurements: List[str]
+    min_values: np.ndarray
+    max_values: np.ndarray
+    unit: str
+    half_measurements: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Dict[str, Dict[str, Optional[float]]]]:
+        """Return the chart as {size: {measurement: {"min": .., "max": ..}}}."""
+        chart = {}
+        for i, size in enumerate(self.sizes):
+            cells = {}
+            for j, measurement in enumerate(self.measurements):
+                if np.isnan(self.min_values[i, j]):
+                    continue
+                cells[measurement] = {
+                    "min": float(self.min_values[i, j]),
+                    "max": float(self.max_values[i, j]),
+                }
+            chart[size] = cells
+        return chart
+
+
+def normalize_unit(unit: Optional[str]) -> Optional[str]:
+    """Map a unit spelling such as "inches" or "Centimeters" to "in" or "cm"."""
+    if not unit:
+        return None
+    return UNIT_ALIASES.get(unit.strip().lower())
+
+
+def is_half_measurement(header: str) -> bool:
+    """Whether a header names a flat measurement that should be doubled."""
+    return bool(HALF_MEASUREMENT_PATTERN.search(header))
+
+
+def _cell_indices(matches: List[re.Match], offsets: np.ndarray) -> np.ndarray:
+    """Return the cell index of every regex match in the joined buffer."""
+    starts = np.fromiter((m.start() for m in matches), dtype=np.int64, count=len(matches))
+    return np.searchsorted(offsets, starts, side="right") - 1
+
+
+def _cell_text(value: Any) -> str:
+    """A cell as text, without parenthesized asides unless that is all it holds."""
+    text = str(value)
+    if "(" in text:
+        stripped = _PARENTHETICAL_PATTERN.sub(" ", text)
+        if _DIGIT_PATTERN.search(stripped):
+            return stripped
+    return text
+
+
+def _number_values(tokens: List[str]) -> np.ndarray:
+    """Value of every number token, e.g. "15 1/2", "15½" or "38,5"."""
+    parts = [_NUMBER_PATTERN.fullmatch(token) for token in tokens]
+    whole = np.array([(m["whole"] or "0").replace(",", ".") for m in parts], dtype=float)
+    num = np.array([m["num"] or m["lone_num"] or 0 for m in parts], dtype=float)
+    den = np.array([m["den"] or m["lone_den"] or 1 for m in parts], dtype=float)
+    vulgar = np.array(
+        [VULGAR_FRACTIONS.get(m["vulgar"] or m["lone_vulgar"] or "", 0.0) for m in parts],
+        dtype=float,
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return whole + np.where(den > 0, num / den, np.nan) + vulgar
+
+
+def normalize_chart(
+    chart: Dict[str, Any],
+    unit: Optional[str] = None,
+    target_unit: str = "in",
+    decimals: int = 2,
+) -> NormalizedChart:
+    """
+    Normalize an extracted size chart into canonical min/max arrays.
+
+    Args:
+        chart: Extracted chart shaped {size_label: {header: value}}. Entries
+            whose value is not a dict are ignored.
+        unit: Unit the chart is declared in. Cells that carry their own unit
+            ("97 cm") override it. Defaults to target_unit.
+        target_unit: Unit of the returned arrays ("in" or "cm")
+        decimals: Number of decimals to round the results to
+
+    Returns:
+        NormalizedChart with one row per size and one column per header
+    """
+    target = normalize_unit(target_unit)
+    if target is None:
+        raise ValueError(f"Unknown unit: {target_unit}")
+    source = normalize_unit(unit) or target
+
+    rows = {size: cells for size, cells in chart.items() if isinstance(cells, dict)}
+    sizes = list(rows)
+    measurements: List[str] = []
+    for cells in rows.values():
+        for header in cells:
+            if header not in measurements:
+                measurements.append(header)
+
+    shape = (len(sizes), len(measurements))
+    n_cells = shape[0] * shape[1]
+    column_index = {header: j for j, header in enumerate(measurements)}
+
+    # Flatten every cell to text and join them into one buffer
+    texts = [""] * n_cells
+    for i, cells in enumerate(rows.values()):
+        for header, value in cells.items():
+            if value is None or isinstance(value, bool):
+                continue
+            texts[i * shape[1] + column_index[header]] = _cell_text(value)
+    lengths = np.fromiter((len(text) + 1 for text in texts), dtype=np.int64, count=n_cells)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])) if n_cells else np.zeros(0, np.int64)
+    buffer = _CELL_SEPARATOR.join(texts)
+
+    # Find every number or range in one pass and keep the first of each cell
+    matches = list(_MEASURE_PATTERN.finditer(buffer))
+    cell_ids, first = np.unique(_cell_indices(matches, offsets), return_index=True)
+    matches = [matches[k] for k in first]
+    low = _number_values([m["low"] for m in matches])
+    high = _number_values([m["high"] or m["low"] for m in matches])
+
+    min_flat = np.full(n_cells, np.nan)
+    max_flat = np.full(n_cells, np.nan)
+    min_flat[cell_ids] = np.minimum(low, high)
+    max_flat[cell_ids] = np.maximum(low, high)
+
+    # Convert every cell to the target unit, honouring the unit written with its value
+    cell_unit_cm = np.full(n_cells, source == "cm")
+    for cell, m in zip(cell_ids, matches):
+        written = m["unit"] or m["low_unit"]
+        if written:
+            cell_unit_cm[cell] = bool(_CM_PATTERN.match(written))
+    if target == "in":
+        factor = np.where(cell_unit_cm, 1 / CM_PER_INCH, 1.0)
+    else:
+        factor = np.where(cell_unit_cm, 1.0, CM_PER_INCH)
+
+    min_values = (min_flat * factor).reshape(shape)
+    max_values = (max_flat * factor).reshape(shape)
+
+    # Double flat measurements such as "Half Chest Width" or "Pit to Pit"
+    half = np.array([is_half_measurement(header) for header in measurements], dtype=bool)
+    column_factor = np.where(half, 2.0, 1.0)
+    min_values = np.round(min_values * column_factor, decimals)
+    max_values = np.round(max_values * column_factor, decimals)
+
+    return NormalizedChart(
+        sizes=sizes,
+        measurements=measurements,
+        min_values=min_values,
+        max_values=max_values,
+        unit=target,
+        half_measurements=[h for h, is_half in zip(measurements, half) if is_half],
+    )
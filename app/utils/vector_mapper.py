@@ -8,6 +8,8 @@ import asyncio
 from difflib import SequenceMatcher
 import re
 
+from .metrics import timed
+
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
@@ -72,16 +74,22 @@ def _initialize_embeddings():
 # Initialize embeddings on module load
 _initialize_embeddings()
 
+@timed("vector_mapper", "embedding_request")
 def get_embedding(text, model="text-embedding-3-small"):
-    response = openai.embeddings.create(
-        input=[text],
-        model=model
-    )
+    # Imported here: app.core imports this module
+    from app.core.rate_limiter import rate_limited_sync
+    with rate_limited_sync(model, len(text) // 4 + 1) as reservation:
+        response = openai.embeddings.create(
+            input=[text],
+            model=model
+        )
+        reservation.record(response.usage)
     return np.array(response.data[0].embedding)
 
 def cosine_similarity(a, b):
     return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
+@timed("vector_mapper", "match_to_standard")
 def match_to_standard(measurement: str, threshold: float = 0.75) -> Optional[str]:
     """
     Match a measurement name to its standard category using semantic similarity.
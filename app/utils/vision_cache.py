@@ -0,0 +1,159 @@
+"""
+Persistent, content-addressed cache of vision extraction results.
+
+Entries are keyed by a hash of the image bytes sent to the model, the model
+name and the prompt version, so the same screenshot uploaded twice is only
+extracted once. Each entry is a small JSON file; recency is tracked with
+file modification times, which makes eviction least-recently-used.
+
+Methods do blocking file I/O; async callers run them in a worker thread,
+and concurrent calls from several threads are safe.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def prompt_version(prompt: str) -> str:
+    """Short, stable version id for a prompt text."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+class VisionCache:
+    """
+    On-disk cache of vision results.
+
+    Args:
+        cache_dir: Directory holding one JSON file per entry
+        max_entries: Entries kept before the least recently used are evicted
+        ttl_seconds: Maximum age of an entry; 0 keeps entries until evicted
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 1000, ttl_seconds: int = 0):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_bytes: bytes, model: str, prompt_version: str) -> str:
+        """Content address of an extraction request."""
+        digest = hashlib.sha256()
+        digest.update(image_bytes)
+        digest.update(b"\x00" + model.encode("utf-8"))
+        digest.update(b"\x00" + prompt_version.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _entries(self) -> List[os.DirEntry]:
+        return [entry for entry in os.scandir(self.cache_dir)
+                if entry.is_file() and entry.name.endswith(".json")]
+
+    @staticmethod
+    def _mtime(entry: os.DirEntry) -> float:
+        try:
+            return entry.stat().st_mtime
+        except FileNotFoundError:  # Removed by another thread
+            return 0.0
+
+    def _is_expired(self, created_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if self._is_expired(entry.get("created_at", 0)):
+            path.unlink(missing_ok=True)
+            return None
+
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:  # Evicted since it was read
+            pass
+        return entry["result"]
+
+    def set(self, key: str, result: Dict[str, Any], model: str, prompt_version: str):
+        """Store a result and evict old entries if the cache is over capacity."""
+        entry = {
+            "key": key,
+            "model": model,
+            "prompt_version": prompt_version,
+            "created_at": time.time(),
+            "result": result,
+        }
+        tmp_path = self.cache_dir / f".{key}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used beyond max_entries."""
+        entries = self._entries()
+        removed = 0
+        if self.ttl_seconds:
+            # Entries are created no later than their mtime, so anything not
+            # touched within the TTL is expired. Expired entries that were
+            # read recently are dropped by get().
+            cutoff = time.time() - self.ttl_seconds
+            for entry in entries:
+                if self._mtime(entry) < cutoff:
+                    Path(entry.path).unlink(missing_ok=True)
+                    removed += 1
+            entries = self._entries()
+
+        overflow = len(entries) - self.max_entries
+        if overflow > 0:
+            entries.sort(key=self._mtime)
+            for entry in entries[:overflow]:
+                Path(entry.path).unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def invalidate(self, prompt_version: Optional[str] = None, keep_prompt_version: Optional[str] = None) -> int:
+        """
+        Remove entries by prompt version.
+
+        Args:
+            prompt_version: Remove only entries created with this version
+            keep_prompt_version: Remove every entry not created with this
+                version, e.g. after the prompt text changed
+
+        With neither argument, the whole cache is cleared.
+
+        Returns:
+            Number of entries removed
+        """
+        removed = 0
+        for entry in self._entries():
+            path = Path(entry.path)
+            if prompt_version is not None or keep_prompt_version is not None:
+                try:
+                    with open(path, "r") as f:
+                        version = json.load(f).get("prompt_version")
+                except (FileNotFoundError, json.JSONDecodeError):
+                    version = None
+                if prompt_version is not None and version != prompt_version:
+                    continue
+                if keep_prompt_version is not None and version == keep_prompt_version:
+                    continue
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._entries())
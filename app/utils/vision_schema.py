@@ -0,0 +1,95 @@
+"""
+Compact response schema for structured size chart extraction.
+
+Instead of repeating every measurement name for every size, the model
+returns each table's headers once followed by one array per size:
+
+    {"tables": [{"title": "Tops", "unit": "in",
+                 "headers": ["Chest", "Waist"],
+                 "rows": [["S", "34-36", 30], ["M", "38-40", 32]]}]}
+
+This is a fraction of the output tokens of the nested free-text layout
+and, sent as a strict JSON schema, always parses.
+"""
+
+from typing import Any, Dict
+
+from .image_tiling import merge_partial_results
+
+SIZE_CHART_SCHEMA: Dict[str, Any] = {
+    "name": "size_chart",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "tables": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "title": {"type": ["string", "null"]},
+                        "unit": {"type": ["string", "null"]},
+                        "headers": {"type": "array", "items": {"type": "string"}},
+                        "rows": {
+                            "type": "array",
+                            "items": {
+                                "type": "array",
+                                "items": {"type": ["string", "number", "null"]},
+                            },
+                        },
+                    },
+                    "required": ["title", "unit", "headers", "rows"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["tables"],
+        "additionalProperties": False,
+    },
+}
+
+STRUCTURED_PROMPT_SUFFIX = (
+    " Return every table in the image. For each table give the measurement "
+    "column names once in 'headers' (without the size column), then one row "
+    "per size: the size label first, followed by that size's values in "
+    "header order. Use numbers where a value is a single number, the text "
+    "as written for ranges or fractions (e.g. '38-40', '15 1/2'), and null "
+    "for empty cells."
+)
+
+
+def compact_to_chart(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a compact structured response to the nested chart layout.
+
+    Returns:
+        {size_label: {header: value}}, plus "unit" and "title" keys when
+        the model reported them. Several tables are merged with
+        merge_partial_results.
+
+    Raises:
+        ValueError: If the payload has no tables
+    """
+    tables = payload.get("tables")
+    if not isinstance(tables, list) or not tables:
+        raise ValueError("No tables in structured vision output")
+
+    charts = []
+    for table in tables:
+        chart: Dict[str, Any] = {}
+        headers = table.get("headers") or []
+        for row in table.get("rows") or []:
+            if not row or row[0] is None:
+                continue
+            chart[str(row[0])] = {
+                header: value
+                for header, value in zip(headers, row[1:])
+                if value is not None
+            }
+        if table.get("unit"):
+            chart["unit"] = table["unit"]
+        if table.get("title"):
+            chart["title"] = table["title"]
+        charts.append(chart)
+
+    return charts[0] if len(charts) == 1 else merge_partial_results(charts)
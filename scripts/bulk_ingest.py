@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Bulk ingestion of size guide screenshots.
+
+Runs process_size_guide_image over a directory of images or a manifest with
+bounded concurrency, retries rate-limited requests with exponential backoff
+and records progress so an interrupted run can be resumed.
+
+Usage:
+    python scripts/bulk_ingest.py path/to/screenshots --brand "J.Crew" --gender men
+    python scripts/bulk_ingest.py --manifest guides.jsonl --concurrency 8
+
+A manifest is JSONL or CSV with a "path" column and optional metadata
+columns (brand, gender, size_guide_header, source_url, unit_of_measurement,
+size_guide_scope). Relative paths are resolved against the manifest.
+
+OpenAI rate limits are enforced per process, so this script does not see
+the API server's traffic and vice versa. When both run against the same
+account, give the script its share with --vision-rpm/--vision-tpm so the
+two together stay under the account's limits.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+import openai
+
+from app.core.rate_limiter import OverloadedError, Priority, priority
+from app.config import config
+from app.core.vision import VISION_MODEL, process_size_guide_image
+from app.core.vector_search import JesterVectorSearch
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"}
+METADATA_FIELDS = [
+    "brand", "gender", "size_guide_header", "source_url",
+    "unit_of_measurement", "size_guide_scope"
+]
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    OverloadedError,
+)
+
+
+def collect_items(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Build the list of images to ingest with their metadata."""
+    defaults = {field: getattr(args, field) for field in METADATA_FIELDS}
+    items = []
+
+    if args.manifest:
+        manifest = Path(args.manifest)
+        with open(manifest, "r", newline="") as f:
+            if manifest.suffix.lower() == ".csv":
+                rows = list(csv.DictReader(f))
+            else:
+                rows = [json.loads(line) for line in f if line.strip()]
+        for row in rows:
+            path = Path(row["path"])
+            if not path.is_absolute():
+                path = manifest.parent / path
+            metadata = {**defaults, **{k: row[k] for k in METADATA_FIELDS if row.get(k)}}
+            items.append({"path": str(path), "metadata": metadata})
+    else:
+        for path in sorted(Path(args.directory).rglob("*")):
+            if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS:
+                items.append({"path": str(path), "metadata": dict(defaults)})
+
+    return items
+
+
+def load_progress(progress_path: Path) -> Dict[str, Dict[str, Any]]:
+    """Read the latest recorded outcome for every path in the progress file."""
+    progress = {}
+    if progress_path.exists():
+        with open(progress_path, "r") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    progress[record["path"]] = record
+    return progress
+
+
+def describe(metadata: Dict[str, Any]) -> str:
+    """Knowledge base description of a guide, leaving out metadata that wasn't given."""
+    subject = " ".join(str(metadata[field]) for field in ("brand", "gender") if metadata.get(field))
+    description = f"Size guide for {subject} clothing" if subject else "Size guide"
+    if metadata.get("unit_of_measurement"):
+        description += f" using {metadata['unit_of_measurement']} measurements"
+    return description
+
+
+def _retry_delay(error: Exception, attempt: int, base_delay: float, max_delay: float) -> float:
+    """Backoff delay, honouring Retry-After when the API sends one."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            pass
+    return min(base_delay * (2 ** attempt), max_delay) * random.uniform(0.5, 1.5)
+
+
+class BulkIngestor:
+    """Runs size guide extraction over many images and tracks the outcome."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.semaphore = asyncio.Semaphore(args.concurrency)
+        self.progress_path = Path(args.progress)
+        self.vector_search = None if args.skip_knowledge_base else JesterVectorSearch()
+        self.pending: List[Dict[str, Any]] = []
+        self.succeeded = 0
+        self.failures: List[Dict[str, Any]] = []
+        self.retries = 0
+
+    def _record(self, records: List[Dict[str, Any]]):
+        with open(self.progress_path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    async def flush(self):
+        """
+        Write pending results to the knowledge base, then mark them done.
+        If the write fails they are marked failed instead, so --retry-failed
+        extracts them again.
+        """
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        if self.vector_search is not None:
+            try:
+                # Encoding and the index write run in a thread so extractions keep going
+                await asyncio.to_thread(
+                    self.vector_search.batch_add_chunks,
+                    [json.dumps(entry["result"]) for entry in batch],
+                    [entry["description"] for entry in batch]
+                )
+            except Exception as e:
+                error = f"Knowledge base write failed: {type(e).__name__}: {e}"
+                logger.error(f"❌ {error} ({len(batch)} size guides)")
+                self.failures.extend({"path": entry["record"]["path"], "error": error} for entry in batch)
+                self._record([{**entry["record"], "status": "failed", "error": error} for entry in batch])
+                return
+        self.succeeded += len(batch)
+        self._record([entry["record"] for entry in batch])
+        logger.info(f"Flushed {len(batch)} size guides to the knowledge base")
+
+    async def ingest(self, item: Dict[str, Any]):
+        """Extract one size guide, retrying transient API errors."""
+        path, metadata = item["path"], item["metadata"]
+        async with self.semaphore:
+            started = time.perf_counter()
+            for attempt in range(self.args.max_retries + 1):
+                try:
+                    result = await process_size_guide_image(path)
+                    break
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.args.max_retries:
+                        return self._fail(path, f"{type(e).__name__}: {e}", started)
+                    delay = _retry_delay(e, attempt, self.args.base_delay, self.args.max_delay)
+                    self.retries += 1
+                    logger.warning(f"{path}: {type(e).__name__}, retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                except Exception as e:
+                    return self._fail(path, f"{type(e).__name__}: {e}", started)
+
+        if "error" in result:
+            return self._fail(path, result["error"], started)
+
+        result["metadata"] = {
+            **result.get("metadata", {}),
+            **metadata,
+            "source_image": path,
+            "timestamp": datetime.now().isoformat()
+        }
+        elapsed = time.perf_counter() - started
+        self.pending.append({
+            "result": result,
+            "description": describe(metadata),
+            "record": {"path": path, "status": "done", "elapsed": round(elapsed, 3)},
+        })
+        logger.info(f"✅ {path} ({elapsed:.1f}s)")
+        if len(self.pending) >= self.args.flush_every:
+            await self.flush()
+
+    def _fail(self, path: str, error: str, started: float):
+        elapsed = time.perf_counter() - started
+        self.failures.append({"path": path, "error": error})
+        self._record([{"path": path, "status": "failed", "error": error, "elapsed": round(elapsed, 3)}])
+        logger.error(f"❌ {path}: {error}")
+
+    async def run(self, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        progress = load_progress(self.progress_path)
+        skip = {"done"} if self.args.retry_failed else {"done", "failed"}
+        todo = [item for item in items if progress.get(item["path"], {}).get("status") not in skip]
+        skipped = len(items) - len(todo)
+        if skipped:
+            logger.info(f"Resuming: skipping {skipped} already processed images")
+
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(self.ingest(item) for item in todo))
+        finally:
+            # Keep whatever finished if the run is interrupted
+            await self.flush()
+        elapsed = time.perf_counter() - started
+
+        return {
+            "total": len(items),
+            "processed": len(todo),
+            "skipped": skipped,
+            "succeeded": self.succeeded,
+            "failed": len(self.failures),
+            "retries": self.retries,
+            "elapsed_seconds": round(elapsed, 1),
+            "images_per_minute": round(60 * len(todo) / elapsed, 1) if elapsed else 0.0,
+            "failures": self.failures,
+        }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bulk-ingest size guide screenshots")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("directory", nargs="?", help="Directory to scan for images")
+    source.add_argument("--manifest", help="JSONL or CSV manifest of images and metadata")
+    for field in METADATA_FIELDS:
+        parser.add_argument(f"--{field.replace('_', '-')}", dest=field, help=f"Default {field}")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent vision requests")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per image on rate limits")
+    parser.add_argument("--base-delay", type=float, default=2.0, help="Initial backoff in seconds")
+    parser.add_argument("--max-delay", type=float, default=60.0, help="Maximum backoff in seconds")
+    parser.add_argument("--vision-rpm", type=float, help="Vision requests per minute for this run (default from Config)")
+    parser.add_argument("--vision-tpm", type=float, help="Vision tokens per minute for this run (default from Config)")
+    parser.add_argument("--flush-every", type=int, default=25, help="Knowledge base write batch size")
+    parser.add_argument("--progress", default="bulk_ingest_progress.jsonl", help="Progress file for resuming")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry images that failed in a previous run")
+    parser.add_argument("--skip-knowledge-base", action="store_true", help="Extract without writing to the knowledge base")
+    return parser.parse_args(argv)
+
+
+def set_vision_budget(rpm: Optional[float], tpm: Optional[float]):
+    """Override the vision model's rate limits for this process."""
+    if rpm is None and tpm is None:
+        return
+    limits = json.loads(config.OPENAI_RATE_LIMITS or "{}")
+    budget = limits.setdefault(VISION_MODEL, {})
+    if rpm is not None:
+        budget["rpm"] = rpm
+    if tpm is not None:
+        budget["tpm"] = tpm
+    config.OPENAI_RATE_LIMITS = json.dumps(limits)
+
+
+def main():
+    args = parse_args()
+    items = collect_items(args)
+    logger.info(f"Found {len(items)} size guide images")
+
+    set_vision_budget(args.vision_rpm, args.vision_tpm)
+
+    # The limiter is local to this process, so this only orders the
+    # script's own calls; use --vision-rpm/--vision-tpm to leave capacity
+    # for the API server
+    with priority(Priority.BULK):
+        summary = asyncio.run(BulkIngestor(args).run(items))
+
+    logger.info(
+        f"Processed {summary['processed']} images in {summary['elapsed_seconds']}s "
+        f"({summary['images_per_minute']} images/min): "
+        f"{summary['succeeded']} succeeded, {summary['failed']} failed, "
+        f"{summary['skipped']} skipped, {summary['retries']} retries"
+    )
+    for failure in summary["failures"]:
+        logger.error(f"Failed: {failure['path']}: {failure['error']}")
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
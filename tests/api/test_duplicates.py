@@ -0,0 +1,104 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.config import config
+from app.utils.image_hash import NearDuplicateIndex
+
+
+class FakeVectorSearch:
+    def __init__(self):
+        self.added = []
+
+    def add_chunk(self, text, metadata=None):
+        self.added.append(text)
+
+
+def _client(monkeypatch, tmp_path):
+    extractions = []
+
+    async def extract(content, filename):
+        extractions.append(content)
+        return {"S": {"Chest": content.decode()}}
+
+    monkeypatch.setattr(routes, "process_size_guide_bytes", extract)
+    # Every upload has the same layout, so they all hash alike
+    monkeypatch.setattr(routes, "dhash", lambda content: 0xABCD)
+    monkeypatch.setattr(config, "STORE_SIZE_GUIDES", False)
+    monkeypatch.setattr(config, "UPLOADS_DIR", str(tmp_path / "uploads"))
+    app = FastAPI()
+    app.include_router(routes.router)
+    app.state.ready = True
+    app.state.vector_search = FakeVectorSearch()
+    app.state.near_duplicates = NearDuplicateIndex(str(tmp_path / "phash.jsonl"))
+    return TestClient(app), extractions
+
+
+def _upload(client, content, brand="Acme"):
+    return client.post(
+        "/api/process-size-guide",
+        files={"file": ("chart.png", content, "image/png")},
+        data={"brand": brand, "unit_of_measurement": "inches"},
+    ).json()
+
+
+def test_identical_upload_reuses_extraction(monkeypatch, tmp_path):
+    """Test that the same bytes with the same metadata return the earlier extraction."""
+    client, extractions = _client(monkeypatch, tmp_path)
+    first = _upload(client, b"36")
+    second = _upload(client, b"36")
+
+    assert first["status"] == "success"
+    assert second["status"] == "duplicate"
+    assert second["data"]["S"] == {"Chest": "36"}
+    assert extractions == [b"36"]
+
+
+def test_similar_chart_is_extracted_and_flagged(monkeypatch, tmp_path):
+    """Test that a perceptual match with different bytes is reported, not substituted."""
+    client, extractions = _client(monkeypatch, tmp_path)
+    _upload(client, b"36")
+    response = _upload(client, b"40")
+
+    assert response["status"] == "success"
+    assert response["data"]["S"] == {"Chest": "40"}
+    assert response["possible_duplicate_of"]["distance"] == 0
+    assert extractions == [b"36", b"40"]
+
+
+def test_other_brand_is_never_a_duplicate(monkeypatch, tmp_path):
+    """Test that only earlier uploads with the same metadata are candidates."""
+    client, extractions = _client(monkeypatch, tmp_path)
+    _upload(client, b"36", brand="Acme")
+    response = _upload(client, b"36", brand="Zara")
+
+    assert response["status"] == "success"
+    assert "possible_duplicate_of" not in response
+    assert extractions == [b"36", b"36"]
+
+
+def test_similar_chart_is_reused_on_request(monkeypatch, tmp_path):
+    """Test that reuse_duplicate returns a close perceptual match without extracting."""
+    client, extractions = _client(monkeypatch, tmp_path)
+    # A zoomed copy: different bytes, hashes two bits apart
+    hashes = {b"36": 0xABCD, b"36 zoomed": 0xABCD ^ 0b101, b"other": 0xABCD ^ 0xFFFF}
+    monkeypatch.setattr(routes, "dhash", lambda content: hashes[content])
+    _upload(client, b"36")
+
+    reused = client.post(
+        "/api/process-size-guide",
+        files={"file": ("zoomed.png", b"36 zoomed", "image/png")},
+        data={"brand": "Acme", "unit_of_measurement": "inches", "reuse_duplicate": "true"},
+    ).json()
+    assert reused["status"] == "duplicate"
+    assert reused["duplicate_of"]["distance"] == 2
+    assert reused["data"]["S"] == {"Chest": "36"}
+
+    # Too far from anything ingested, so it is extracted
+    distant = client.post(
+        "/api/process-size-guide",
+        files={"file": ("other.png", b"other", "image/png")},
+        data={"brand": "Acme", "unit_of_measurement": "inches", "reuse_duplicate": "true"},
+    ).json()
+    assert distant["status"] == "success"
+    assert extractions == [b"36", b"other"]
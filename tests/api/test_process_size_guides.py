@@ -0,0 +1,110 @@
+import json
+
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.config import config
+
+
+class FakeVectorSearch:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def batch_add_chunks(self, texts, metadata_list):
+        if self.fail:
+            raise OSError("disk full")
+        self.batches.append((texts, metadata_list))
+
+
+class FakeNearDuplicates:
+    def __init__(self):
+        self.added = []
+
+    def find(self, image_hash, where=None):
+        return None
+
+    def add(self, image_hash, entry):
+        self.added.append(image_hash)
+
+
+def _client(monkeypatch, tmp_path, vector_search):
+    async def extract(content, filename):
+        if content == b"bad":
+            return {"error": "No size chart found"}
+        if content == b"partial":
+            return {"S": {"Chest": "36"}, "metadata": {"tiles": 2, "tile_errors": ["No JSON found"]}}
+        return {"S": {"Chest": "36"}}
+
+    monkeypatch.setattr(routes, "process_size_guide_bytes", extract)
+    monkeypatch.setattr(routes, "dhash", lambda content: len(content))
+    monkeypatch.setattr(config, "STORE_SIZE_GUIDES", False)
+    monkeypatch.setattr(config, "UPLOADS_DIR", str(tmp_path))
+    app = FastAPI()
+    app.include_router(routes.router)
+    app.state.ready = True
+    app.state.vector_search = vector_search
+    app.state.near_duplicates = FakeNearDuplicates()
+    return TestClient(app), app.state
+
+
+def _files(*contents):
+    return [("files", (f"chart{i}.png", content, "image/png")) for i, content in enumerate(contents)]
+
+
+def test_batch_adds_successful_extractions_in_one_write(monkeypatch, tmp_path):
+    """Test per-file results and a single knowledge base write for the successes."""
+    client, state = _client(monkeypatch, tmp_path, FakeVectorSearch())
+
+    response = client.post("/api/process-size-guides", files=_files(b"one", b"bad", b"three"), data={"brand": "Acme"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [entry["status"] for entry in body["results"]] == ["success", "error", "success"]
+    assert body["summary"] == {"success": 2, "duplicate": 0, "error": 1, "knowledge_base_error": 0}
+    assert body["results"][0]["data"]["metadata"]["brand"] == "Acme"
+    assert len(state.vector_search.batches) == 1
+    assert len(state.vector_search.batches[0][0]) == 2
+    assert state.near_duplicates.added == [3, 5]
+
+
+def test_knowledge_base_failure_keeps_extractions(monkeypatch, tmp_path):
+    """Test that a failed knowledge base write flags each result instead of failing the request."""
+    client, state = _client(monkeypatch, tmp_path, FakeVectorSearch(fail=True))
+
+    response = client.post("/api/process-size-guides", files=_files(b"one", b"two"))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["summary"]["success"] == 2
+    assert body["summary"]["knowledge_base_error"] == 2
+    for entry in body["results"]:
+        assert entry["data"]["S"] == {"Chest": "36"}
+        assert "disk full" in entry["knowledge_base_error"]
+    # Not remembered, so uploading them again retries the write
+    assert state.near_duplicates.added == []
+
+
+def test_extraction_metadata_is_kept(monkeypatch, tmp_path):
+    """Test that metadata recorded during extraction survives next to the form fields."""
+    client, state = _client(monkeypatch, tmp_path, FakeVectorSearch())
+
+    response = client.post("/api/process-size-guides", files=_files(b"partial"), data={"brand": "Acme"})
+
+    metadata = response.json()["results"][0]["data"]["metadata"]
+    assert metadata["tile_errors"] == ["No JSON found"]
+    assert metadata["tiles"] == 2
+    assert metadata["brand"] == "Acme"
+    stored = json.loads(state.vector_search.batches[0][0][0])
+    assert stored["metadata"]["tile_errors"] == ["No JSON found"]
+
+
+def test_too_many_files(monkeypatch, tmp_path):
+    """Test that oversized batches are rejected up front."""
+    client, _ = _client(monkeypatch, tmp_path, FakeVectorSearch())
+    monkeypatch.setattr(config, "BATCH_MAX_FILES", 1)
+
+    response = client.post("/api/process-size-guides", files=_files(b"one", b"two"))
+    assert response.status_code == 400
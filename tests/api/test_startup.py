@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import main
+from app.config import config
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeValidationEngine:
+    def __init__(self):
+        self.sessions = []
+
+    def __len__(self):
+        return 2
+
+    async def refresh(self, session):
+        self.sessions.append(session)
+        return True
+
+
+@pytest.mark.asyncio
+async def test_refresh_loads_validation_rules_without_recommender(monkeypatch):
+    """Test that the validation rules are loaded at startup even with recommendations off."""
+    session = FakeSession()
+    monkeypatch.setattr(main, "AsyncSessionLocal", lambda: session)
+    monkeypatch.setattr(config, "RECOMMEND_REFRESH_SECONDS", 0)
+    state = SimpleNamespace(validation_engine=FakeValidationEngine(), recommender=None, size_equivalence=None)
+
+    await main.refresh_size_data(state)
+
+    assert state.validation_engine.sessions == [session]
@@ -0,0 +1,166 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.config import config
+from app.services import size_service
+from app.services.size_service import ReferenceCache
+from app.services.validation_engine import ValidationEngine
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return list(self.rows)
+
+    def scalar_one(self):
+        return self.rows[0][0]
+
+    def scalar_one_or_none(self):
+        return self.rows[0][0] if self.rows else None
+
+
+class FakeSession:
+    """Answers each statement in turn from the given rows and records it."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.executed = []
+        self.committed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement, params=None):
+        self.executed.append((statement, params))
+        return FakeResult(self.results.pop(0))
+
+    async def commit(self):
+        self.committed = True
+
+    async def rollback(self):
+        pass
+
+
+class FakeVectorSearch:
+    def __init__(self):
+        self.added = []
+
+    def add_chunk(self, text, metadata=None):
+        self.added.append(text)
+
+
+class FakeNearDuplicates:
+    def find(self, image_hash, where=None):
+        return None
+
+    def add(self, image_hash, entry):
+        pass
+
+
+def _client(monkeypatch, tmp_path, session):
+    async def extract(content, filename):
+        return {
+            "S": {"Chest": "34-36", "Waist": "28"},
+            "M": {"Chest": "38-40", "Waist": "32"},
+            "L": {"Chest": "42-44", "Waist": "36"},
+        }
+
+    matched = []
+
+    def match_to_standard(header):
+        matched.append(header)
+        return header.lower()
+
+    monkeypatch.setattr(routes, "process_size_guide_bytes", extract)
+    monkeypatch.setattr(routes, "dhash", lambda content: 0)
+    monkeypatch.setattr(routes, "AsyncSessionLocal", lambda: session)
+    monkeypatch.setattr(size_service, "match_to_standard", match_to_standard)
+    monkeypatch.setattr(size_service, "_references", ReferenceCache())
+    monkeypatch.setattr(config, "STORE_SIZE_GUIDES", True)
+    monkeypatch.setattr(config, "UPLOADS_DIR", str(tmp_path))
+    app = FastAPI()
+    app.include_router(routes.router)
+    app.state.ready = True
+    app.state.vector_search = FakeVectorSearch()
+    app.state.near_duplicates = FakeNearDuplicates()
+    app.state.validation_engine = None
+    return TestClient(app), matched
+
+
+def test_upload_stores_guide_with_one_column_plan(monkeypatch, tmp_path):
+    """Test that an upload is stored with each header resolved once, not once per size."""
+    session = FakeSession(
+        [(3,)],                          # unit
+        [(5,)],                          # brand
+        [("S", 11), ("M", 12), ("L", 13)],
+        [("chest", 1), ("waist", 2)],    # every header in one lookup
+        [],                              # measurements
+        [],                              # validation rules
+    )
+    client, matched = _client(monkeypatch, tmp_path, session)
+
+    response = client.post(
+        "/api/process-size-guide",
+        files={"file": ("chart.png", b"chart", "image/png")},
+        data={"brand": "Acme", "unit_of_measurement": "inches"},
+    )
+
+    assert response.status_code == 200
+    database = response.json()["data"]["database"]
+    assert database["success"]
+    assert database["size_guide_ids"] == {"S": 11, "M": 12, "L": 13}
+    assert session.committed
+    assert matched == ["Chest", "Waist"]
+    measurements = session.executed[4][1]
+    assert len(measurements) == 6
+    assert {row["measurement_type_id"] for row in measurements} == {1, 2}
+
+
+def test_guide_without_unit_is_not_stored(monkeypatch, tmp_path):
+    """Test that guides missing the brand or unit skip the database."""
+    session = FakeSession()
+    client, _ = _client(monkeypatch, tmp_path, session)
+
+    response = client.post(
+        "/api/process-size-guide",
+        files={"file": ("chart.png", b"chart", "image/png")},
+        data={"brand": "Acme"},
+    )
+
+    assert response.status_code == 200
+    assert "database" not in response.json()["data"]
+    assert session.executed == []
+
+
+def test_upload_is_validated_by_the_loaded_engine(monkeypatch, tmp_path):
+    """Test that the app's validation engine checks uploads instead of a rules query."""
+    session = FakeSession(
+        [(3,)],
+        [(5,)],
+        [("S", 11), ("M", 12), ("L", 13)],
+        [("chest", 1), ("waist", 2)],
+        [],
+    )
+    client, _ = _client(monkeypatch, tmp_path, session)
+    engine = ValidationEngine()
+    engine.build([(2, "waist", "in", 30, 60)])
+    client.app.state.validation_engine = engine
+
+    response = client.post(
+        "/api/process-size-guide",
+        files={"file": ("chart.png", b"chart", "image/png")},
+        data={"brand": "Acme", "unit_of_measurement": "inches"},
+    )
+
+    database = response.json()["data"]["database"]
+    assert not database["success"]
+    assert database["validation_errors"] == ["waist below minimum allowed value"]
+    assert not session.committed
+    # Every statement was answered: no validation rules were queried
+    assert session.results == []
@@ -0,0 +1,90 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.core.jester_chat import JesterChat, chunk_brand, query_entities
+from app.utils.semantic_cache import SemanticCache
+
+
+class FakeVectorSearch:
+    """Embeds every query the same way, so only the cache scope tells them apart."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.listeners = []
+
+    @property
+    def version(self):
+        return len(self.chunks)
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def encode_query(self, query):
+        return np.array([1.0, 0.0], dtype=np.float32)
+
+    def search_by_embedding(self, embedding, k):
+        return [dict(chunk, similarity=0.5) for chunk in self.chunks[:k]]
+
+    def add(self, chunk, embedding):
+        self.chunks.append(chunk)
+        for callback in self.listeners:
+            callback(np.array([embedding], dtype=np.float32))
+
+
+def _guide(brand):
+    return {"text": json.dumps({"S": {"Chest": "36"}, "metadata": {"brand": brand}}), "metadata": "Size guide"}
+
+
+def test_query_entities():
+    """Test that known brands and size tokens are picked out of a query."""
+    brands = {"J.Crew", "Acme"}
+    assert query_entities("Does J.Crew run small in XL?", brands) == {"brand:j crew", "xl"}
+    assert query_entities("what's a 32 waist at acme", brands) == {"brand:acme", "32"}
+    assert query_entities("How do I measure my chest?", brands) == frozenset()
+    assert chunk_brand(_guide("Acme")) == "Acme"
+    assert chunk_brand({"text": "Research notes", "metadata": {}}) is None
+
+
+@pytest.mark.asyncio
+async def test_cached_answers_are_scoped_to_entities():
+    """Test that a similar query about another brand doesn't get the cached answer."""
+    vector_search = FakeVectorSearch([_guide("Acme"), _guide("Zara"), _guide("Uniqlo")])
+    chat = JesterChat(vector_search=vector_search, response_cache=SemanticCache(ttl_seconds=0))
+
+    cached, _, remember = await chat._aprepare("Does Acme run small?")
+    assert cached is None
+    remember("Acme runs small.")
+
+    assert (await chat._aprepare("does acme run small"))[0] == "Acme runs small."
+    assert (await chat._aprepare("Does Zara run small?"))[0] is None
+
+
+@pytest.mark.asyncio
+async def test_new_chunks_only_invalidate_answers_they_would_change():
+    """Test that an ingest drops answers within reach and keeps the rest."""
+    vector_search = FakeVectorSearch([_guide("Acme"), _guide("Zara"), _guide("Uniqlo")])
+    chat = JesterChat(vector_search=vector_search, response_cache=SemanticCache(ttl_seconds=0))
+    _, _, remember = await chat._aprepare("Does Acme run small?")
+    remember("Acme runs small.")
+
+    # Farther from the query than every retrieved chunk (squared distance 1)
+    vector_search.add(_guide("Gap"), [1.0, 5.0])
+    assert (await chat._aprepare("Does Acme run small?"))[0] == "Acme runs small."
+
+    vector_search.add(_guide("Acme"), [1.0, 0.5])
+    assert (await chat._aprepare("Does Acme run small?"))[0] is None
+
+
+@pytest.mark.asyncio
+async def test_answer_is_not_cached_if_chunks_were_added_meanwhile():
+    """Test that an answer built before an ingest finished isn't stored."""
+    vector_search = FakeVectorSearch([_guide("Acme")])
+    chat = JesterChat(vector_search=vector_search, response_cache=SemanticCache(ttl_seconds=0))
+
+    _, _, remember = await chat._aprepare("Does Acme run small?")
+    vector_search.add(_guide("Zara"), [9.0, 9.0])
+    remember("Acme runs small.")
+
+    assert (await chat._aprepare("Does Acme run small?"))[0] is None
@@ -0,0 +1,32 @@
+import httpx
+import pytest
+
+from app.config import config
+from app.core import openai_client
+
+
+@pytest.mark.asyncio
+async def test_client_is_shared_and_pooled(monkeypatch):
+    """Test that one pooled client is reused until it is closed."""
+    monkeypatch.setattr(config, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(config, "OPENAI_MAX_CONNECTIONS", 7)
+    created = []
+
+    class RecordingClient(httpx.AsyncClient):
+        def __init__(self, **kwargs):
+            created.append(kwargs)
+            super().__init__(**kwargs)
+
+    monkeypatch.setattr(openai_client.httpx, "AsyncClient", RecordingClient)
+
+    client = openai_client.get_openai_client()
+    try:
+        assert openai_client.get_openai_client() is client
+        assert len(created) == 1
+        assert created[0]["limits"].max_connections == 7
+        assert client.max_retries == config.OPENAI_MAX_RETRIES
+    finally:
+        await openai_client.close_openai_client()
+
+    assert openai_client.get_openai_client() is not client
+    await openai_client.close_openai_client()
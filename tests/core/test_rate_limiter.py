@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from app.core.rate_limiter import ModelLimiter, OverloadedError, Priority, TokenBucket, priority
+
+
+def test_token_bucket_wait_time():
+    """Test that the bucket reports how long until capacity refills."""
+    bucket = TokenBucket(per_minute=60)  # 1 per second
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 1) == 0
+
+
+def test_oversized_request_is_clamped_to_capacity():
+    """Test that a call larger than the bucket still gets admitted eventually."""
+    bucket = TokenBucket(per_minute=100)
+    assert bucket.wait_time(1000, bucket.updated) == 0
+
+
+@pytest.mark.asyncio
+async def test_interactive_admitted_before_bulk():
+    """Test that queued interactive calls go ahead of earlier bulk calls."""
+    limiter = ModelLimiter("test-model", rpm=600, tpm=1_000_000)  # 10 requests/s
+    limiter.requests.tokens = 0
+    order = []
+
+    async def call(name, level):
+        await limiter.acquire(1, level)
+        order.append(name)
+
+    bulk = [asyncio.create_task(call(f"bulk{i}", Priority.BULK)) for i in range(2)]
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(call("chat", Priority.INTERACTIVE))
+    await asyncio.gather(*bulk, interactive)
+
+    assert order[0] == "chat"
+
+
+@pytest.mark.asyncio
+async def test_priority_context_sets_default_level():
+    """Test that priority() applies to calls made inside the block."""
+    limiter = ModelLimiter("test-model", rpm=600, tpm=1_000_000)
+    limiter.requests.tokens = 0
+    order = []
+
+    async def call(name):
+        await limiter.acquire(1)
+        order.append(name)
+
+    with priority(Priority.BULK):
+        bulk = asyncio.create_task(call("bulk"))
+    await asyncio.sleep(0)
+    chat = asyncio.create_task(call("chat"))
+    await asyncio.gather(bulk, chat)
+
+    assert order == ["chat", "bulk"]
+
+
+@pytest.mark.asyncio
+async def test_full_queue_sheds_load():
+    """Test that calls beyond max_queue fail fast with OverloadedError."""
+    limiter = ModelLimiter("test-model", rpm=1, tpm=1_000_000, max_queue=1, max_wait=5)
+    limiter.requests.tokens = 0
+    waiting = asyncio.create_task(limiter.acquire(1))
+    await asyncio.sleep(0)
+
+    with pytest.raises(OverloadedError) as excinfo:
+        await limiter.acquire(1)
+    assert excinfo.value.retry_after >= 1
+    waiting.cancel()
+
+
+@pytest.mark.asyncio
+async def test_wait_beyond_max_wait_sheds_load():
+    """Test that a call is shed when capacity won't arrive within max_wait."""
+    limiter = ModelLimiter("test-model", rpm=1, tpm=1_000_000, max_wait=0.05)
+    limiter.requests.tokens = 0
+
+    with pytest.raises(OverloadedError):
+        await limiter.acquire(1)
+    assert limiter.queued == 0 or all(f.done() for *_, f in limiter._waiters)
+
+
+def test_settle_corrects_token_estimate():
+    """Test that actual usage below the estimate is credited back."""
+    limiter = ModelLimiter("test-model", rpm=100, tpm=1000)
+    limiter.acquire_blocking(800)
+    limiter.settle(estimated=800, actual=300)
+    assert limiter.tokens.tokens == pytest.approx(700, abs=1)
@@ -0,0 +1,63 @@
+import threading
+
+import faiss
+import numpy as np
+
+from app.core import vector_search
+from app.core.vector_search import JesterVectorSearch
+
+
+class FakeModel:
+    def __init__(self, model_name):
+        pass
+
+    def get_sentence_embedding_dimension(self):
+        return 4
+
+    def encode(self, texts):
+        return np.array([[len(text), 1.0, 0.0, 0.0] for text in texts], dtype=np.float32)
+
+
+def _knowledge_base(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(vector_search, "SentenceTransformer", FakeModel)
+    return JesterVectorSearch(str(tmp_path / "index.faiss"), str(tmp_path / "chunks.json"))
+
+
+def test_searches_run_while_state_is_written(monkeypatch, tmp_path):
+    """Test that the disk write happens outside the lock searches take."""
+    kb = _knowledge_base(monkeypatch, tmp_path)
+    kb.add_chunk("first")
+    write_index = faiss.write_index
+    searched = []
+
+    def slow_write(index, path):
+        # A search from another thread must not wait for the write
+        searcher = threading.Thread(target=lambda: searched.append(kb.search("first", k=1)))
+        searcher.start()
+        searcher.join(timeout=5)
+        assert not searcher.is_alive()
+        write_index(index, path)
+
+    monkeypatch.setattr(vector_search.faiss, "write_index", slow_write)
+    kb.add_chunk("second")
+
+    assert searched and searched[0][0]["text"] in ("first", "second")
+    reloaded = _knowledge_base(monkeypatch, tmp_path)
+    assert [chunk["text"] for chunk in reloaded.chunks] == ["first", "second"]
+    assert reloaded.index.ntotal == 2
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_older_snapshot_is_not_saved_over_a_newer_one(monkeypatch, tmp_path):
+    """Test that a save finishing late doesn't overwrite newer state."""
+    kb = _knowledge_base(monkeypatch, tmp_path)
+    kb.add_chunk("first")
+    with kb._lock:
+        stale = kb._snapshot()
+    kb.add_chunk("second")
+
+    kb._save_state(stale)
+
+    reloaded = _knowledge_base(monkeypatch, tmp_path)
+    assert [chunk["text"] for chunk in reloaded.chunks] == ["first", "second"]
@@ -0,0 +1,128 @@
+import threading
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import config
+from app.core import vision
+from app.utils.image_preprocessing import MAX_IMAGE_TOKENS
+
+
+class FakeCompletions:
+    async def create(self, **kwargs):
+        message = SimpleNamespace(content='{"tables": []}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.mark.asyncio
+async def test_undecodable_image_is_sent_with_worst_case_estimate(monkeypatch):
+    """Test that bytes Pillow can't read are sent as-is and reserve the most image tokens."""
+    reserved = []
+
+    @asynccontextmanager
+    async def fake_rate_limited(model, estimated):
+        reserved.append(estimated)
+        yield SimpleNamespace(record=lambda usage: None)
+
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    monkeypatch.setattr(vision, "rate_limited", fake_rate_limited)
+    monkeypatch.setattr(vision, "get_openai_client", lambda: fake_client)
+    monkeypatch.setattr(config, "VISION_PREPROCESS_ENABLED", True)
+
+    image = vision.prepare_vision_image(b"not an image", "chart.png")
+    assert image.data == b"not an image"
+    assert image.estimated_tokens is None
+
+    output = await vision.run_vision_prompt(image=image)
+
+    assert output == '{"tables": []}'
+    assert reserved[0] > MAX_IMAGE_TOKENS
+
+
+class FakeStream:
+    def __init__(self, pieces, usage):
+        self.chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None)
+            for piece in pieces
+        ]
+        # The last chunk only carries the usage
+        self.chunks.append(SimpleNamespace(choices=[], usage=usage))
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+@pytest.mark.asyncio
+async def test_structured_extraction_streams_rows_within_the_reservation(monkeypatch):
+    """Test that rows are mapped as they stream and usage is recorded before the reservation ends."""
+    events = []
+    payload = (
+        '{"tables": [{"title": "Tops", "unit": "in", "headers": ["Chest", "Pit to Pit"], '
+        '"rows": [["S", "34-36", 18], ["M", "38-40", 20]]}]}'
+    )
+    usage = SimpleNamespace(total_tokens=900)
+
+    class StreamingCompletions:
+        async def create(self, **kwargs):
+            assert kwargs["stream"] and kwargs["stream_options"] == {"include_usage": True}
+            return FakeStream([payload[i:i + 7] for i in range(0, len(payload), 7)], usage)
+
+    @asynccontextmanager
+    async def fake_rate_limited(model, estimated):
+        events.append("reserve")
+        yield SimpleNamespace(record=lambda recorded: events.append(("usage", recorded.total_tokens)))
+        events.append("release")
+
+    def match_to_standard(header):
+        events.append(("map", header))
+        return "chest" if header == "Chest" else "pit_to_pit"
+
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=StreamingCompletions()))
+    monkeypatch.setattr(vision, "rate_limited", fake_rate_limited)
+    monkeypatch.setattr(vision, "get_openai_client", lambda: fake_client)
+    monkeypatch.setattr(vision, "match_to_standard", match_to_standard)
+    monkeypatch.setattr(config, "VISION_STRUCTURED_OUTPUT", True)
+
+    image = vision.prepare_vision_image(b"not an image", "chart.png")
+    output, chart, error, rows = await vision.extract_size_chart(image)
+
+    assert error is None
+    assert output == payload
+    assert chart["M"] == {"Chest": "38-40", "Pit to Pit": 20}
+    assert [row["size"] for row in rows] == ["S", "M"]
+    assert rows[0]["measurements"] == {"chest": {"min": 34.0, "max": 36.0}, "pit_to_pit": {"min": 36.0, "max": 36.0}}
+    # Headers are mapped once, and the reservation is settled before it is released
+    assert events == ["reserve", ("map", "Chest"), ("map", "Pit to Pit"), ("usage", 900), "release"]
+
+
+@pytest.mark.asyncio
+async def test_cache_io_runs_off_the_event_loop(monkeypatch):
+    """Test that vision cache reads and writes happen in worker threads."""
+    loop_thread = threading.get_ident()
+    calls = []
+
+    class RecordingCache:
+        def get(self, key):
+            calls.append(("get", threading.get_ident()))
+            return None
+
+        def set(self, key, result, model, prompt_version):
+            calls.append(("set", threading.get_ident()))
+
+    async def extract(image):
+        return '{"S": {"Chest": "36"}}', {"S": {"Chest": "36"}}, None, []
+
+    monkeypatch.setattr(vision, "get_vision_cache", RecordingCache)
+    monkeypatch.setattr(vision, "extract_size_chart", extract)
+    monkeypatch.setattr(config, "VISION_TILING_ENABLED", False)
+
+    result = await vision.process_size_guide_bytes(b"not an image", "chart.png")
+
+    assert result["metadata"]["vision_cache"] == "miss"
+    assert [name for name, _ in calls] == ["get", "set"]
+    assert all(thread != loop_thread for _, thread in calls)
@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+from app.core.rate_limiter import OverloadedError
+from scripts import bulk_ingest
+from scripts.bulk_ingest import BulkIngestor, describe, load_progress, parse_args
+
+
+class FakeVectorSearch:
+    def __init__(self):
+        self.batches = []
+
+    def batch_add_chunks(self, texts, metadata_list):
+        self.batches.append((texts, metadata_list))
+
+
+def _ingestor(tmp_path, *extra):
+    args = parse_args([
+        str(tmp_path), "--progress", str(tmp_path / "progress.jsonl"),
+        "--skip-knowledge-base", "--base-delay", "0.001", *extra,
+    ])
+    ingestor = BulkIngestor(args)
+    ingestor.vector_search = FakeVectorSearch()
+    return ingestor
+
+
+def _items(*paths):
+    return [{"path": path, "metadata": {"brand": "Acme", "gender": None}} for path in paths]
+
+
+def test_describe_leaves_out_missing_metadata():
+    """Test that missing brand, gender or unit don't show up as None."""
+    assert describe({"brand": None, "gender": None, "unit_of_measurement": None}) == "Size guide"
+    assert describe({"brand": "Acme", "gender": None, "unit_of_measurement": "inches"}) == (
+        "Size guide for Acme clothing using inches measurements"
+    )
+
+
+@pytest.mark.asyncio
+async def test_resume_skips_recorded_images(tmp_path, monkeypatch):
+    """Test that done and failed images are skipped and new outcomes are recorded."""
+    (tmp_path / "progress.jsonl").write_text(
+        json.dumps({"path": "a.png", "status": "done"}) + "\n"
+        + json.dumps({"path": "b.png", "status": "failed", "error": "boom"}) + "\n"
+    )
+    calls = []
+
+    async def extract(path):
+        calls.append(path)
+        return {"S": {"Chest": "36"}, "metadata": {"tiles": 2}}
+
+    monkeypatch.setattr(bulk_ingest, "process_size_guide_image", extract)
+    ingestor = _ingestor(tmp_path)
+    summary = await ingestor.run(_items("a.png", "b.png", "c.png"))
+
+    assert calls == ["c.png"]
+    assert summary["skipped"] == 2 and summary["succeeded"] == 1
+    texts, descriptions = ingestor.vector_search.batches[0]
+    stored = json.loads(texts[0])["metadata"]
+    assert stored["source_image"] == "c.png"
+    assert stored["tiles"] == 2
+    assert descriptions == ["Size guide for Acme clothing"]
+    assert load_progress(tmp_path / "progress.jsonl")["c.png"]["status"] == "done"
+
+    # --retry-failed picks up the earlier failure
+    retry = _ingestor(tmp_path, "--retry-failed")
+    await retry.run(_items("a.png", "b.png", "c.png"))
+    assert calls == ["c.png", "b.png"]
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried_until_max_retries(tmp_path, monkeypatch):
+    """Test that shed calls are retried with backoff and fail once retries run out."""
+    attempts = {}
+
+    async def extract(path):
+        attempts[path] = attempts.get(path, 0) + 1
+        if path == "flaky.png" and attempts[path] < 3:
+            raise OverloadedError("busy")
+        if path == "down.png":
+            raise OverloadedError("busy")
+        return {"S": {"Chest": "36"}}
+
+    monkeypatch.setattr(bulk_ingest, "process_size_guide_image", extract)
+    ingestor = _ingestor(tmp_path, "--max-retries", "2")
+    summary = await ingestor.run(_items("flaky.png", "down.png"))
+
+    assert attempts == {"flaky.png": 3, "down.png": 3}
+    assert summary["succeeded"] == 1 and summary["failed"] == 1
+    assert summary["retries"] == 4
+    assert summary["failures"] == [{"path": "down.png", "error": "OverloadedError: busy"}]
+    progress = load_progress(tmp_path / "progress.jsonl")
+    assert progress["flaky.png"]["status"] == "done"
+    assert progress["down.png"]["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_failed_knowledge_base_write_marks_batch_failed(tmp_path, monkeypatch):
+    """Test that a failed write records its batch as failed without stopping the run."""
+    async def extract(path):
+        return {"S": {"Chest": "36"}}
+
+    class FailingVectorSearch:
+        def batch_add_chunks(self, texts, metadata_list):
+            raise OSError("disk full")
+
+    monkeypatch.setattr(bulk_ingest, "process_size_guide_image", extract)
+    ingestor = _ingestor(tmp_path, "--flush-every", "1")
+    ingestor.vector_search = FailingVectorSearch()
+    summary = await ingestor.run(_items("a.png", "b.png"))
+
+    assert summary["succeeded"] == 0 and summary["failed"] == 2
+    assert summary["failures"][0]["error"] == "Knowledge base write failed: OSError: disk full"
+    progress = load_progress(tmp_path / "progress.jsonl")
+    assert {progress[path]["status"] for path in ("a.png", "b.png")} == {"failed"}
+
+    # Picked up again by --retry-failed
+    retry = _ingestor(tmp_path, "--retry-failed")
+    summary = await retry.run(_items("a.png", "b.png"))
+    assert summary["succeeded"] == 2
+    assert len(retry.vector_search.batches[0][0]) == 2
@@ -0,0 +1,176 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services.job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, QueueFullError, RetryLater
+
+
+async def _wait_for(queue, job_id, statuses=(SUCCEEDED, FAILED)):
+    for _ in range(200):
+        if queue.get(job_id)["status"] in statuses:
+            return queue.get(job_id)
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} never reached {statuses}")
+
+
+@pytest.mark.asyncio
+async def test_job_runs_and_persists(tmp_path):
+    """Test that a submitted job runs and its result is written to disk."""
+    async def handler(payload):
+        return {"doubled": payload["n"] * 2}
+
+    queue = JobQueue(handler, tmp_path)
+    await queue.start()
+    try:
+        job = await queue.submit({"n": 21})
+        assert job["status"] == QUEUED
+        done = await _wait_for(queue, job["id"])
+    finally:
+        await queue.stop()
+
+    assert done["result"] == {"doubled": 42}
+    assert done["attempts"] == 1
+    on_disk = json.loads((tmp_path / f"{job['id']}.json").read_text())
+    assert on_disk["status"] == SUCCEEDED
+
+
+@pytest.mark.asyncio
+async def test_handler_error_marks_job_failed(tmp_path):
+    """Test that a handler exception is recorded on the job."""
+    async def handler(payload):
+        raise ValueError("unreadable image")
+
+    queue = JobQueue(handler, tmp_path)
+    await queue.start()
+    try:
+        job = await queue.submit({})
+        done = await _wait_for(queue, job["id"])
+    finally:
+        await queue.stop()
+
+    assert done["status"] == FAILED
+    assert "unreadable image" in done["error"]
+
+
+@pytest.mark.asyncio
+async def test_submit_refused_when_full(tmp_path):
+    """Test that submissions beyond max_queue_size raise QueueFullError."""
+    release = asyncio.Event()
+
+    async def handler(payload):
+        await release.wait()
+        return {}
+
+    queue = JobQueue(handler, tmp_path, max_workers=1, max_queue_size=1)
+    await queue.start()
+    try:
+        running = await queue.submit({})
+        await _wait_for(queue, running["id"], statuses=(RUNNING,))
+        await queue.submit({})
+        with pytest.raises(QueueFullError):
+            await queue.submit({})
+    finally:
+        release.set()
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_interrupted_job_resumes_after_restart(tmp_path):
+    """Test that a job running at shutdown runs again on the next start."""
+    started = asyncio.Event()
+
+    async def hanging(payload):
+        started.set()
+        await asyncio.Event().wait()
+
+    first = JobQueue(hanging, tmp_path)
+    await first.start()
+    job = await first.submit({"n": 1})
+    await started.wait()
+    await first.stop()
+
+    async def handler(payload):
+        return {"n": payload["n"]}
+
+    second = JobQueue(handler, tmp_path)
+    await second.start()
+    try:
+        done = await _wait_for(second, job["id"])
+    finally:
+        await second.stop()
+
+    assert done["status"] == SUCCEEDED
+    assert done["result"] == {"n": 1}
+    assert done["attempts"] == 2
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_attempts(tmp_path):
+    """Test that a job is failed once it has been started max_attempts times."""
+    job = {
+        "id": "stuck", "status": RUNNING, "created_at": 0, "started_at": 0,
+        "finished_at": None, "attempts": 3, "payload": {}, "result": None, "error": None,
+    }
+    (tmp_path / "stuck.json").write_text(json.dumps(job))
+
+    async def handler(payload):
+        return {}
+
+    queue = JobQueue(handler, tmp_path, max_attempts=3)
+    await queue.start()
+    try:
+        done = await _wait_for(queue, "stuck")
+    finally:
+        await queue.stop()
+
+    assert done["status"] == FAILED
+    assert "3 attempts" in done["error"]
+
+
+@pytest.mark.asyncio
+async def test_retry_later_requeues_without_using_an_attempt(tmp_path):
+    """Test that RetryLater puts the job back after a backoff and keeps its attempts."""
+    calls = []
+
+    async def handler(payload):
+        calls.append(payload)
+        if len(calls) < 4:
+            raise RetryLater("overloaded", delay=0)
+        return {"ok": True}
+
+    queue = JobQueue(handler, tmp_path, max_attempts=1, max_backoff=0.01)
+    await queue.start()
+    try:
+        job = await queue.submit({})
+        done = await _wait_for(queue, job["id"])
+    finally:
+        await queue.stop()
+
+    assert done["status"] == SUCCEEDED
+    assert len(calls) == 4
+    assert done["attempts"] == 1
+    assert done["retries"] == 3
+    assert done["error"] is None
+
+
+@pytest.mark.asyncio
+async def test_retry_later_gives_up_after_max_retry_seconds(tmp_path):
+    """Test that a job that is always put off is failed once its retry deadline passes."""
+    calls = []
+
+    async def handler(payload):
+        calls.append(payload)
+        raise RetryLater("overloaded", delay=0.05)
+
+    queue = JobQueue(handler, tmp_path, max_backoff=0.05, max_retry_seconds=0.12)
+    await queue.start()
+    try:
+        job = await queue.submit({})
+        done = await _wait_for(queue, job["id"])
+    finally:
+        await queue.stop()
+
+    assert done["status"] == FAILED
+    assert "overloaded" in done["error"]
+    assert 1 < len(calls) < 5
@@ -0,0 +1,57 @@
+import pytest
+
+from app.services.recommendation_service import RecommendationEngine, SizeRecord, to_inches
+
+
+def _engine():
+    engine = RecommendationEngine()
+    engine.build([
+        SizeRecord(1, "Acme", "S", category_id=1, gender_id=1, ranges={"chest": (34, 36), "waist": (28, 30)}),
+        SizeRecord(2, "Acme", "M", category_id=1, gender_id=1, ranges={"chest": (38, 40), "waist": (32, 34)}),
+        SizeRecord(3, "Acme", "L", category_id=1, gender_id=1, ranges={"chest": (42, 44), "waist": (36, 38)}),
+        SizeRecord(4, "Acme", "M", category_id=2, gender_id=2, ranges={"chest": (36, 38)}),
+        SizeRecord(5, "Other", "M", ranges={"chest": (30, 50)}),
+    ])
+    return engine
+
+
+def test_recommends_size_whose_ranges_contain_measurements():
+    """Test that the size containing every measurement ranks first with a perfect score."""
+    results = _engine().recommend("acme", {"chest": 39, "waist": 33}, category_id=1)
+
+    assert results[0]["size_label"] == "M"
+    assert results[0]["score"] == 1.0
+    assert results[0]["fit"] == "fits"
+    assert results[0]["measurements"]["chest"]["difference"] == 0.0
+
+
+def test_scores_fall_off_within_tolerance():
+    """Test that a measurement outside the range scores by its distance over the tolerance."""
+    engine = _engine()
+    results = engine.recommend("Acme", {"chest": 41}, gender_id=1, top_n=5)
+
+    # 1 inch above M and 1 inch below L, with a 2 inch chest tolerance
+    assert [r["score"] for r in results[:2]] == [0.5, 0.5]
+    assert {r["size_label"] for r in results[:2]} == {"M", "L"}
+    assert results[0]["fit"] == "close"
+    assert results[-1]["size_label"] == "S" and results[-1]["score"] == 0.0
+
+
+def test_filters_and_units():
+    """Test category filtering and that centimetre measurements are converted."""
+    engine = _engine()
+    results = engine.recommend("Acme", {"chest": 37 * 2.54}, unit="cm", category_id=2)
+
+    assert [r["size_guide_id"] for r in results] == [4]
+    assert results[0]["measurements"]["chest"]["value"] == pytest.approx(37)
+    assert to_inches(2.54, "centimeters") == pytest.approx(1)
+
+
+def test_unknown_brand_and_unshared_measurements():
+    """Test that unknown brands raise and sizes sharing no measurement are skipped."""
+    engine = _engine()
+    with pytest.raises(KeyError):
+        engine.recommend("Nobody", {"chest": 40})
+    assert engine.recommend("Acme", {"inseam": 32}) == []
+    assert engine.brands == ["Acme", "Other"]
+    assert not RecommendationEngine().loaded and engine.loaded
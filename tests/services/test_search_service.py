@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.services.search_service import SearchService
+
+
+class FakeIndex:
+    def __init__(self, knowledge_base):
+        self.knowledge_base = knowledge_base
+
+    @property
+    def ntotal(self):
+        return len(self.knowledge_base.vectors)
+
+
+class FakeKnowledgeBase:
+    """Brute-force stand-in for JesterVectorSearch over 2-d embeddings."""
+
+    def __init__(self):
+        self.chunks = []
+        self.vectors = []
+        self.index = FakeIndex(self)
+        self.encoded = []
+
+    @property
+    def version(self):
+        return len(self.chunks)
+
+    def add(self, text, metadata, vector):
+        self.chunks.append({"text": text, "metadata": metadata})
+        self.vectors.append(np.array(vector, dtype=float))
+
+    def encode_queries(self, queries):
+        self.encoded.append(list(queries))
+        return [np.array([float(len(q)), 0.0]) for q in queries]
+
+    def rank(self, embedding, k):
+        distances = [float(np.sum((v - embedding) ** 2)) for v in self.vectors]
+        order = np.argsort(distances, kind="stable")[:k]
+        return [int(i) for i in order], [1.0 / (1.0 + distances[i]) for i in order]
+
+
+def _knowledge_base():
+    kb = FakeKnowledgeBase()
+    for i in range(6):
+        brand = "Acme" if i % 2 == 0 else "Zenith"
+        text = json.dumps({"measurements": {"chest": 40 + i}, "metadata": {"brand": brand, "gender": "Men"}})
+        kb.add(text, f"Size guide for {brand} Men clothing", [float(i), 0.0])
+    kb.add("How to measure your chest", {"type": "research"}, [10.0, 0.0])
+    return kb
+
+
+@pytest.mark.asyncio
+async def test_vector_search_filters_and_paginates():
+    """Test metadata filters from chunk JSON, compact results and cursor pagination."""
+    service = SearchService(_knowledge_base(), max_wait=0.001)
+
+    first = await service.search("", k=2, filters={"brand": "acme"})
+    assert [r["id"] for r in first["results"]] == [0, 2]
+    assert "text" not in first["results"][0] and first["results"][0]["snippet"]
+    assert first["results"][0]["metadata"]["brand"] == "Acme"
+
+    second = await service.search("", k=2, filters={"brand": "acme"}, cursor=first["next_cursor"])
+    assert [r["id"] for r in second["results"]] == [4]
+    assert second["next_cursor"] is None
+
+    full = await service.search("", k=1, filters={"type": ["research", "other"]}, include_text=True)
+    assert full["results"][0]["text"] == "How to measure your chest"
+
+
+@pytest.mark.asyncio
+async def test_min_score_lexical_mode_and_stale_cursor():
+    """Test min_score, lexical search and rejection of cursors from another query or version."""
+    kb = _knowledge_base()
+    service = SearchService(kb, max_wait=0.001)
+
+    close = await service.search("", k=10, min_score=0.3)
+    assert [r["id"] for r in close["results"]] == [0, 1]
+
+    lexical = await service.search("measure chest", mode="lexical")
+    assert lexical["results"][0]["id"] == 6
+
+    page = await service.search("", k=1)
+    with pytest.raises(ValueError):
+        await service.search("other", k=1, cursor=page["next_cursor"])
+    kb.add("new chunk", {}, [0.5, 0.0])
+    with pytest.raises(ValueError):
+        await service.search("", k=1, cursor=page["next_cursor"])
+    with pytest.raises(ValueError):
+        await service.search("", mode="hybrid")
@@ -0,0 +1,61 @@
+import pytest
+
+from app.services.recommendation_service import SizeRecord
+from app.services.size_equivalence import SizeEquivalenceTable, compute_table
+
+
+def _records():
+    return [
+        SizeRecord(1, "Acme", "S", 1, 1, {"chest": (34, 36), "waist": (28, 30)}),
+        SizeRecord(2, "Acme", "M", 1, 1, {"chest": (38, 40), "waist": (32, 34)}),
+        SizeRecord(3, "Acme", "L", 1, 1, {"chest": (42, 44), "waist": (36, 38)}),
+        SizeRecord(4, "Brandb", "1", 1, 1, {"chest": (35, 37)}),
+        SizeRecord(5, "Brandb", "2", 1, 1, {"chest": (39, 41)}),
+        SizeRecord(6, "Brandb", "3", 1, 1, {"chest": (43, 45)}),
+        SizeRecord(7, "Brandb", "2", 2, 1, {"chest": (10, 12)}),
+    ]
+
+
+def test_compute_table_ranks_overlapping_sizes():
+    """Test that each size maps to the other brand's most overlapping size first."""
+    computed = compute_table(_records(), pad=0.5, min_score=0.1)
+    matches = computed["table"]["acme"]["m"]["brandb"]
+
+    assert len(matches) == 1  # Category 2 has only one brand
+    assert matches[0]["category_id"] == 1
+    assert matches[0]["matches"][0]["size_label"] == "2"
+    assert matches[0]["matches"][0]["score"] == pytest.approx(2 / 4)
+    # Reverse direction is computed too
+    assert computed["table"]["brandb"]["3"]["acme"][0]["matches"][0]["size_label"] == "L"
+
+
+def test_table_is_recomputed_only_when_records_change(tmp_path):
+    """Test that update skips unchanged data and that a saved table reloads."""
+    path = tmp_path / "equivalence.json"
+    table = SizeEquivalenceTable(str(path))
+    assert not table.loaded
+    assert table.update(_records())
+    assert not table.update(_records())
+    assert table.update(_records()[:-1])
+
+    reloaded = SizeEquivalenceTable(str(path))
+    assert reloaded.load()
+    assert reloaded.fingerprint == table.fingerprint
+    result = reloaded.lookup("ACME", "s", "BrandB", category_id=1)
+    assert result[0]["matches"][0]["size_label"] == "1"
+    assert reloaded.lookup("Acme", "XXL", "Brandb") == []
+    with pytest.raises(KeyError):
+        reloaded.lookup("Acme", "M", "Nobody")
+
+
+def test_changed_settings_invalidate_the_table(tmp_path):
+    """Test that a table computed with other settings is neither loaded nor kept."""
+    path = tmp_path / "equivalence.json"
+    table = SizeEquivalenceTable(str(path), pad=0.5)
+    table.update(_records())
+
+    stricter = SizeEquivalenceTable(str(path), pad=0.5, min_score=0.6)
+    assert not stricter.load() and not stricter.loaded
+    assert stricter.update(_records())
+    assert stricter.lookup("Acme", "M", "Brandb") == []  # 0.5 overlap is now below min_score
+    assert not SizeEquivalenceTable(str(path), pad=0.5).load()
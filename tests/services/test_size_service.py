@@ -0,0 +1,256 @@
+import pytest
+
+from app.services import size_service
+from app.services.size_service import ReferenceCache, SizeService
+from app.services.validation_engine import ValidationEngine
+from app.utils.size_normalizer import normalize_chart
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return list(self.rows)
+
+    def scalar_one(self):
+        return self.rows[0][0]
+
+    def scalar_one_or_none(self):
+        return self.rows[0][0] if self.rows else None
+
+
+class FakeSession:
+    """Returns the given rows for each execute call in turn and records the statements."""
+
+    def __init__(self, *results, fail_commit=False):
+        self.results = list(results)
+        self.fail_commit = fail_commit
+        self.executed = []
+        self.committed = False
+        self.rolled_back = False
+
+    async def execute(self, statement, params=None):
+        self.executed.append((statement, params))
+        return FakeResult(self.results.pop(0))
+
+    async def commit(self):
+        if self.fail_commit:
+            raise RuntimeError("connection lost")
+        self.committed = True
+
+    async def rollback(self):
+        self.rolled_back = True
+
+
+@pytest.fixture
+def references(monkeypatch):
+    cache = ReferenceCache()
+    monkeypatch.setattr(size_service, "_references", cache)
+    return cache
+
+
+def _engine():
+    engine = ValidationEngine()
+    engine.build([
+        (1, "chest", "in", 20, 70),
+        (2, "waist", "in", 10, 80),
+    ])
+    return engine
+
+
+@pytest.mark.asyncio
+async def test_proposal_lists_rule_violations(monkeypatch):
+    """Test that a loaded validation engine checks the extraction in the ingestion proposal."""
+    monkeypatch.setattr(size_service, "match_to_standard", lambda header: header.lower())
+    analysis_result = {
+        "S": {"Chest": "18-19", "Waist": "28"},
+        "M": {"Chest": "38", "Waist": "90"},
+        "unit": "in",
+        "metadata": {"source_image": "chart.png"},
+    }
+    metadata = {"brand": "Acme", "unit": "inches"}
+
+    proposal = await SizeService(None, _engine()).prepare_ingestion_proposal(analysis_result, metadata)
+    assert sorted(proposal["potential_conflicts"]) == [
+        "chest below minimum allowed value",
+        "waist above maximum allowed value",
+    ]
+
+    unchecked = await SizeService(None).prepare_ingestion_proposal(analysis_result, metadata)
+    assert unchecked["potential_conflicts"] == []
+
+
+def test_measurement_rows_skip_empty_cells_and_unmapped_columns():
+    """Test that only mapped, parsed cells become rows, in row-major order."""
+    chart = normalize_chart({
+        "S": {"Chest": "36", "Waist": "", "Hip": "40"},
+        "M": {"Chest": "38-40", "Waist": "32", "Hip": "42"},
+    }, unit="in")
+    rows = SizeService(None)._measurement_rows(chart, {"Chest": 1, "Waist": 2, "Hip": None}, [9, 10], 3)
+
+    assert rows == [
+        {"size_guide_id": 9, "measurement_type_id": 1, "unit_id": 3, "min_value": 36.0, "max_value": 36.0},
+        {"size_guide_id": 10, "measurement_type_id": 1, "unit_id": 3, "min_value": 38.0, "max_value": 40.0},
+        {"size_guide_id": 10, "measurement_type_id": 2, "unit_id": 3, "min_value": 32.0, "max_value": 32.0},
+    ]
+
+
+GUIDE_METADATA = {
+    "brand": "Acme",
+    "gender": "Men",
+    "size_guide_header": "Shirts",
+    "source_url": "https://example.com/size-guide",
+    "unit": "inches",
+    "scope": "US",
+}
+
+VISION_OUTPUT = """Here is the chart:
+{"S": {"Chest": "34-36", "Waist": "28", "Hip": "35"}, "M": {"Chest": "38-40", "Waist": "32", "Hip": "39"}}"""
+
+
+def _guide_session(*validation_rules):
+    return FakeSession(
+        [(3,)],                       # unit
+        [],                           # brand lookup, not found
+        [(5,)],                       # brand created
+        [(2,)],                       # gender
+        [("S", 11), ("M", 12)],       # one size guide row per size
+        [("chest", 1)],               # existing measurement types
+        [("waist", 7)],               # created measurement types
+        [],                           # measurements
+        list(validation_rules),
+    )
+
+
+@pytest.mark.asyncio
+async def test_process_size_guide_stores_every_size(monkeypatch, references):
+    """Test the whole flow from vision output to committed size guide and measurement rows."""
+    async def run_vision_prompt(image_path):
+        assert image_path == "chart.png"
+        return VISION_OUTPUT
+
+    monkeypatch.setattr(size_service, "run_vision_prompt", run_vision_prompt)
+    monkeypatch.setattr(size_service, "match_to_standard", lambda header: None if header == "Hip" else header.lower())
+    session = _guide_session()
+
+    result = await SizeService(session).process_size_guide("chart.png", GUIDE_METADATA)
+
+    assert result["success"], result
+    assert result["size_guide_ids"] == {"S": 11, "M": 12}
+    assert session.committed and not session.rolled_back
+    assert session.results == []
+
+    guides = session.executed[4][1]
+    assert [guide["size_label"] for guide in guides] == ["S", "M"]
+    assert {guide["brand_id"] for guide in guides} == {5}
+    assert {guide["gender_id"] for guide in guides} == {2}
+    assert {str(guide["ingestion_uuid"]) for guide in guides} == {result["ingestion_uuid"]}
+    assert guides[0]["size_guide_header"] == "Shirts"
+
+    # One executemany for every cell of the guide; the unmapped Hip column is skipped
+    assert session.executed[7][1] == [
+        {"size_guide_id": 11, "measurement_type_id": 1, "unit_id": 3, "min_value": 34.0, "max_value": 36.0},
+        {"size_guide_id": 11, "measurement_type_id": 7, "unit_id": 3, "min_value": 28.0, "max_value": 28.0},
+        {"size_guide_id": 12, "measurement_type_id": 1, "unit_id": 3, "min_value": 38.0, "max_value": 40.0},
+        {"size_guide_id": 12, "measurement_type_id": 7, "unit_id": 3, "min_value": 32.0, "max_value": 32.0},
+    ]
+    assert references.brands == {"Acme": 5}
+    assert references.measurement_types == {"chest": 1, "waist": 7}
+
+
+@pytest.mark.asyncio
+async def test_invalid_guide_is_rolled_back(monkeypatch, references):
+    """Test that a guide breaking a validation rule is rolled back, not committed."""
+    monkeypatch.setattr(size_service, "match_to_standard", lambda header: None if header == "Hip" else header.lower())
+    session = _guide_session((7, "waist", 30, 50))
+
+    result = await SizeService(session).store_size_guide(
+        {"S": {"Chest": "34-36", "Waist": "28", "Hip": "35"}, "M": {"Chest": "38-40", "Waist": "32", "Hip": "39"}},
+        GUIDE_METADATA
+    )
+
+    assert not result["success"]
+    assert result["validation_errors"] == ["waist below minimum allowed value"]
+    assert session.rolled_back and not session.committed
+    # Nothing created by the rolled back transaction is cached
+    assert references.brands == {}
+    assert references.measurement_types == {"chest": 1}
+
+
+@pytest.mark.asyncio
+async def test_failed_guide_is_rolled_back(monkeypatch, references):
+    """Test that an error part way through rolls back and is reported."""
+    async def run_vision_prompt(image_path):
+        return VISION_OUTPUT
+
+    monkeypatch.setattr(size_service, "run_vision_prompt", run_vision_prompt)
+    session = FakeSession([])  # Unknown unit
+
+    result = await SizeService(session).process_size_guide("chart.png", GUIDE_METADATA)
+
+    assert result == {"success": False, "error": "Unknown unit: inches"}
+    assert session.rolled_back and not session.committed
+
+
+@pytest.mark.asyncio
+async def test_created_measurement_types_are_cached_after_commit(references):
+    """Test that existing types are cached at once and created ones only once committed."""
+    session = FakeSession([("chest", 1)], [("waist", 7)])
+    service = SizeService(session)
+
+    assert await service._get_measurement_types(["chest", "waist"]) == {"chest": 1, "waist": 7}
+    assert len(session.executed) == 2
+    assert session.executed[1][1] == [{"name": "waist", "description": "Measurement for waist"}]
+    assert references.measurement_types == {"chest": 1}
+    # Still known to this session before the commit
+    assert await service._get_measurement_types(["waist"]) == {"waist": 7}
+
+    await service._commit()
+    assert references.measurement_types == {"chest": 1, "waist": 7}
+
+    later = FakeSession()
+    assert await SizeService(later)._get_measurement_types(["chest", "waist"]) == {"chest": 1, "waist": 7}
+    assert later.executed == []
+
+
+@pytest.mark.asyncio
+async def test_created_measurement_types_are_dropped_on_rollback(references):
+    """Test that types from a rolled back or failed transaction never reach the cache."""
+    service = SizeService(FakeSession([], [("waist", 7)]))
+    await service._get_measurement_types(["waist"])
+    await service._rollback()
+    assert references.measurement_types == {}
+
+    failing = SizeService(FakeSession([], [("waist", 8)], fail_commit=True))
+    await failing._get_measurement_types(["waist"])
+    with pytest.raises(RuntimeError):
+        await failing._commit()
+    assert references.measurement_types == {}
+
+
+@pytest.mark.asyncio
+async def test_validate_measurements_messages():
+    """Test that the first rule per type applies, with the original error messages."""
+    session = FakeSession([
+        (1, "chest", 30, 50),
+        (1, "chest", 0, 100),  # Later rules for the same type are ignored
+        (2, "waist", None, 30),
+    ])
+    rows = [
+        {"measurement_type_id": 1, "min_value": 28.0, "max_value": 29.0},
+        {"measurement_type_id": 1, "min_value": 36.0, "max_value": 52.0},
+        {"measurement_type_id": 2, "min_value": 20.0, "max_value": 34.0},
+        {"measurement_type_id": 3, "min_value": 1.0, "max_value": 1000.0},  # No rule
+    ]
+
+    assert await SizeService(session)._validate_measurements(rows, unit_id=1) == [
+        "chest below minimum allowed value",
+        "chest above maximum allowed value",
+        "waist above maximum allowed value",
+    ]
+    assert len(session.executed) == 1
+
+    empty = FakeSession()
+    assert await SizeService(empty)._validate_measurements([], unit_id=1) == []
+    assert empty.executed == []
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from app.services.validation_engine import ValidationEngine
+from app.utils.size_normalizer import NormalizedChart
+
+
+def _engine():
+    engine = ValidationEngine()
+    engine.build([
+        (1, "chest", "inches", 20, 70),
+        (2, "waist", "cm", 50, 150),
+        (2, "waist", "in", 10, 80),  # Used for inch charts instead of the converted cm rule
+        (3, "sleeve", "in", None, 40),
+    ])
+    return engine
+
+
+def _chart(unit="in"):
+    return NormalizedChart(
+        sizes=["S", "M"],
+        measurements=["Chest", "Waist", "Sleeve", "Inseam"],
+        min_values=np.array([[15.0, 30.0, 33.0, 5.0], [40.0, np.nan, 42.0, 500.0]]),
+        max_values=np.array([[17.0, 90.0, 34.0, 5.0], [72.0, np.nan, 43.0, 500.0]]),
+        unit=unit,
+    )
+
+
+def test_validate_reports_every_violating_cell():
+    """Test per-cell below/above violations; missing cells and measurements without rules are skipped."""
+    violations = _engine().validate(_chart())
+
+    assert {(v["size"], v["measurement"], v["kind"]) for v in violations} == {
+        ("S", "chest", "below_min"),
+        ("S", "waist", "above_max"),
+        ("M", "chest", "above_max"),
+        ("M", "sleeve", "above_max"),
+    }
+    waist = next(v for v in violations if v["measurement"] == "waist")
+    assert waist["value"] == 90.0 and waist["limit"] == 80.0
+
+
+def test_rules_are_converted_between_units():
+    """Test that a rule stored in one unit applies to charts in the other."""
+    engine = _engine()
+    chart = NormalizedChart(
+        sizes=["M"], measurements=["chest", "waist"],
+        min_values=np.array([[40.0, 40.0]]), max_values=np.array([[200.0, 40.0]]), unit="cm",
+    )
+    violations = engine.validate(chart)
+
+    chest = [v for v in violations if v["measurement"] == "chest"]
+    assert [v["kind"] for v in chest] == ["below_min", "above_max"]
+    assert chest[1]["limit"] == pytest.approx(70 * 2.54)
+    assert [v["kind"] for v in violations if v["measurement"] == "waist"] == ["below_min"]
+
+
+def test_validate_batch_and_measurement_type_ids():
+    """Test batch validation, columns given as type ids, and an engine without rules."""
+    engine = _engine()
+    results = engine.validate_batch(
+        [_chart(), _chart()],
+        [None, [1, None, None, None]],
+    )
+
+    assert len(results[0]) == 4
+    assert {v["measurement"] for v in results[1]} == {"chest"}
+    assert len(engine) == 3 and engine.loaded
+    assert ValidationEngine().validate(_chart()) == []
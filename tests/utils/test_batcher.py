@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from app.utils.batcher import MicroBatcher
+
+
+@pytest.mark.asyncio
+async def test_concurrent_submits_share_one_call():
+    """Test that items submitted together are passed to fn in one batch, results in order."""
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch=10, max_wait=0.01)
+    results = await asyncio.gather(*[batcher.submit(i) for i in range(5)])
+
+    assert results == [0, 2, 4, 6, 8]
+    assert calls == [[0, 1, 2, 3, 4]]
+    assert batcher.batches == 1 and batcher.items == 5
+
+
+@pytest.mark.asyncio
+async def test_full_batches_flush_and_errors_propagate():
+    """Test that max_batch splits batches and that an exception reaches every caller."""
+    calls = []
+
+    def record(items):
+        calls.append(len(items))
+        return items
+
+    batcher = MicroBatcher(record, max_batch=2, max_wait=0.01)
+    assert await asyncio.gather(*[batcher.submit(i) for i in range(5)]) == [0, 1, 2, 3, 4]
+    assert sorted(calls) == [1, 2, 2]
+
+    def fail(items):
+        raise RuntimeError("model unavailable")
+
+    failing = MicroBatcher(fail, max_wait=0.001)
+    results = await asyncio.gather(failing.submit("a"), failing.submit("b"), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,79 @@
+import random
+import pytest
+from PIL import Image, ImageDraw
+from app.utils.image_hash import (
+    dhash,
+    hamming_distance,
+    MultiIndexHash,
+    NearDuplicateIndex
+)
+
+def _chart(scale=1.0, margin=50, column_offset=0):
+    """Draw a simple table, optionally zoomed and with a different margin."""
+    width, height = int(600 * scale), int(400 * scale)
+    image = Image.new("RGB", (width + 2 * margin, height + 2 * margin), "white")
+    draw = ImageDraw.Draw(image)
+    line = max(1, int(2 * scale))
+    for row in range(6):
+        y = margin + int(row * 60 * scale)
+        draw.line((margin, y, margin + width, y), fill="black", width=line)
+    for column in range(5):
+        x = margin + int((column * 140 + column_offset) * scale)
+        draw.line((x, margin, x, margin + int(300 * scale)), fill="black", width=line)
+    draw.rectangle((margin, margin, margin + int(120 * scale), margin + int(60 * scale)), fill="gray")
+    return image
+
+def test_dhash_ignores_zoom_and_margin():
+    """Test that zoomed and re-cropped copies hash (nearly) alike."""
+    original = dhash(_chart())
+    assert hamming_distance(original, dhash(_chart(scale=2, margin=150))) <= 2
+
+def test_dhash_distinguishes_different_charts():
+    """Test that a visibly different chart hashes differently."""
+    assert dhash(_chart()) != dhash(Image.new("RGB", (200, 200), "black"))
+
+def test_multi_index_hash_finds_all_within_radius():
+    """Test multi-index search against a brute-force scan."""
+    rng = random.Random(42)
+    table = MultiIndexHash(max_distance=6)
+    hashes = [rng.getrandbits(64) for _ in range(2000)]
+    query = hashes[0]
+    hashes += [query ^ (1 << bit) ^ (1 << (bit + 7)) for bit in range(0, 50, 5)]
+    for position, value in enumerate(hashes):
+        table.add(value, position)
+
+    expected = sorted(
+        (hamming_distance(query, value), position)
+        for position, value in enumerate(hashes)
+        if hamming_distance(query, value) <= 6
+    )
+    assert sorted(table.search(query)) == expected
+    assert table.search(query)[0] == (0, 0)
+
+def test_multi_index_hash_radius_limit():
+    """Test that searches wider than the index radius are rejected."""
+    with pytest.raises(ValueError):
+        MultiIndexHash(max_distance=4).search(0, max_distance=5)
+
+def test_near_duplicate_index_persists(tmp_path):
+    """Test that entries survive reloading the index from disk."""
+    path = tmp_path / "phash.jsonl"
+    index = NearDuplicateIndex(str(path), max_distance=4)
+    index.add(0b1010, {"source_image": "a.png", "result": {"M": {"Chest": 40}}})
+    assert index.find(0b1010 ^ 0b111111 << 20) is None
+
+    reloaded = NearDuplicateIndex(str(path), max_distance=4)
+    distance, entry = reloaded.find(0b1011)
+    assert distance == 1
+    assert entry["result"] == {"M": {"Chest": 40}}
+
+def test_near_duplicate_find_filters_candidates(tmp_path):
+    """Test that find skips entries rejected by where and returns the next closest."""
+    index = NearDuplicateIndex(str(tmp_path / "phash.jsonl"), max_distance=4)
+    index.add(0b1010, {"brand": "Zara"})
+    index.add(0b1000, {"brand": "Acme"})
+
+    assert index.find(0b1010)[1]["brand"] == "Zara"
+    distance, entry = index.find(0b1010, where=lambda entry: entry["brand"] == "Acme")
+    assert (distance, entry["brand"]) == (1, "Acme")
+    assert index.find(0b1010, where=lambda entry: False) is None
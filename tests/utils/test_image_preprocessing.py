@@ -0,0 +1,79 @@
+import io
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+from app.utils.image_preprocessing import (
+    preprocess_image,
+    estimate_image_tokens,
+    find_content_box,
+    is_grayscale_safe
+)
+
+def _screenshot(size=(3000, 4000), table=(500, 500, 2500, 1500), color="black"):
+    """Build a white page with a single table outline on it."""
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle(table, outline=color, width=4)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def test_crop_downscale_and_grayscale():
+    """Test that a mostly blank screenshot is cropped, shrunk and greyed."""
+    result = preprocess_image(_screenshot(), max_long_edge=1024)
+    assert result.steps == ["crop", "downscale", "grayscale", "encode:png"]
+    assert max(result.width, result.height) == 1024
+    assert result.mime_type == "image/png"
+    assert result.bytes_saved > 0
+    with Image.open(io.BytesIO(result.data)) as image:
+        assert image.mode == "L"
+
+def test_colour_is_kept_when_it_matters():
+    """Test that coloured content isn't converted to grayscale."""
+    result = preprocess_image(_screenshot(color="red"), max_long_edge=1024)
+    assert "grayscale" not in result.steps
+
+def test_jpeg_output():
+    """Test recompression to JPEG."""
+    result = preprocess_image(_screenshot(), image_format="jpeg", quality=60)
+    assert result.mime_type == "image/jpeg"
+    assert result.stats()["bytes"] == len(result.data)
+
+def test_photo_stays_jpeg_and_never_grows():
+    """Test that a JPEG photo isn't re-encoded into a larger PNG after cropping."""
+    rng = np.random.default_rng(0)
+    pixels = np.full((600, 800, 3), 255, dtype=np.uint8)
+    pixels[50:550, 50:750] = rng.integers(0, 256, (500, 700, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=80)
+    original = buffer.getvalue()
+
+    result = preprocess_image(original, image_format="PNG")
+    assert "crop" in result.steps
+    assert result.mime_type == "image/jpeg"
+    assert len(result.data) < len(original)
+
+def test_unsupported_format():
+    """Test that unsupported output formats are rejected."""
+    with pytest.raises(ValueError):
+        preprocess_image(_screenshot(), image_format="TIFF")
+
+def test_find_content_box():
+    """Test detection of the content region."""
+    image = Image.open(io.BytesIO(_screenshot()))
+    assert find_content_box(image, margin=0) == (500, 500, 2501, 1501)
+    assert find_content_box(Image.new("RGB", (100, 100), "white")) is None
+
+def test_is_grayscale_safe():
+    """Test grayscale detection."""
+    assert is_grayscale_safe(Image.new("RGB", (50, 50), (120, 120, 120)))
+    assert not is_grayscale_safe(Image.new("RGB", (50, 50), (200, 30, 30)))
+
+@pytest.mark.parametrize("size,expected", [
+    ((512, 512), 85 + 170),
+    ((1024, 1024), 85 + 170 * 4),
+    ((4096, 2048), 85 + 170 * 6),
+])
+def test_estimate_image_tokens(size, expected):
+    """Test image token estimates for high-detail requests."""
+    assert estimate_image_tokens(*size) == expected
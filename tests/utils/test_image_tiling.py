@@ -0,0 +1,64 @@
+import io
+from PIL import Image, ImageDraw
+from app.utils.image_tiling import find_table_regions, split_tables, merge_partial_results
+
+def _page(tables, width=800, height=1600):
+    """Draw filled tables at the given (upper, lower) rows of a white page."""
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    for upper, lower in tables:
+        draw.rectangle((100, upper, 700, lower), outline="black", width=2)
+        for y in range(upper, lower, 30):
+            draw.line((100, y, 700, y), fill="black")
+    return image
+
+def test_single_table():
+    """Test that one table yields one region."""
+    assert find_table_regions(_page([(100, 500)])) == [(100, 100, 701, 501)]
+
+def test_stacked_tables_are_split():
+    """Test that tables separated by a wide blank band are split."""
+    regions = find_table_regions(_page([(100, 500), (700, 1100), (1300, 1500)]))
+    assert [(upper, lower) for _, upper, _, lower in regions] == [(100, 501), (700, 1101), (1300, 1501)]
+
+def test_small_gaps_do_not_split():
+    """Test that a title close above its table stays with it."""
+    image = _page([(100, 500)])
+    ImageDraw.Draw(image).rectangle((100, 70, 300, 85), fill="black")
+    assert len(find_table_regions(image, min_gap=40)) == 1
+
+def test_slivers_are_merged():
+    """Test that a short stray line doesn't become its own region."""
+    image = _page([(100, 500)])
+    ImageDraw.Draw(image).line((100, 600, 700, 600), fill="black", width=2)
+    regions = find_table_regions(image, min_height=120)
+    assert len(regions) == 1
+    assert regions[0][3] > 600
+
+def test_blank_image():
+    """Test that a blank page has no regions."""
+    assert find_table_regions(Image.new("RGB", (100, 100), "white")) == []
+
+def test_split_tables_returns_pngs():
+    """Test cropping each region to its own PNG."""
+    buffer = io.BytesIO()
+    _page([(100, 500), (700, 1100)]).save(buffer, format="PNG")
+    tiles = split_tables(buffer.getvalue(), padding=8)
+    assert len(tiles) == 2
+    box, data = tiles[1]
+    assert box == (92, 692, 709, 1109)
+    assert Image.open(io.BytesIO(data)).size == (617, 417)
+
+def test_merge_partial_results():
+    """Test merging the JSON extracted from each tile."""
+    merged = merge_partial_results([
+        {"M": {"Chest": "38-40"}, "unit": "in"},
+        {"M": {"Waist": "32"}, "L": {"Waist": "34"}, "unit": "in"},
+        {"M": {"Chest": "97-102"}, "unit": "cm"},
+    ])
+    assert merged == {
+        "M": {"Chest": "38-40", "Waist": "32", "Chest (2)": "97-102"},
+        "L": {"Waist": "34"},
+        "unit": "in",
+        "unit (2)": "cm",
+    }
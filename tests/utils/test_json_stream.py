@@ -0,0 +1,59 @@
+import json
+import pytest
+from app.utils.json_stream import IncrementalJSONParser
+
+DOCUMENT = json.dumps({
+    "tables": [
+        {
+            "title": "Tops \"regular\"",
+            "unit": "in",
+            "headers": ["Chest", "Waist"],
+            "rows": [["S", "34-36", 30], ["M", 40.5, None]],
+        },
+        {"title": None, "unit": "cm", "headers": [], "rows": [[True, -1e3]]},
+    ]
+})
+
+def _wants_rows(path):
+    return len(path) == 4 and path[2] == "rows"
+
+def _feed(parser, document, chunk_size):
+    events = []
+    for start in range(0, len(document), chunk_size):
+        events.extend(parser.feed(document[start:start + chunk_size]))
+    return events
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, len(DOCUMENT)])
+def test_rows_are_reported_in_order(chunk_size):
+    """Test that rows come out the same however the text is chunked."""
+    events = _feed(IncrementalJSONParser(_wants_rows), DOCUMENT, chunk_size)
+    assert events == [
+        (("tables", 0, "rows", 0), ["S", "34-36", 30]),
+        (("tables", 0, "rows", 1), ["M", 40.5, None]),
+        (("tables", 1, "rows", 0), [True, -1000.0]),
+    ]
+
+def test_rows_are_reported_before_the_document_ends():
+    """Test that a row is available as soon as its closing bracket arrives."""
+    parser = IncrementalJSONParser(_wants_rows)
+    cut = DOCUMENT.index('["M"')
+    assert parser.feed(DOCUMENT[:cut]) == [(("tables", 0, "rows", 0), ["S", "34-36", 30])]
+
+def test_scalars_and_escaped_strings():
+    """Test reporting of scalar values, including escaped quotes."""
+    parser = IncrementalJSONParser(lambda path: len(path) == 3 and path[2] in ("title", "unit"))
+    assert _feed(parser, DOCUMENT, 2) == [
+        (("tables", 0, "title"), 'Tops "regular"'),
+        (("tables", 0, "unit"), "in"),
+        (("tables", 1, "title"), None),
+        (("tables", 1, "unit"), "cm"),
+    ]
+
+def test_unwanted_values_are_not_reported():
+    """Test that only wanted paths are decoded."""
+    assert _feed(IncrementalJSONParser(lambda path: False), DOCUMENT, 5) == []
+
+def test_whole_document():
+    """Test that the root value is reported once complete."""
+    events = _feed(IncrementalJSONParser(lambda path: path == ()), DOCUMENT, 4)
+    assert events == [((), json.loads(DOCUMENT))]
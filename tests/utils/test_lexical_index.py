@@ -0,0 +1,23 @@
+import numpy as np
+
+from app.utils.lexical_index import LexicalIndex, tokenize
+
+
+def test_bm25_ranks_rarer_and_more_frequent_terms_higher():
+    """Test that documents matching rare query terms score highest and non-matches score 0."""
+    index = LexicalIndex([
+        "Acme shirt size guide chest waist",
+        "Zenith size guide chest chest",
+        "How to measure your inseam",
+    ])
+    scores = index.scores("zenith chest")
+
+    assert np.argmax(scores) == 1
+    assert scores[2] == 0
+    assert scores[0] > 0
+
+
+def test_tokenize_keeps_decimals_and_lowercases():
+    """Test tokenization of sizes and measurements."""
+    assert tokenize("Chest 15.5 IN, Size XL") == ["chest", "15.5", "in", "size", "xl"]
+    assert LexicalIndex([]).scores("anything").size == 0
@@ -0,0 +1,66 @@
+import json
+import logging
+import queue
+
+from app.utils.log import (
+    DebugSampler,
+    JsonFormatter,
+    NonBlockingQueueHandler,
+    get_logger,
+    sample_request,
+    setup_logging,
+    shutdown_logging,
+)
+
+
+def _record(level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord("jester.test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_extra_fields():
+    """Test that records become one JSON object with extra fields at the top level."""
+    entry = json.loads(JsonFormatter().format(_record(brand="Acme", size_bytes=10)))
+
+    assert entry["message"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "jester.test"
+    assert entry["brand"] == "Acme" and entry["size_bytes"] == 10
+
+
+def test_debug_records_are_sampled_per_request():
+    """Test that a request's DEBUG records are all kept or all dropped, and other levels always pass."""
+    sampler = DebugSampler(rate=0.0)
+    assert sampler.filter(_record(logging.WARNING))
+    assert not sampler.filter(_record(logging.DEBUG))
+    with sample_request(1.0):
+        assert all(sampler.filter(_record(logging.DEBUG)) for _ in range(5))
+    with sample_request(0.0):
+        assert not sampler.filter(_record(logging.DEBUG))
+
+
+def test_full_queue_drops_instead_of_blocking():
+    """Test that the queue handler never waits when its queue is full."""
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    handler.handle(_record())
+    handler.handle(_record())
+
+    assert handler.dropped == 1
+    assert handler.queue.get_nowait().msg == "hello world"
+
+
+def test_listener_writes_queued_records(tmp_path):
+    """Test the full pipeline: records logged via get_logger reach the log file as JSON."""
+    path = tmp_path / "app.log"
+    setup_logging(level="INFO", log_file=str(path), debug_sample_rate=0.0)
+    try:
+        log = get_logger("test")
+        log.info("processed %d guides", 3, extra={"brand": "Acme"})
+        log.debug("dropped by sampling")
+    finally:
+        shutdown_logging()
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["message"] for line in lines] == ["processed 3 guides"]
+    assert lines[0]["brand"] == "Acme"
@@ -0,0 +1,72 @@
+import pytest
+
+from app.utils import metrics
+from app.utils.metrics import Counter, Histogram, Registry, timed
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Test that histogram buckets are cumulative and end with +Inf."""
+    histogram = Histogram("latency_seconds", "Latency", labelnames=("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "read")
+    histogram.observe(0.5, "read")
+    histogram.observe(5, "read")
+
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{stage="read",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="read",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{stage="read",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{stage="read"} 5.55' in lines
+    assert 'latency_seconds_count{stage="read"} 3' in lines
+
+
+def test_registry_renders_help_and_type():
+    """Test the exposition format headers and label escaping."""
+    registry = Registry()
+    counter = registry.register(Counter("errors_total", "Errors", labelnames=("route",)))
+    counter.inc(2, 'say "hi"')
+
+    text = registry.render()
+    assert "# HELP errors_total Errors\n# TYPE errors_total counter\n" in text
+    assert 'errors_total{route="say \\"hi\\""} 2' in text
+
+
+def test_timed_context_manager_records_errors():
+    """Test that timed records the duration and counts exceptions."""
+    before = metrics.STAGE_SECONDS.count("test", "fails")
+    with pytest.raises(ValueError):
+        with timed("test", "fails"):
+            raise ValueError("boom")
+
+    assert metrics.STAGE_SECONDS.count("test", "fails") == before + 1
+    assert metrics.STAGE_ERRORS.value("test", "fails") >= 1
+
+
+@pytest.mark.asyncio
+async def test_timed_decorates_sync_and_async():
+    """Test that timed wraps plain and async functions."""
+    @timed("test", "sync")
+    def double(x):
+        return x * 2
+
+    @timed("test", "async")
+    async def triple(x):
+        return x * 3
+
+    assert double(2) == 4
+    assert await triple(2) == 6
+    assert metrics.STAGE_SECONDS.count("test", "sync") >= 1
+    assert metrics.STAGE_SECONDS.count("test", "async") >= 1
+
+
+def test_disabled_records_nothing():
+    """Test that nothing is recorded while metrics are disabled."""
+    metrics.set_enabled(False)
+    try:
+        with timed("test", "disabled"):
+            pass
+        metrics.count_cache_lookup("test", True)
+    finally:
+        metrics.set_enabled(True)
+
+    assert metrics.STAGE_SECONDS.count("test", "disabled") == 0
+    assert metrics.CACHE_LOOKUPS.value("test", "hit") == 0
@@ -0,0 +1,54 @@
+import os
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from app.utils.profiler import PROFILE_HEADER, ProfileStore, RequestProfiler, StackSampler
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampler_collects_collapsed_stacks():
+    """Test that the sampler records the target thread's call stack."""
+    sampler = StackSampler(threading.get_ident(), interval=0.001, include_workers=False)
+    sampler.start()
+    _spin(0.05)
+    samples = sampler.stop()
+
+    assert sampler.sample_count > 0
+    stack = samples.most_common(1)[0][0]
+    assert stack.startswith("event_loop;")
+    assert "_spin (test_profiler.py:" in stack
+
+
+def test_store_writes_tagged_profiles_and_prunes(tmp_path):
+    """Test file naming, collapsed-stack format and the file limit."""
+    store = ProfileStore(tmp_path, max_files=2)
+    paths = []
+    for i in range(3):
+        paths.append(store.save(Counter({"a;b": 3, "a;c": 1}), "POST", "/api/chat", 200, 1.234))
+        os.utime(paths[-1], (i, i))
+
+    remaining = sorted(p.name for p in tmp_path.iterdir())
+    assert len(remaining) == 2
+    assert paths[0].name not in remaining
+    assert paths[-1].name.endswith("_POST_api_chat_200_1234ms.collapsed")
+    assert paths[-1].read_text().splitlines() == ["a;b 3", "a;c 1"]
+
+
+@pytest.mark.parametrize("headers,sample_rate,expected", [
+    ({PROFILE_HEADER.lower(): "secret"}, 0.0, True),
+    ({PROFILE_HEADER.lower(): "wrong"}, 0.0, False),
+    ({}, 0.0, False),
+    ({}, 1.0, True),
+])
+def test_profiler_selection(tmp_path, headers, sample_rate, expected):
+    """Test that requests are selected by token header or sample rate."""
+    profiler = RequestProfiler(ProfileStore(tmp_path), sample_rate=sample_rate, token="secret")
+    assert profiler.wants(headers) is expected
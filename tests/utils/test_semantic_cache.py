@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from app.utils.semantic_cache import SemanticCache
+
+
+def _vec(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_similar_query_hits():
+    """Test that a query close to a cached one is served from the cache."""
+    cache = SemanticCache(threshold=0.9)
+    cache.store(_vec(1, 0, 0), scope=1, response="Measure around the fullest part.")
+
+    assert cache.lookup(_vec(0.98, 0.1, 0), scope=1) == "Measure around the fullest part."
+    assert cache.lookup(_vec(0, 1, 0), scope=1) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_scope_change_misses():
+    """Test that answers stored for another scope are not served."""
+    cache = SemanticCache()
+    cache.store(_vec(1, 0), scope=5, response="old")
+
+    assert cache.lookup(_vec(1, 0), scope=6) is None
+    cache.store(_vec(1, 0), scope=6, response="new")
+    assert cache.lookup(_vec(1, 0), scope=6) == "new"
+
+
+def test_expired_entry_misses(monkeypatch):
+    """Test that entries past their TTL are not served."""
+    now = [1000.0]
+    monkeypatch.setattr("app.utils.semantic_cache.time.time", lambda: now[0])
+    cache = SemanticCache(ttl_seconds=60)
+    cache.store(_vec(1, 0), scope=1, response="answer")
+
+    now[0] += 59
+    assert cache.lookup(_vec(1, 0), scope=1) == "answer"
+    now[0] += 2
+    assert cache.lookup(_vec(1, 0), scope=1) is None
+
+
+def test_evicts_least_recently_used(monkeypatch):
+    """Test that a full cache replaces the least recently used entry."""
+    now = [1000.0]
+    monkeypatch.setattr("app.utils.semantic_cache.time.time", lambda: now[0])
+    cache = SemanticCache(max_entries=2, ttl_seconds=0)
+    cache.store(_vec(1, 0, 0), scope=1, response="a")
+    now[0] += 1
+    cache.store(_vec(0, 1, 0), scope=1, response="b")
+    now[0] += 1
+    cache.lookup(_vec(1, 0, 0), scope=1)  # "a" is now the most recently used
+    now[0] += 1
+    cache.store(_vec(0, 0, 1), scope=1, response="c")
+
+    assert len(cache) == 2
+    assert cache.lookup(_vec(1, 0, 0), scope=1) == "a"
+    assert cache.lookup(_vec(0, 1, 0), scope=1) is None
+    assert cache.lookup(_vec(0, 0, 1), scope=1) == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_full_cache_reuses_invalidated_slots_first(monkeypatch):
+    """Test that invalidated entries are replaced before live ones of any scope."""
+    now = [1000.0]
+    monkeypatch.setattr("app.utils.semantic_cache.time.time", lambda: now[0])
+    cache = SemanticCache(max_entries=2, ttl_seconds=0)
+    cache.store(_vec(0, 1), scope=1, response="other scope")
+    now[0] += 1
+    cache.store(_vec(1, 0), scope=2, response="stale", reach=0.5)
+    cache.invalidate_near(_vec(1, 0.1))
+    now[0] += 1
+    cache.store(_vec(1, 1), scope=2, response="newer")
+
+    assert cache.lookup(_vec(0, 1), scope=1) == "other scope"
+    assert cache.lookup(_vec(1, 1), scope=2) == "newer"
+
+
+def test_invalidate_near_drops_only_entries_within_reach():
+    """Test that a new document only invalidates answers whose context it would join."""
+    cache = SemanticCache(threshold=0.99, ttl_seconds=0)
+    cache.store(_vec(1, 0, 0), scope=1, response="near", reach=0.5)
+    cache.store(_vec(0, 1, 0), scope=1, response="far", reach=0.5)
+    cache.store(_vec(0, 0, 1), scope=1, response="no documents")
+
+    assert cache.invalidate_near(np.array([[0.9, 0.1, 0.0]], dtype=np.float32)) == 1
+    assert cache.lookup(_vec(1, 0, 0), scope=1) is None
+    assert cache.lookup(_vec(0, 1, 0), scope=1) == "far"
+    assert cache.lookup(_vec(0, 0, 1), scope=1) == "no documents"
+    assert cache.stats()["invalidations"] == 1
+
+    cache.store(_vec(1, 0, 0), scope=1, response="refreshed", reach=0.5)
+    assert cache.lookup(_vec(1, 0, 0), scope=1) == "refreshed"
+
+
+@pytest.mark.parametrize("embedding", [_vec(0, 0, 0), _vec(3, 4, 0)])
+def test_unnormalized_and_zero_embeddings(embedding):
+    """Test that lookups work with unnormalized and zero vectors."""
+    cache = SemanticCache(threshold=0.9)
+    cache.store(_vec(3, 4, 0), scope=1, response="x")
+    expected = "x" if embedding.any() else None
+    assert cache.lookup(embedding, scope=1) == expected
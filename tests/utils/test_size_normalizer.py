@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+from app.utils.size_normalizer import (
+    normalize_chart,
+    normalize_unit,
+    is_half_measurement
+)
+
+def test_plain_numbers():
+    """Test that numeric cells become equal min and max values."""
+    chart = normalize_chart({"S": {"Chest": 36}, "M": {"Chest": 38.5}}, unit="inches")
+    assert chart.sizes == ["S", "M"]
+    assert chart.measurements == ["Chest"]
+    assert chart.min_values.tolist() == [[36.0], [38.5]]
+    assert chart.max_values.tolist() == [[36.0], [38.5]]
+    assert chart.unit == "in"
+
+@pytest.mark.parametrize("cell,expected", [
+    ("38-40", (38.0, 40.0)),
+    ("38 – 40", (38.0, 40.0)),
+    ("15 1/2", (15.5, 15.5)),
+    ("15½", (15.5, 15.5)),
+    ("32 3/4 - 33 1/4", (32.75, 33.25)),
+    ("1/2", (0.5, 0.5)),
+])
+def test_ranges_and_fractions(cell, expected):
+    """Test parsing of ranges and fractional values."""
+    chart = normalize_chart({"M": {"Neck": cell}})
+    assert (chart.min_values[0, 0], chart.max_values[0, 0]) == expected
+
+def test_unit_conversion():
+    """Test conversion between centimeters and inches."""
+    chart = normalize_chart({"M": {"Chest": 101.6}}, unit="cm", target_unit="in")
+    assert chart.min_values[0, 0] == 40.0
+
+    chart = normalize_chart({"M": {"Chest": "40"}}, unit="in", target_unit="cm")
+    assert chart.min_values[0, 0] == 101.6
+
+def test_cell_unit_overrides_chart_unit():
+    """Test that a unit written in a cell wins over the declared chart unit."""
+    chart = normalize_chart({"M": {"Waist": "81.28 cm", "Chest": "40"}}, unit="inches")
+    assert chart.min_values[0].tolist() == [32.0, 40.0]
+
+@pytest.mark.parametrize("cell,expected", [
+    ("81.28cm", (32.0, 32.0)),
+    ("97 cm / 38 in", (38.19, 38.19)),
+    ("42-44 (107-112cm)", (42.0, 44.0)),
+    ("38,5", (38.5, 38.5)),
+    ("96,5-101,5 cm", (37.99, 39.96)),
+    ("(40)", (40.0, 40.0)),
+])
+def test_first_value_and_its_unit(cell, expected):
+    """Test that a cell is read from its first value or range and the unit written with it."""
+    chart = normalize_chart({"M": {"Chest": cell}}, unit="inches")
+    assert (chart.min_values[0, 0], chart.max_values[0, 0]) == expected
+
+def test_half_measurements_are_doubled():
+    """Test that flat measurements are doubled."""
+    chart = normalize_chart({"M": {"Half Chest Width": "20-21", "Chest": 40}})
+    assert chart.min_values[0].tolist() == [40.0, 40.0]
+    assert chart.max_values[0].tolist() == [42.0, 40.0]
+    assert chart.half_measurements == ["Half Chest Width"]
+
+def test_missing_and_unparseable_cells():
+    """Test that missing cells are NaN and non-size entries are ignored."""
+    chart = normalize_chart({
+        "S": {"Chest": "n/a"},
+        "M": {"Chest": None, "Waist": 32},
+        "notes": "measured flat",
+    })
+    assert chart.sizes == ["S", "M"]
+    assert np.isnan(chart.min_values[0]).all()
+    assert np.isnan(chart.min_values[1, 0])
+    assert chart.to_dict() == {"S": {}, "M": {"Waist": {"min": 32.0, "max": 32.0}}}
+
+def test_empty_chart():
+    """Test normalization of a chart without sizes."""
+    chart = normalize_chart({})
+    assert chart.min_values.shape == (0, 0)
+
+def test_unknown_target_unit():
+    """Test that an unknown target unit is rejected."""
+    with pytest.raises(ValueError):
+        normalize_chart({"M": {"Chest": 40}}, target_unit="furlongs")
+
+@pytest.mark.parametrize("unit,expected", [
+    ("inches", "in"),
+    ("Centimeters", "cm"),
+    (" cm ", "cm"),
+    ("", None),
+    ("stone", None),
+])
+def test_normalize_unit(unit, expected):
+    """Test normalization of unit spellings."""
+    assert normalize_unit(unit) == expected
+
+@pytest.mark.parametrize("header,expected", [
+    ("Half Chest Width", True),
+    ("1/2 Chest", True),
+    ("Pit to Pit", True),
+    ("Chest", False),
+    ("Chest Width", False),
+])
+def test_is_half_measurement(header, expected):
+    """Test detection of flat measurement headers."""
+    assert is_half_measurement(header) == expected
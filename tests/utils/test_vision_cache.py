@@ -0,0 +1,76 @@
+import os
+import time
+import pytest
+from app.utils.vision_cache import VisionCache, prompt_version
+
+@pytest.fixture
+def cache(tmp_path):
+    return VisionCache(str(tmp_path / "cache"), max_entries=3)
+
+def test_round_trip(cache):
+    """Test storing and reading back a result."""
+    key = VisionCache.make_key(b"image", "gpt-4o", "v1")
+    assert cache.get(key) is None
+    cache.set(key, {"size_data": {"M": {"Chest": 40}}}, model="gpt-4o", prompt_version="v1")
+    assert cache.get(key) == {"size_data": {"M": {"Chest": 40}}}
+
+def test_key_depends_on_image_model_and_prompt():
+    """Test that every part of the request changes the key."""
+    key = VisionCache.make_key(b"image", "gpt-4o", "v1")
+    assert key == VisionCache.make_key(b"image", "gpt-4o", "v1")
+    assert key != VisionCache.make_key(b"other", "gpt-4o", "v1")
+    assert key != VisionCache.make_key(b"image", "gpt-4o-mini", "v1")
+    assert key != VisionCache.make_key(b"image", "gpt-4o", "v2")
+
+def test_lru_eviction(cache):
+    """Test that the least recently used entries are evicted first."""
+    keys = [VisionCache.make_key(bytes([i]), "m", "v1") for i in range(4)]
+    for age, key in enumerate(keys[:3]):
+        cache.set(key, {"i": age}, model="m", prompt_version="v1")
+        os.utime(cache._path(key), (time.time() - 100 + age, time.time() - 100 + age))
+
+    cache.get(keys[0])  # Make the oldest entry the most recently used
+    cache.set(keys[3], {"i": 3}, model="m", prompt_version="v1")
+
+    assert len(cache) == 3
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == {"i": 0}
+
+def test_ttl_expiry(tmp_path):
+    """Test that entries older than the TTL are treated as misses."""
+    cache = VisionCache(str(tmp_path), ttl_seconds=60)
+    key = VisionCache.make_key(b"image", "m", "v1")
+    cache.set(key, {}, model="m", prompt_version="v1")
+    stale = time.time() - 120
+    os.utime(cache._path(key), (stale, stale))
+    assert cache.evict() == 1
+    assert cache.get(key) is None
+
+def test_invalidate_by_prompt_version(cache):
+    """Test removing entries created with other prompt versions."""
+    old = VisionCache.make_key(b"image", "m", "v1")
+    new = VisionCache.make_key(b"image", "m", "v2")
+    cache.set(old, {}, model="m", prompt_version="v1")
+    cache.set(new, {}, model="m", prompt_version="v2")
+
+    assert cache.invalidate(keep_prompt_version="v2") == 1
+    assert cache.get(old) is None
+    assert cache.get(new) == {}
+    assert cache.invalidate() == 1
+    assert len(cache) == 0
+
+def test_prompt_version():
+    """Test that prompt versions are stable and sensitive to edits."""
+    assert prompt_version("Extract the chart") == prompt_version("Extract the chart")
+    assert prompt_version("Extract the chart") != prompt_version("Extract the chart.")
+
+def test_concurrent_writes_from_threads(cache):
+    """Test that threads writing and evicting at once don't trip over each other."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    keys = [VisionCache.make_key(bytes([i % 5]), "m", "v1") for i in range(40)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda key: cache.set(key, {"k": key}, model="m", prompt_version="v1"), keys))
+
+    assert len(cache) == 3
+    assert not list(cache.cache_dir.glob(".*.tmp"))
@@ -0,0 +1,43 @@
+import pytest
+from app.utils.vision_schema import SIZE_CHART_SCHEMA, compact_to_chart
+
+def test_single_table():
+    """Test conversion of one compact table to the nested layout."""
+    chart = compact_to_chart({"tables": [{
+        "title": None,
+        "unit": "in",
+        "headers": ["Chest", "Waist"],
+        "rows": [["S", "34-36", 30], ["M", 40, None]],
+    }]})
+    assert chart == {
+        "S": {"Chest": "34-36", "Waist": 30},
+        "M": {"Chest": 40},
+        "unit": "in",
+    }
+
+def test_multiple_tables_are_merged():
+    """Test that several tables become one guide."""
+    chart = compact_to_chart({"tables": [
+        {"title": "Tops", "unit": None, "headers": ["Chest"], "rows": [["M", 40]]},
+        {"title": "Bottoms", "unit": None, "headers": ["Waist"], "rows": [["M", 32], [None, 1]]},
+    ]})
+    assert chart == {"M": {"Chest": 40, "Waist": 32}, "title": "Tops", "title (2)": "Bottoms"}
+
+def test_no_tables():
+    """Test that an empty response is rejected."""
+    with pytest.raises(ValueError):
+        compact_to_chart({"tables": []})
+
+def test_schema_is_strict():
+    """Test the schema meets strict structured-output requirements."""
+    def check(node):
+        if node.get("type") == "object":
+            assert node["additionalProperties"] is False
+            assert set(node["required"]) == set(node["properties"])
+            for child in node["properties"].values():
+                check(child)
+        if "items" in node:
+            check(node["items"])
+
+    assert SIZE_CHART_SCHEMA["strict"] is True
+    check(SIZE_CHART_SCHEMA["schema"])